@@ -0,0 +1,93 @@
+"""
+measure latency of the health check endpoint while tracks are being imported
+
+Fires `--imports` concurrent requests to /tracks/import (using files already uploaded to
+incoming/ on S3) and repeatedly polls / until they have all finished, then prints
+latency percentiles for the health checks. Run it against a dev server, e.g.
+
+    poetry run python benchmarks/health_latency.py --api-key ... a.mp3 b.mp3 c.mp3
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def post_import(url: str, api_key: str, filename: str) -> float:
+    req = urllib.request.Request(
+        f"{url}/tracks/import",
+        data=json.dumps({"filename": filename}).encode(),
+        headers={"Content-Type": "application/json", "X-Api-Key": api_key},
+        method="POST",
+    )
+
+    start = time.perf_counter()
+
+    with urllib.request.urlopen(req) as resp:
+        resp.read()
+
+    return time.perf_counter() - start
+
+
+def poll_health_check(url: str, done: threading.Event, interval: float) -> list[float]:
+    latencies = []
+
+    while not done.is_set():
+        start = time.perf_counter()
+
+        with urllib.request.urlopen(f"{url}/") as resp:
+            resp.read()
+
+        latencies.append(time.perf_counter() - start)
+        time.sleep(interval)
+
+    return latencies
+
+
+def percentile(x: list[float], q: int) -> float:
+    # nearest-rank percentile (works with very few samples, i.e. a blocked server)
+    x = sorted(x)
+    return x[max(0, math.ceil(q / 100 * len(x)) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("filenames", nargs="+", help="files in incoming/ to import")
+    parser.add_argument("--url", default="http://localhost:10000")
+    parser.add_argument("--api-key", required=True)
+    parser.add_argument("--imports", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    done = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=args.imports + 1) as pool:
+        health_future = pool.submit(poll_health_check, args.url, done, args.interval)
+
+        import_futures = [
+            pool.submit(
+                post_import,
+                args.url,
+                args.api_key,
+                args.filenames[i % len(args.filenames)],
+            )
+            for i in range(args.imports)
+        ]
+
+        import_latencies = [f.result() for f in import_futures]
+        done.set()
+        health_latencies = health_future.result()
+
+    print(f"{len(import_latencies)} imports, {len(health_latencies)} health checks")
+    print(f"import wall time (max): {max(import_latencies) * 1000:.0f} ms")
+
+    for q in [50, 90, 99]:
+        print(f"health check p{q}: {percentile(health_latencies, q) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+time the set-based MusicBrainz diffing in `utils.mb` against the legacy pandas-based
+implementation on a prolific artist (their outputs must match, which `tests/test_mb.py`
+checks)
+
+    poetry run python benchmarks/mb_diff.py --n 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+import uuid
+from typing import Iterable
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils import mb as mb_utils  # noqa: E402
+
+all_release_types = [*mb_utils.valid_release_types, "Audiobook", "Live", "Bootleg"]
+all_rel_types = [*mb_utils.valid_artist_rel_types, "teacher", "tribute"]
+
+
+def legacy_filter_new_releases(
+    artist_id: str, existing_release_ids: list[str], releases: list[dict]
+) -> pd.DataFrame:
+    new_releases = []
+
+    for r in releases:
+        if r["mb_release_id"] in existing_release_ids:
+            continue
+
+        types = {r["type"], *r["secondary_types"]}
+
+        if len(types) == 0 or not mb_utils.valid_release_types.issuperset(types):
+            continue
+
+        new_releases.append(
+            {
+                "mb_artist_id": artist_id,
+                "mb_release_id": r["mb_release_id"],
+                "title": r["title"],
+                "release_date": r["release_date"],
+                "types": types,
+            }
+        )
+
+    nr_df = pd.DataFrame(new_releases)
+    nr_df = nr_df.convert_dtypes()
+    return nr_df
+
+
+def anti_join(
+    x: pd.DataFrame, y: pd.DataFrame, on: str | Iterable[str]
+) -> pd.DataFrame:
+    if len(y) == 0:
+        return x
+
+    dummy = y.loc[:, on]  # pyright: ignore
+
+    if isinstance(dummy, pd.Series):
+        dummy = dummy.to_frame()
+
+    dummy.loc[:, "dummy_col"] = 1
+    merged = x.merge(dummy, on=on, how="left")
+    return merged.loc[merged["dummy_col"].isna(), x.columns.tolist()]
+
+
+def legacy_filter_new_relationships(
+    relationships: list[dict], existing_relationships: list[dict]
+) -> pd.DataFrame:
+    rel_df = pd.DataFrame(relationships, dtype="string")
+
+    if len(existing_relationships) == 0:
+        new_relationships = rel_df
+    else:
+        existing_rel_df = pd.DataFrame(existing_relationships, dtype="string")
+
+        new_relationships = anti_join(
+            rel_df,
+            existing_rel_df,
+            on=["mb_artist_id", "type", "direction", "other_mb_artist_id"],
+        )
+
+    return new_relationships.drop_duplicates()
+
+
+def legacy_dt_to_int(x: str) -> int | None:
+    x = pd.to_datetime(x)
+
+    if pd.isna(x):
+        return None
+
+    return round(x.value / 1e6)
+
+
+def make_artist(
+    n: int,
+) -> tuple[str, list[mb_utils.ReleaseGroup], list[mb_utils.Relationship]]:
+    artist_id = str(uuid.uuid4())
+
+    releases = [
+        mb_utils.ReleaseGroup(
+            mb_artist_id=artist_id,
+            mb_release_id=str(uuid.uuid4()),
+            title=random.choice(["A", "B", "Untitled", ""]),
+            release_date=make_date(),
+            type=random.choice([None, *all_release_types]),
+            secondary_types=random.sample(all_release_types, random.randint(0, 2)),
+        )
+        for _ in range(n)
+    ]
+
+    others = [(str(uuid.uuid4()), f"Other {i}") for i in range(max(n // 10, 1))]
+
+    relationships = [
+        mb_utils.Relationship(
+            mb_artist_id=artist_id,
+            type=random.choice(all_rel_types),
+            direction=random.choice(["forward", "backward"]),
+            other_mb_artist_id=other[0],
+            other_mb_artist_name=other[1],
+        )
+        for other in random.choices(others, k=max(n // 5, 1))
+    ]
+
+    return artist_id, releases, relationships
+
+
+def make_date() -> str:
+    year = random.randint(1900, 2030)
+
+    return random.choice(
+        [
+            "",
+            f"{year}",
+            f"{year}-{random.randint(1, 12):02d}",
+            f"{year}-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+        ]
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    # a prolific artist
+    artist_id, releases, relationships = make_artist(args.n)
+    existing_release_ids = [x.mb_release_id for x in releases[: args.n // 2]]
+    existing_relationships = {x.key for x in relationships[: len(relationships) // 2]}
+    n_reps = 5
+
+    t_legacy = timeit.timeit(
+        lambda: (
+            legacy_filter_new_releases(
+                artist_id, existing_release_ids, [x._asdict() for x in releases]
+            ),
+            legacy_filter_new_relationships(
+                [x._asdict() for x in relationships],
+                [
+                    dict(
+                        zip(
+                            ["mb_artist_id", "type", "direction", "other_mb_artist_id"],
+                            x,
+                        )
+                    )
+                    for x in existing_relationships
+                ],
+            ),
+        ),
+        number=n_reps,
+    )
+
+    t_new = timeit.timeit(
+        lambda: (
+            mb_utils.filter_new_releases(
+                artist_id, set(existing_release_ids), releases
+            ),
+            mb_utils.filter_new_relationships(relationships, existing_relationships),
+        ),
+        number=n_reps,
+    )
+
+    print(f"legacy: {t_legacy / n_reps * 1000:.2f} ms per artist")
+    print(f"new: {t_new / n_reps * 1000:.2f} ms per artist")
+
+
+if __name__ == "__main__":
+    main()
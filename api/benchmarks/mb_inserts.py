@@ -0,0 +1,210 @@
+"""
+compare the number of DB round trips and wall time of storing a prolific artist's new
+MusicBrainz releases and relationships row by row (the legacy method) and with the
+batched inserts in `utils.mb`
+
+Run it against a local Postgres DB with the i9000 schema, optionally adding simulated
+per-round-trip latency to approximate a remote DB, e.g.
+
+    poetry run python benchmarks/mb_inserts.py --db-url postgresql:///i9000 \
+        --n-releases 400 --latency-ms 20
+
+Everything is inserted in a transaction that's rolled back afterwards.
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import pandas as pd
+import psycopg2
+from psycopg2.extensions import cursor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils import mb as mb_utils  # noqa: E402
+
+
+class CountingCursor(cursor):
+    latency = 0.0
+    n_round_trips = 0
+
+    def execute(self, query, vars=None):  # noqa: ANN001, ANN201
+        CountingCursor.n_round_trips += 1
+        time.sleep(CountingCursor.latency)
+        return super().execute(query, vars)
+
+
+def legacy_insert_releases(cur: cursor, releases_df: pd.DataFrame) -> None:
+    releases_sql = releases_df.copy().drop(columns="mb_artist_id")
+    releases_sql = releases_sql.drop_duplicates(subset="mb_release_id")
+
+    for _, r in releases_sql.iterrows():
+        types = list(r["types"])
+        types.sort()
+
+        cur.execute(
+            """
+            insert into mb_releases
+            (id, title, types, release_date, created_at)
+            values
+            (%s, %s, %s, %s, %s)
+            on conflict do nothing
+            """,
+            (
+                r["mb_release_id"],
+                r["title"],
+                "".join(["{", ",".join(types), "}"]),
+                dt_to_int(r["release_date"]),
+                dt_to_int(pd.to_datetime("now", utc=True)),
+            ),
+        )
+
+
+def legacy_insert_artist_releases(cur: cursor, releases_df: pd.DataFrame) -> None:
+    artist_releases_sql = releases_df.loc[:, ["mb_artist_id", "mb_release_id"]]
+    artist_releases_sql = artist_releases_sql.drop_duplicates()
+
+    for _, r in artist_releases_sql.iterrows():
+        cur.execute(
+            """
+            insert into mb_artist_releases
+            (mb_artist_id, mb_release_id)
+            values
+            (%s, %s)
+            on conflict do nothing
+            """,
+            (r["mb_artist_id"], r["mb_release_id"]),
+        )
+
+
+def legacy_insert_relationships(cur: cursor, relationships_df: pd.DataFrame) -> None:
+    for _, r in relationships_df.iterrows():
+        cur.execute(
+            """
+            insert into mb_artist_relationships
+                (
+                    mb_artist_id,
+                    type,
+                    direction,
+                    other_mb_artist_id,
+                    other_mb_artist_name,
+                    created_at
+            ) values
+                (%s, %s, %s, %s, %s, %s)
+            """,
+            (
+                r["mb_artist_id"],
+                r["type"],
+                r["direction"],
+                r["other_mb_artist_id"],
+                r["other_mb_artist_name"],
+                dt_to_int(pd.to_datetime("now", utc=True)),
+            ),
+        )
+
+
+def dt_to_int(x: str | pd.Timestamp) -> int | None:
+    if isinstance(x, str):
+        x = pd.to_datetime(x)
+
+        if pd.isna(x):
+            return None
+
+    return round(x.value / 1e6)
+
+
+def make_data(
+    artist_id: str, n_releases: int, n_relationships: int
+) -> tuple[list[mb_utils.NewRelease], list[mb_utils.Relationship]]:
+    releases = [
+        mb_utils.NewRelease(
+            mb_artist_id=artist_id,
+            mb_release_id=str(uuid.uuid4()),
+            title=f"Release {i}",
+            release_date=f"{1970 + i % 50}-01-01" if i % 10 > 0 else "",
+            types=frozenset({"Album", "Compilation"} if i % 3 == 0 else {"EP"}),
+        )
+        for i in range(n_releases)
+    ]
+
+    relationships = [
+        mb_utils.Relationship(
+            mb_artist_id=artist_id,
+            type="member of band",
+            direction="forward",
+            other_mb_artist_id=str(uuid.uuid4()),
+            other_mb_artist_name=f"Band {i}",
+        )
+        for i in range(n_relationships)
+    ]
+
+    return releases, relationships
+
+
+def run(db_url: str, method: str, args: argparse.Namespace) -> tuple[int, float]:
+    artist_id = str(uuid.uuid4())
+    releases, relationships = make_data(
+        artist_id, args.n_releases, args.n_relationships
+    )
+
+    if method == "legacy":
+        releases = pd.DataFrame(releases).convert_dtypes()
+        relationships = pd.DataFrame(relationships, dtype="string")
+
+        funcs = (
+            legacy_insert_releases,
+            legacy_insert_artist_releases,
+            legacy_insert_relationships,
+        )
+    else:
+        funcs = (
+            mb_utils.insert_releases,
+            mb_utils.insert_artist_releases,
+            mb_utils.insert_relationships,
+        )
+
+    conn = psycopg2.connect(db_url)
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "insert into mb_artists values (%s, %s, null)", (artist_id, "Artist")
+            )
+
+        with conn.cursor(cursor_factory=CountingCursor) as cur:
+            CountingCursor.n_round_trips = 0
+            start = time.perf_counter()
+
+            funcs[0](cur, releases)
+            funcs[1](cur, releases)
+            funcs[2](cur, relationships)
+
+            elapsed = time.perf_counter() - start
+
+    finally:
+        conn.rollback()
+        conn.close()
+
+    return CountingCursor.n_round_trips, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--n-releases", type=int, default=400)
+    parser.add_argument("--n-relationships", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    CountingCursor.latency = args.latency_ms / 1000
+
+    for method in ["legacy", "batched"]:
+        n_round_trips, elapsed = run(args.db_url, method, args)
+        print(f"{method}: {n_round_trips} round trips, {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
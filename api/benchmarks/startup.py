@@ -0,0 +1,112 @@
+"""
+measure how long it takes an API worker to import the app, and fail if it's over budget
+or if any of the libraries that are supposed to be imported lazily were imported
+
+Runs `python -X importtime -c "import main"` a few times in fresh interpreters (with
+placeholder values for any required environment variables that aren't set) and prints
+the median import time and the slowest top-level packages, e.g.
+
+    poetry run python benchmarks/startup.py --max-ms 400
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+api_dir = os.path.join(os.path.dirname(__file__), "..")
+
+# libraries that should only be imported by the routes that need them
+lazy_modules = [
+    "acoustid",
+    "boto3",
+    "botocore",
+    "cryptography",
+    "musicbrainzngs",
+    "mutagen",
+    "pandas",
+    "psycopg2",
+    "pylast",
+]
+
+placeholder_env = {
+    "ENV": "dev",
+    "API_KEY": "x",
+    "BUCKET_NAME": "x",
+    "GRAPHQL_URL": "x",
+}
+
+importtime_re = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$")
+
+
+def import_app() -> tuple[float, dict[str, int], set[str]]:
+    env = {**placeholder_env, **os.environ}
+
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=api_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total_us = 0
+    self_us_by_package: dict[str, int] = defaultdict(int)
+    modules = set()
+
+    for line in res.stderr.splitlines():
+        m = importtime_re.match(line)
+
+        if m is None:
+            continue
+
+        self_us, cumulative_us, indent, module = m.groups()
+        modules.add(module)
+        self_us_by_package[module.split(".")[0]] += int(self_us)
+
+        if module == "main" and len(indent) == 1:
+            total_us = int(cumulative_us)
+
+    return total_us / 1000, self_us_by_package, modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=400)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    results = [import_app() for _ in range(args.runs)]
+    median_ms = statistics.median(x[0] for x in results)
+    _, self_us_by_package, modules = results[-1]
+
+    print(f"import main: {median_ms:.0f} ms (median of {args.runs})")
+
+    for package, self_us in sorted(
+        self_us_by_package.items(), key=lambda x: x[1], reverse=True
+    )[: args.top]:
+        print(f"  {package}: {self_us / 1000:.1f} ms")
+
+    failed = False
+
+    if median_ms > args.max_ms:
+        print(f"FAIL: over the {args.max_ms:.0f} ms budget")
+        failed = True
+
+    eager = sorted(x for x in lazy_modules if x in modules)
+
+    if len(eager) > 0:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+time `make_track_id` against the legacy pandas-based track ID computation (whose output
+it must match, which `tests/test_track_id.py` checks)
+
+    poetry run python benchmarks/track_id.py
+"""
+
+import argparse
+import base64
+import os
+import random
+import sys
+import timeit
+from hashlib import sha1
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.track_id import make_track_id  # noqa: E402
+
+
+def legacy_track_id(duration: float, fingerprint: bytes) -> str:
+    # the one-row data frame method previously used in `fingerprint_track`
+    tracks_to_fp = pd.DataFrame([{"path": "x.mp3"}], index=None)
+    tracks_to_fp[["duration", "fingerprint"]] = (duration, fingerprint)
+    tracks_to_fp["duration"] = tracks_to_fp["duration"].astype("Float64")
+    tracks_to_fp["fingerprint"] = [x.decode() for x in tracks_to_fp["fingerprint"]]
+    tracks_to_fp["fingerprint"] = tracks_to_fp["fingerprint"].astype("string")
+
+    tracks_to_fp = tracks_to_fp.assign(
+        hash=tracks_to_fp[["duration", "fingerprint"]]
+        .apply(lambda x: sha1(x.to_json().encode()).hexdigest(), axis=1)
+        .astype("string")
+    )
+
+    return tracks_to_fp["hash"].values[0]
+
+
+def make_corpus(n: int) -> list[tuple[float, bytes]]:
+    corpus = []
+
+    for _ in range(n):
+        # fpcalc reports whole seconds, other decoders fractional ones
+        duration = random.choice(
+            [
+                float(random.randint(1, 4000)),
+                round(random.uniform(1, 4000), random.randint(1, 6)),
+                random.uniform(0, 4000),
+                10 ** random.uniform(-20, 20),
+            ]
+        )
+
+        fingerprint = b"AQAD" + base64.urlsafe_b64encode(
+            random.randbytes(random.randint(0, 3000))
+        ).rstrip(b"=")
+
+        corpus.append((duration, fingerprint))
+
+    return corpus
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    d, fp = make_corpus(1)[0]
+    n_legacy = 200
+    n_new = 20000
+
+    t_legacy = timeit.timeit(lambda: legacy_track_id(d, fp), number=n_legacy)
+    t_new = timeit.timeit(lambda: make_track_id(d, fp.decode()), number=n_new)
+
+    print(f"legacy: {t_legacy / n_legacy * 1e6:.1f} us per track")
+    print(f"new: {t_new / n_new * 1e6:.1f} us per track")
+
+
+if __name__ == "__main__":
+    main()
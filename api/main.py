@@ -1,24 +1,21 @@
 from __future__ import annotations
 
-import base64
+import asyncio
+import json
 import logging
 import os
 import time
+from typing import AsyncIterator
 
-import psycopg2
-import pylast
-from botocore.exceptions import ClientError
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException
 from fastapi.logger import logger
 from fastapi.openapi.models import APIKey
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from utils import mb as mb_utils
 from utils import schemas
 from utils import tracks as track_utils
+from utils import uploads as upload_utils
 from utils.api import ApiConfig, get_api_key
-from utils.cf_signed_url import make_signed_wildcard_url
-from utils.tracks import do_clean_tmp_mp3s_dir
 
 logging.basicConfig(
     level=logging.INFO,
@@ -66,13 +63,7 @@ async def log_in(body: schemas.Auth) -> dict[str, str]:
             "api_key": os.environ["API_KEY"],
             "graphql_auth_token": os.environ["AUTH_TOKEN"],
             "graphql_url": config.graphql_url,
-            "cloudfront_url": make_signed_wildcard_url(
-                cloudfront_url=os.environ["CLOUDFRONT_URL"],
-                cloudfront_keypair_id=os.environ["CLOUDFRONT_KEYPAIR_ID"],
-                cloudfront_private_key=base64.b64decode(
-                    os.environ["CLOUDFRONT_PRIVATE_KEY"]
-                ).decode("utf8"),
-            ),
+            "cloudfront_url": await config.run_io(config.cf_signer.signed_wildcard_url),
             "lastfm_username": os.getenv("LASTFM_USERNAME"),
             "do_scrobble": "true"
             if all(
@@ -90,6 +81,33 @@ async def log_in(body: schemas.Auth) -> dict[str, str]:
         raise HTTPException(status_code=403)
 
 
+@app.post("/tracks/signed-urls", response_class=JSONResponse)
+async def sign_track_urls(
+    body: schemas.SignTracks, _api_key: APIKey = Depends(get_api_key)
+) -> dict[str, str]:
+    """
+    make short-lived signed Cloudfront URLs for tracks (the same URL is returned for a
+    track for a few minutes, so this is cheap to call before every play)
+
+    Parameters
+    ----------
+    body : schemas.SignTracks
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    dict[str, str]
+        the signed URL for each track ID
+    """
+
+    if body.expires_in <= 0:
+        raise HTTPException(status_code=400, detail="expires_in must be positive")
+
+    return await config.run_io(
+        config.cf_signer.signed_track_urls, body.track_ids, body.expires_in
+    )
+
+
 @app.post("/tracks/presign", response_class=JSONResponse)
 async def presign(
     body: schemas.Import, _api_key: APIKey = Depends(get_api_key)
@@ -108,8 +126,150 @@ async def presign(
         a payload for a presigned file upload to S3
     """
 
-    return config.s3_client.generate_presigned_post(
-        config.bucket, f"incoming/{body.filename}", ExpiresIn=60000
+    presigns = await config.run_io(
+        upload_utils.presign_posts, config.s3_client, config.bucket, [body.filename]
+    )
+
+    return presigns[body.filename]
+
+
+@app.post("/tracks/presign/batch", response_class=JSONResponse)
+async def presign_batch(
+    body: schemas.PresignBatch, _api_key: APIKey = Depends(get_api_key)
+) -> dict[str, dict[str, str | dict[str, str]]]:
+    """
+    presign upload URLs for many mp3 files to the incoming/ folder on S3 at once
+
+    Parameters
+    ----------
+    body : schemas.PresignBatch
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    dict[str, dict[str, str | dict[str, str]]]
+        a payload for a presigned file upload to S3 for each filename
+    """
+
+    return await config.run_io(
+        upload_utils.presign_posts, config.s3_client, config.bucket, body.filenames
+    )
+
+
+@app.post("/tracks/multipart", response_class=JSONResponse)
+async def start_multipart_upload(
+    body: schemas.MultipartStart, _api_key: APIKey = Depends(get_api_key)
+) -> dict[str, str | int | list]:
+    """
+    start a multipart upload of a (large) mp3 file to the incoming/ folder on S3 and
+    presign an upload URL for each part
+
+    Parameters
+    ----------
+    body : schemas.MultipartStart
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    dict[str, str | int | list]
+        the upload ID, the part size, and the part number and presigned URL of each part
+    """
+
+    if body.size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+
+    return await config.run_io(
+        upload_utils.start_multipart_upload,
+        config.s3_client,
+        config.bucket,
+        body.filename,
+        body.size,
+        body.part_size,
+    )
+
+
+@app.post("/tracks/multipart/resume", response_class=JSONResponse)
+async def resume_multipart_upload(
+    body: schemas.MultipartParts, _api_key: APIKey = Depends(get_api_key)
+) -> dict[str, str | int | list]:
+    """
+    get the parts of a multipart upload that have already been uploaded and presign
+    new upload URLs for the rest
+
+    Parameters
+    ----------
+    body : schemas.MultipartParts
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    dict[str, str | int | list]
+        the upload ID, the part size, the part numbers already uploaded, and the part
+        number and presigned URL of each remaining part
+    """
+
+    return await config.run_io(
+        upload_utils.resume_multipart_upload,
+        config.s3_client,
+        config.bucket,
+        body.filename,
+        body.upload_id,
+        body.size,
+        body.part_size,
+    )
+
+
+@app.post("/tracks/multipart/complete")
+async def complete_multipart_upload(
+    body: schemas.MultipartParts, _api_key: APIKey = Depends(get_api_key)
+) -> None:
+    """
+    finish a multipart upload once all of its parts have been uploaded, after which
+    the file can be imported
+
+    Parameters
+    ----------
+    body : schemas.MultipartParts
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    None
+    """
+
+    await config.run_io(
+        upload_utils.complete_multipart_upload,
+        config.s3_client,
+        config.bucket,
+        body.filename,
+        body.upload_id,
+        body.size,
+    )
+
+
+@app.post("/tracks/multipart/abort")
+async def abort_multipart_upload(
+    body: schemas.MultipartUpload, _api_key: APIKey = Depends(get_api_key)
+) -> None:
+    """
+    abort a multipart upload and delete any parts uploaded so far
+
+    Parameters
+    ----------
+    body : schemas.MultipartUpload
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    None
+    """
+
+    await config.run_io(
+        upload_utils.abort_multipart_upload,
+        config.s3_client,
+        config.bucket,
+        body.filename,
+        body.upload_id,
     )
 
 
@@ -133,30 +293,58 @@ async def import_track(
         the DB
     """
 
-    incoming_key = f"incoming/{body.filename}"
+    return await track_utils.import_incoming_file(config, body.filename, body.ranged)
 
-    logger.info(f"Saving {body.filename} to {config.tmp_mp3s_dir}...")
-    temp_f = os.path.join(config.tmp_mp3s_dir, body.filename)
-    config.s3_client.download_file(config.bucket, incoming_key, temp_f)
 
-    # get ID3 tags and other metadata
-    clean_tags = track_utils.extract_id3_tags(temp_f)
-    fp_duration = track_utils.fingerprint_track(temp_f)
+@app.post("/tracks/import/batch")
+async def import_tracks(
+    body: schemas.ImportBatch, _api_key: APIKey = Depends(get_api_key)
+) -> StreamingResponse:
+    """
+    import many mp3 tracks in the incoming/ folder on S3 concurrently, streaming back
+    newline-delimited JSON results for each track as soon as it's done
 
-    tid = fp_duration["id"]
-    perm_key = f"mp3s/{tid}.mp3"
+    Parameters
+    ----------
+    body : schemas.ImportBatch
+    _api_key : Depends(get_api_key)
 
-    # copy from incoming/ to mp3s/ if not already done
-    already_exists = track_utils.check_file_exists(
-        config.s3_client, config.bucket, perm_key
-    )
+    Returns
+    -------
+    StreamingResponse
+        one JSON object per line, each containing the `filename` and either its ID3
+        tags and other file metadata or an `error` message
+    """
 
-    if not already_exists:
-        track_utils.copy_incoming_file(
-            config.s3_client, config.bucket, incoming_key, perm_key
-        )
+    async def import_one(filename: str) -> dict[str, str | int | bool]:
+        try:
+            track = await track_utils.import_incoming_file(
+                config, filename, body.ranged
+            )
+
+            return {"filename": filename, **track}
+
+        except Exception as err:
+            detail = err.detail if isinstance(err, HTTPException) else str(err)
+            logger.error(f"Failed to import {filename}: {detail}")
+            return {"filename": filename, "error": detail}
+
+    async def stream_results() -> AsyncIterator[str]:
+        # each file is downloaded to a path based on its name, so a repeated name would
+        # have two tasks writing and deleting the same file
+        tasks = [
+            asyncio.create_task(import_one(x)) for x in dict.fromkeys(body.filenames)
+        ]
 
-    return {**fp_duration, **clean_tags, "already_exists": already_exists}
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield json.dumps(await task) + "\n"
+        finally:
+            # client disconnected before all tracks were done
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
 
 @app.delete("/tracks/{track_id}")
@@ -174,28 +362,9 @@ async def delete_track(track_id: str, _api_key: APIKey = Depends(get_api_key)) -
     None
     """
 
-    obj_key = f"mp3s/{track_id}.mp3"
-
-    try:
-        logger.info(f"Copying {obj_key} to trash...")
-        config.s3_client.copy_object(
-            Bucket=config.bucket,
-            Key=f"trash/{track_id}.mp3",
-            CopySource={"Bucket": config.bucket, "Key": obj_key},
-        )
-
-        # can delete copy in incoming/ now
-        logger.info(f"Deleting {obj_key}...")
-        config.s3_client.delete_object(Bucket=config.bucket, Key=obj_key)
-
-    except ClientError as err:
-        if err.response["ResponseMetadata"]["HTTPStatusCode"] == 404:
-            logger.info("Not found")
-        else:
-            logger.info(err)
-            raise HTTPException(
-                status_code=400, detail=err.response["Error"]["Message"]
-            )
+    await config.run_io(
+        track_utils.trash_track, config.s3_client, config.bucket, track_id
+    )
 
 
 @app.post("/tracks/retag")
@@ -203,7 +372,7 @@ async def retag_tracks(
     body: schemas.Retag, _api_key: APIKey = Depends(get_api_key)
 ) -> None:
     """
-    download an existing mp3 file from S3, update its ID3 tags, and re-upload it
+    download existing mp3 files from S3, update their ID3 tags, and re-upload them
 
     Parameters
     ----------
@@ -215,34 +384,76 @@ async def retag_tracks(
     None
     """
 
-    try:
-        for track_id, updated_tags in body.track_tags.items():
-            obj_key = f"mp3s/{track_id}.mp3"
+    errors = await track_utils.retag_many(
+        config, body.track_tags, in_place=body.in_place
+    )
+    errors = {k: v for k, v in errors.items() if v is not None}
 
-            logger.info(f"Downloading {obj_key} to {config.tmp_mp3s_dir}...")
-            temp_f = os.path.join(config.tmp_mp3s_dir, f"{track_id}.mp3")
+    if len(errors) > 0:
+        raise HTTPException(status_code=400, detail=errors)
 
-            if not os.path.isfile(temp_f):
-                config.s3_client.download_file(config.bucket, obj_key, temp_f)
 
-            track_utils.update_id3_tags(temp_f, updated_tags)
+@app.post("/tracks/retag/jobs", response_class=JSONResponse)
+async def start_retag_job(
+    body: schemas.Retag,
+    background_tasks: BackgroundTasks,
+    _api_key: APIKey = Depends(get_api_key),
+) -> dict[str, str]:
+    """
+    start retagging mp3 files in the background
 
-            logger.info("Reuploading file...")
-            config.s3_client.upload_file(
-                Filename=temp_f, Bucket=config.bucket, Key=obj_key
-            )
+    Parameters
+    ----------
+    body : schemas.Retag
+    background_tasks : BackgroundTasks
+    _api_key : Depends(get_api_key)
 
-    except Exception as err:
-        logger.error(err)
-        raise HTTPException(status_code=400, detail=str(err))
+    Returns
+    -------
+    dict[str, str]
+        the job ID to poll for progress
+    """
+
+    job_id = await config.run_io(config.retag_jobs.create, list(body.track_tags))
+    background_tasks.add_task(
+        track_utils.retag_many, config, body.track_tags, job_id, body.in_place
+    )
+
+    return {"job_id": job_id}
+
+
+@app.get("/tracks/retag/jobs/{job_id}", response_class=JSONResponse)
+async def get_retag_job(
+    job_id: str, _api_key: APIKey = Depends(get_api_key)
+) -> dict[str, object]:
+    """
+    get the progress of a background retag job
+
+    Parameters
+    ----------
+    job_id : str
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    dict[str, object]
+        counts of tracks by status and the status/error of each track
+    """
+
+    job = await config.run_io(config.retag_jobs.get, job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404)
+
+    return job
 
 
 @app.post("/tracks/scrobble")
-async def delete_track(
+async def scrobble(
     body: schemas.Scrobble, _api_key: APIKey = Depends(get_api_key)
 ) -> None:
     """
-    submit a scrobble to last.fm
+    queue a scrobble to be submitted to last.fm in the background
 
     Parameters
     ----------
@@ -254,24 +465,72 @@ async def delete_track(
     None
     """
 
-    lastfm = pylast.LastFMNetwork(
-        api_key=os.environ["LASTFM_API_KEY"],
-        api_secret=os.environ["LASTFM_API_SECRET"],
-        session_key=os.environ["LASTFM_SESSION_KEY"],
-        username=os.environ["LASTFM_USERNAME"],
-    )
+    await config.queue_scrobble({**body.dict(), "timestamp": int(time.time())})
 
-    lastfm.scrobble(
-        album_artist=body.album_artist,
-        artist=body.artist,
-        album=body.album,
-        track_number=body.track_number,
-        title=body.title,
-        duration=body.duration,
-        timestamp=int(time.time()),
-    )
 
-    logger.info(f"Scrobbled '{body.title}'.")
+@app.post("/tracks/play")
+async def record_play(
+    body: schemas.Play, _api_key: APIKey = Depends(get_api_key)
+) -> None:
+    """
+    record that a track was played (the play is buffered and inserted into the DB along
+    with other recent plays a few seconds later) and queue its scrobble, if any
+
+    Parameters
+    ----------
+    body : schemas.Play
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    None
+    """
+
+    dt = body.dt if body.dt is not None else round(time.time() * 1000)
+    await config.run_io(config.play_buffer.add, body.track_id, dt)
+
+    if body.scrobble is not None:
+        await config.queue_scrobble({**body.scrobble.dict(), "timestamp": dt // 1000})
+
+
+@app.get("/tracks/play/buffer")
+async def play_buffer_stats(
+    _api_key: APIKey = Depends(get_api_key),
+) -> dict[str, int]:
+    """
+    get the number of plays waiting to be inserted into the DB and counts of inserted
+    and dropped (because the track was deleted or the play was already recorded) plays
+
+    Parameters
+    ----------
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    dict[str, int]
+    """
+
+    return await config.run_io(config.play_buffer.stats)
+
+
+@app.get("/tracks/scrobble/queue")
+async def scrobble_queue_stats(
+    _api_key: APIKey = Depends(get_api_key),
+) -> dict[str, int | float | None]:
+    """
+    get the number of scrobbles waiting to be submitted to last.fm (and how old the
+    oldest one is) and counts of submitted, failed, and dropped scrobbles
+
+    Parameters
+    ----------
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    dict[str, int | float | None]
+    """
+
+    return await config.run_io(config.scrobble_queue.stats)
 
 
 @app.post("/mb/check")
@@ -288,49 +547,105 @@ async def mb_check(_api_key: APIKey = Depends(get_api_key)) -> None:
     None
     """
 
-    with psycopg2.connect(os.environ["DATABASE_URL"]) as conn:
-        with conn.cursor() as cur:
-            # pick an artist and check for new releases
-            artist_id, existing_release_ids = mb_utils.get_an_artist_and_releases(cur)
-            releases = mb_utils.get_mb_releases(artist_id)
+    from utils import mb as mb_utils
+
+    await config.run_io(mb_utils.check_an_artist, config.db_pool, config.mb_cache)
+    logger.info("Done.")
+
+
+@app.post("/mb/sweep")
+async def mb_sweep(
+    _api_key: APIKey = Depends(get_api_key),
+) -> dict[str, int | float]:
+    """
+    check MusicBrainz for new releases for as many of the least recently checked
+    artists as possible within a time budget (shorter than the cron interval)
+
+    Parameters
+    ----------
+    _api_key : Depends(get_api_key)
 
-            if len(releases) > 0:
-                # there are releases in the MusicBrainz DB
-                new_releases = mb_utils.filter_new_releases(
-                    artist_id, existing_release_ids, releases
-                )
+    Returns
+    -------
+    dict[str, int | float]
+        counts of artists checked and failed, number of MusicBrainz requests made, and
+        the elapsed time
+    """
 
-                if len(new_releases) > 0:
-                    # there are releases of interest not in DB
-                    mb_utils.insert_releases(cur, new_releases)
-                    mb_utils.insert_artist_releases(cur, new_releases)
+    from utils import mb as mb_utils
 
-            # check for new artist relationships (e.g. is a member of band X)
-            relationships = mb_utils.get_mb_relationships(artist_id)
+    return await config.run_io(
+        mb_utils.sweep_artists,
+        config.db_pool,
+        config.mb_cache,
+        time_budget=float(os.getenv("MB_SWEEP_TIME_BUDGET", "240")),
+        n_workers=int(os.getenv("MB_SWEEP_WORKERS", "4")),
+    )
 
-            if len(relationships) > 0:
-                # there are artist relationships in the MusicBrainz DB
-                existing_relationships = mb_utils.get_existing_relationships(
-                    cur, artist_id
-                )
-                new_relationships = mb_utils.filter_new_relationships(
-                    relationships, existing_relationships
-                )
 
-                if len(new_relationships) > 0:
-                    # there are artist relationships of interest not in DB
-                    mb_utils.insert_relationships(cur, new_relationships)
+@app.get("/mb/cache")
+async def mb_cache_stats(
+    _api_key: APIKey = Depends(get_api_key),
+) -> dict[str, int]:
+    """
+    get the size and hit/miss counts of the MusicBrainz response cache
 
-            # mark artist as checked (i.e. send to back of queue)
-            mb_utils.checked_artist(cur, artist_id)
+    Parameters
+    ----------
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    dict[str, int]
+    """
+
+    return await config.run_io(config.mb_cache.stats)
 
-    logger.info("Done.")
+
+@app.get("/db/pool")
+async def db_pool_stats(
+    _api_key: APIKey = Depends(get_api_key),
+) -> dict[str, int | float]:
+    """
+    get the size and usage of this worker's DB connection pool and how long requests
+    have waited for a connection
+
+    Parameters
+    ----------
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    dict[str, int | float]
+    """
+
+    return config.db_pool.stats()
+
+
+@app.get("/tracks/fingerprint-cache")
+async def fingerprint_cache_stats(
+    _api_key: APIKey = Depends(get_api_key),
+) -> dict[str, int]:
+    """
+    get the size and hit/miss counts of the fingerprint cache
+
+    Parameters
+    ----------
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    dict[str, int]
+    """
+
+    return await config.run_io(config.fp_cache.stats)
 
 
 @app.post("/clean")
 async def clean_tmp_mp3s_dir(_api_key: APIKey = Depends(get_api_key)) -> None:
     """
-    clean up temporary mp3s directory
+    reconcile the temporary mp3s directory with its index and evict files beyond its
+    size limit (the cache normally evicts files as soon as it goes over budget)
 
     Parameters
     ----------
@@ -341,4 +656,23 @@ async def clean_tmp_mp3s_dir(_api_key: APIKey = Depends(get_api_key)) -> None:
     None
     """
 
-    do_clean_tmp_mp3s_dir(config.tmp_mp3s_dir, config.tmp_mp3s_max_size)
+    await config.run_io(config.mp3_cache.clean)
+
+
+@app.get("/tracks/mp3-cache")
+async def mp3_cache_stats(
+    _api_key: APIKey = Depends(get_api_key),
+) -> dict[str, int | float]:
+    """
+    get the occupancy and hit rate of the temporary mp3s directory
+
+    Parameters
+    ----------
+    _api_key : Depends(get_api_key)
+
+    Returns
+    -------
+    dict[str, int | float]
+    """
+
+    return await config.run_io(config.mp3_cache.stats)
@@ -0,0 +1,30 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from utils.mp3_cache import Mp3Cache
+
+
+@pytest.fixture
+def bucket() -> str:
+    return "bucket"
+
+
+@pytest.fixture
+def s3_client(monkeypatch, bucket):
+    # moto never uses these, but boto3 won't make a client without them
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "x")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+
+    with mock_aws():
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket=bucket)
+        yield s3_client
+
+
+@pytest.fixture
+def mp3_cache(tmp_path) -> Mp3Cache:
+    return Mp3Cache(
+        str(tmp_path / "mp3s"), 100 * 1024 * 1024, str(tmp_path / "mp3s.sqlite3")
+    )
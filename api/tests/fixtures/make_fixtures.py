@@ -0,0 +1,145 @@
+"""
+regenerate the golden test fixtures from the legacy pandas-based implementations in
+`benchmarks` (only needed if the cases change, since the expected outputs must never
+change)
+
+    poetry run python tests/fixtures/make_fixtures.py
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from benchmarks.mb_diff import (  # noqa: E402
+    legacy_dt_to_int,
+    legacy_filter_new_relationships,
+    legacy_filter_new_releases,
+    make_artist,
+    make_date,
+)
+from benchmarks.track_id import legacy_track_id, make_corpus  # noqa: E402
+
+fixtures_dir = os.path.dirname(__file__)
+
+
+def write(name: str, cases: list | dict) -> None:
+    with open(os.path.join(fixtures_dir, name), "w") as f:
+        json.dump(cases, f, indent=1, ensure_ascii=False)
+        f.write("\n")
+
+
+def make_track_ids() -> None:
+    random.seed(0)
+
+    # shorter fingerprints than real ones, to keep the fixture small
+    corpus = [(d, fp[:120]) for d, fp in make_corpus(300)]
+
+    # float formatting and string escaping edge cases
+    corpus += [
+        (d, b"AQADtEmUJEmS")
+        for d in [
+            0.0,
+            1.0,
+            -1.5,
+            0.5,
+            1e-15,
+            9.9e-16,
+            1e16 - 1,
+            1e16,
+            1.23456789012345e20,
+            0.99999999999,
+            2.00000000005,
+            2.00000000015,
+            123.45678901234,
+            2.5e-11,
+            3.5e-10,
+        ]
+    ]
+
+    corpus += [
+        (200.0, x.encode())
+        for x in ["", "a/b", 'q"uote', "back\\slash", "del\x7fchar", "tab\tnl\n"]
+    ]
+
+    write(
+        "track_ids.json",
+        [
+            {
+                "duration": d,
+                "fingerprint": fp.decode(),
+                "track_id": legacy_track_id(d, fp),
+            }
+            for d, fp in corpus
+        ],
+    )
+
+
+def make_mb_diffs() -> None:
+    random.seed(0)
+    cases = []
+
+    for n in [1, 1, 5, 5, 20, 20, 50] * 3:
+        artist_id, releases, relationships = make_artist(n)
+
+        # some of the existing releases/relationships aren't in MusicBrainz anymore
+        existing_release_ids = [
+            x.mb_release_id for x in random.sample(releases, random.randint(0, n))
+        ] + [f"gone-{i}" for i in range(random.randint(0, 3))]
+
+        existing_relationships = [
+            list(x.key)
+            for x in random.sample(relationships, random.randint(0, len(relationships)))
+        ]
+
+        new_releases = legacy_filter_new_releases(
+            artist_id, existing_release_ids, [x._asdict() for x in releases]
+        )
+
+        new_relationships = legacy_filter_new_relationships(
+            [x._asdict() for x in relationships],
+            [
+                dict(
+                    zip(["mb_artist_id", "type", "direction", "other_mb_artist_id"], x)
+                )
+                for x in existing_relationships
+            ],
+        )
+
+        cases.append(
+            {
+                "artist_id": artist_id,
+                "releases": [x._asdict() for x in releases],
+                "existing_release_ids": existing_release_ids,
+                "relationships": [x._asdict() for x in relationships],
+                "existing_relationships": existing_relationships,
+                "new_releases": [
+                    [*x[:4], sorted(x[4], key=str)]
+                    for x in new_releases.itertuples(index=False, name=None)
+                ],
+                "new_relationships": [
+                    list(x)
+                    for x in new_relationships.itertuples(index=False, name=None)
+                ],
+            }
+        )
+
+    dates = [make_date() for _ in range(200)]
+    dates += ["1900", "1970", "1970-01", "1969-12-31", "2000-02-29", "2030-12-31"]
+
+    write(
+        "mb_diffs.json",
+        {
+            "cases": cases,
+            "dates": [{"date": x, "ms": legacy_dt_to_int(x)} for x in dates],
+        },
+    )
+
+
+if __name__ == "__main__":
+    make_track_ids()
+    make_mb_diffs()
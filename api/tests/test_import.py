@@ -0,0 +1,70 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from utils import tracks
+
+filename = "upload.mp3"
+
+
+@pytest.fixture
+def config(s3_client, bucket, mp3_cache):
+    async def run(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    s3_client.put_object(
+        Bucket=bucket, Key=f"incoming/{filename}", Body=os.urandom(64 * 1024)
+    )
+
+    return SimpleNamespace(
+        s3_client=s3_client,
+        bucket=bucket,
+        tmp_mp3s_dir=mp3_cache.cache_dir,
+        mp3_cache=mp3_cache,
+        fp_cache=SimpleNamespace(get=lambda etag, size: None, put=lambda *x: None),
+        download_semaphore=asyncio.Semaphore(1),
+        run_io=run,
+        run_cpu=run,
+    )
+
+
+def fail(*args, **kwargs):
+    raise RuntimeError("failed")
+
+
+@pytest.mark.parametrize("ranged", [False, True], ids=["full", "ranged"])
+@pytest.mark.parametrize("failing", ["read_track", "copy_incoming_file"])
+def test_import_failure_leaves_no_file(config, monkeypatch, ranged, failing) -> None:
+    monkeypatch.setattr(tracks, "read_track", lambda f: {"id": "abc"})
+    monkeypatch.setattr(tracks, failing, fail)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(tracks.import_incoming_file(config, filename, ranged=ranged))
+
+    assert os.listdir(config.tmp_mp3s_dir) == []
+
+
+def test_failed_download_leaves_no_part_file(config, monkeypatch) -> None:
+    get_object = config.s3_client.get_object
+
+    def get_broken_object(**kwargs):
+        obj = get_object(**kwargs)
+
+        def iter_chunks(chunk_size):
+            yield obj["Body"].read(1024)
+            raise ConnectionError("connection reset")
+
+        obj["Body"].iter_chunks = iter_chunks
+        return obj
+
+    monkeypatch.setattr(config.s3_client, "get_object", get_broken_object)
+    temp_f = config.mp3_cache.path(filename)
+
+    with pytest.raises(ConnectionError):
+        tracks.download_if_changed(
+            config.s3_client, config.bucket, f"incoming/{filename}", temp_f, None
+        )
+
+    assert os.listdir(config.tmp_mp3s_dir) == []
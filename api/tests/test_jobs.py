@@ -0,0 +1,143 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from types import SimpleNamespace
+
+from utils import tracks
+from utils.jobs import RetagJobs
+
+
+def test_job_progress(tmp_path) -> None:
+    jobs = RetagJobs(str(tmp_path / "jobs.sqlite3"), max_age=60)
+    job_id = jobs.create(["a", "b"])
+
+    jobs.update(job_id, "a", "done")
+    jobs.update(job_id, "b", "running")
+
+    job = jobs.get(job_id)
+    assert job["n_done"] == 1
+    assert job["n_failed"] == 0
+    assert not job["finished"]
+    assert jobs.get("missing") is None
+
+
+def test_stale_job_reported_as_failed(tmp_path) -> None:
+    jobs = RetagJobs(str(tmp_path / "jobs.sqlite3"), max_age=60, stale_after=0.2)
+    job_id = jobs.create(["a", "b", "c"])
+
+    jobs.update(job_id, "a", "done")
+    jobs.update(job_id, "b", "running")
+
+    # a heartbeat keeps the job alive
+    time.sleep(0.15)
+    jobs.heartbeat(job_id)
+    time.sleep(0.1)
+    assert not jobs.get(job_id)["finished"]
+
+    # the worker stops beating
+    time.sleep(0.2)
+    job = jobs.get(job_id)
+    assert job["finished"]
+    assert job["n_done"] == 1
+    assert job["n_failed"] == 2
+    assert job["tracks"]["a"]["status"] == "done"
+    assert job["tracks"]["b"]["status"] == "failed"
+    assert job["tracks"]["c"]["error"] is not None
+
+
+def test_adds_heartbeat_column_to_old_db(tmp_path) -> None:
+    path = str(tmp_path / "jobs.sqlite3")
+
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(
+            """
+            create table retag_jobs (
+                job_id text not null,
+                track_id text not null,
+                status text not null,
+                error text,
+                created_at real not null,
+                primary key (job_id, track_id)
+            )
+            """
+        )
+
+    jobs = RetagJobs(path, max_age=60)
+    job_id = jobs.create(["a"])
+    assert jobs.get(job_id)["tracks"]["a"]["status"] == "pending"
+
+
+def make_config(jobs: RetagJobs, io_pool: ThreadPoolExecutor) -> SimpleNamespace:
+    async def run_io(fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(io_pool, fn, *args)
+
+    return SimpleNamespace(
+        retag_jobs=jobs,
+        retag_semaphore=asyncio.Semaphore(2),
+        run_io=run_io,
+        s3_client=None,
+        bucket="bucket",
+        mp3_cache=None,
+    )
+
+
+def test_status_error_fails_only_its_track(tmp_path, monkeypatch) -> None:
+    jobs = RetagJobs(str(tmp_path / "jobs.sqlite3"), max_age=60)
+    job_id = jobs.create(["a", "b"])
+    update = jobs.update
+
+    def flaky_update(job_id, track_id, status, error=None):
+        if track_id == "a" and status == "running":
+            raise sqlite3.OperationalError("database is locked")
+
+        update(job_id, track_id, status, error)
+
+    monkeypatch.setattr(jobs, "update", flaky_update)
+    monkeypatch.setattr(tracks, "retag_track", lambda *args: None)
+
+    with ThreadPoolExecutor(2) as io_pool:
+        errors = asyncio.run(
+            tracks.retag_many(make_config(jobs, io_pool), {"a": {}, "b": {}}, job_id)
+        )
+
+    assert errors == {"a": "database is locked", "b": None}
+    assert jobs.get(job_id)["tracks"]["a"]["status"] == "failed"
+    assert jobs.get(job_id)["tracks"]["b"]["status"] == "done"
+
+
+def test_heartbeat_with_busy_io_pool(tmp_path, monkeypatch) -> None:
+    jobs = RetagJobs(str(tmp_path / "jobs.sqlite3"), max_age=60, stale_after=0.4)
+    job_id = jobs.create(["a", "b"])
+    heartbeat = jobs.heartbeat
+    beats = []
+
+    def flaky_heartbeat(job_id):
+        beats.append(time.time())
+
+        if len(beats) == 1:
+            raise sqlite3.OperationalError("database is locked")
+
+        heartbeat(job_id)
+
+    monkeypatch.setattr(jobs, "heartbeat", flaky_heartbeat)
+    monkeypatch.setattr(tracks, "retag_track", lambda *args: time.sleep(1))
+
+    async def retag_and_poll() -> dict:
+        # the only I/O thread is busy retagging "a" while "b" waits for it
+        task = asyncio.create_task(
+            tracks.retag_many(make_config(jobs, io_pool), {"a": {}, "b": {}}, job_id)
+        )
+
+        await asyncio.sleep(1.5)
+        job = jobs.get(job_id)
+        await task
+        return job
+
+    with ThreadPoolExecutor(1) as io_pool:
+        job = asyncio.run(retag_and_poll())
+
+    assert len(beats) > 2
+    assert not job["finished"]
+    assert jobs.get(job_id)["n_done"] == 2
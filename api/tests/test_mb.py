@@ -0,0 +1,46 @@
+import json
+import os
+
+import pytest
+
+from utils import mb as mb_utils
+
+fixtures_dir = os.path.join(os.path.dirname(__file__), "fixtures")
+
+with open(os.path.join(fixtures_dir, "mb_diffs.json")) as f:
+    mb_diffs = json.load(f)
+
+
+@pytest.mark.parametrize("case", mb_diffs["cases"], ids=lambda x: x["artist_id"][:8])
+def test_filter_new_releases_matches_legacy(case: dict) -> None:
+    releases = [mb_utils.ReleaseGroup(**x) for x in case["releases"]]
+
+    new_releases = mb_utils.filter_new_releases(
+        case["artist_id"], set(case["existing_release_ids"]), releases
+    )
+
+    assert [[*x[:4], sorted(x.types, key=str)] for x in new_releases] == case[
+        "new_releases"
+    ]
+
+
+@pytest.mark.parametrize("case", mb_diffs["cases"], ids=lambda x: x["artist_id"][:8])
+def test_filter_new_relationships_matches_legacy(case: dict) -> None:
+    relationships = [mb_utils.Relationship(**x) for x in case["relationships"]]
+
+    new_relationships = mb_utils.filter_new_relationships(
+        relationships, {tuple(x) for x in case["existing_relationships"]}
+    )
+
+    assert [list(x) for x in new_relationships] == case["new_relationships"]
+
+
+def test_date_to_ms_matches_legacy() -> None:
+    assert [mb_utils.date_to_ms(x["date"]) for x in mb_diffs["dates"]] == [
+        x["ms"] for x in mb_diffs["dates"]
+    ]
+
+
+def test_date_to_ms_invalid() -> None:
+    assert mb_utils.date_to_ms("2001-13") is None
+    assert mb_utils.date_to_ms("2001-02-30") is None
@@ -0,0 +1,53 @@
+import io
+import os
+
+import pytest
+from mutagen.easyid3 import EasyID3
+from mutagen.id3 import ID3
+
+from utils.tracks import id3v2_size, min_part_size, retag_track_in_place
+
+track_id = "abc"
+obj_key = f"mp3s/{track_id}.mp3"
+
+
+def make_mp3(path: str, audio: bytes) -> None:
+    # mutagen only touches the tag, so the "audio" can be any bytes
+    with open(path, "wb") as f:
+        f.write(audio)
+
+    tags = ID3()
+    tags.save(path)
+
+    tags = EasyID3(path)
+    tags["title"] = "Old title"
+    tags["artist"] = "Artist"
+    tags.save()
+
+
+def split_mp3(body: bytes) -> tuple[EasyID3, bytes]:
+    tag_size = id3v2_size(body[:10])
+    return EasyID3(io.BytesIO(body[:tag_size])), body[tag_size:]
+
+
+@pytest.mark.parametrize(
+    "title",
+    ["New title", "x" * min_part_size],  # a huge tag falls back to a full rewrite
+    ids=["in_place", "huge_tag"],
+)
+def test_retag_in_place_keeps_audio(
+    s3_client, bucket, mp3_cache, tmp_path, title
+) -> None:
+    audio = os.urandom(min_part_size + 1024 * 1024)
+    mp3_f = str(tmp_path / "track.mp3")
+    make_mp3(mp3_f, audio)
+    s3_client.upload_file(Filename=mp3_f, Bucket=bucket, Key=obj_key)
+
+    retag_track_in_place(s3_client, bucket, mp3_cache, track_id, {"title": title})
+
+    body = s3_client.get_object(Bucket=bucket, Key=obj_key)["Body"].read()
+    tags, new_audio = split_mp3(body)
+
+    assert tags["title"] == [title]
+    assert tags["artist"] == ["Artist"]
+    assert new_audio == audio
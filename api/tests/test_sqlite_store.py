@@ -0,0 +1,19 @@
+from contextlib import closing
+
+from utils.sqlite_store import SqliteStore
+
+
+def test_counters(tmp_path) -> None:
+    store = SqliteStore(str(tmp_path / "store.sqlite3"))
+
+    with closing(store.connect()) as conn, conn:
+        store.increment(conn, "hits")
+        store.increment(conn, "hits", 2)
+        store.increment(conn, "misses")
+
+    # counters persist across connections (and instances, e.g. other workers)
+    other = SqliteStore(store.db_path)
+
+    with closing(other.connect()) as conn:
+        assert other.counters(conn) == {"hits": 3, "misses": 1}
+        assert conn.execute("pragma journal_mode").fetchone()[0] == "wal"
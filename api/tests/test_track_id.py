@@ -0,0 +1,21 @@
+import json
+import os
+
+import pytest
+
+from utils.track_id import make_track_id
+
+fixtures_dir = os.path.join(os.path.dirname(__file__), "fixtures")
+
+with open(os.path.join(fixtures_dir, "track_ids.json")) as f:
+    track_ids = json.load(f)
+
+
+@pytest.mark.parametrize("case", track_ids, ids=[x["track_id"][:8] for x in track_ids])
+def test_make_track_id_matches_legacy(case: dict) -> None:
+    """
+    track IDs must match the ones the legacy pandas method gave, or previously imported
+    tracks would get new IDs
+    """
+
+    assert make_track_id(case["duration"], case["fingerprint"]) == case["track_id"]
@@ -1,20 +1,46 @@
-import logging
+from __future__ import annotations
+
+import asyncio
+import base64
+import functools
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import cached_property
+from typing import TYPE_CHECKING, Any, Callable, TypeVar
 
-import boto3
-import musicbrainzngs as mb
-from botocore.config import Config
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Security
+from fastapi.logger import logger
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
 
+from utils.cf_signed_url import CloudfrontSigner
+from utils.db_pool import DbPool
+from utils.fp_cache import FingerprintCache
+from utils.jobs import RetagJobs
+from utils.mb_cache import MbCache
+from utils.mp3_cache import Mp3Cache
+from utils.plays import PlayBuffer
+from utils.rate_limit import TokenBucket
+from utils.scrobbles import ScrobbleQueue
+
+if TYPE_CHECKING:
+    import pylast
+    from botocore.client import BaseClient
+
+T = TypeVar("T")
+
 
 class ApiConfig:
     def __init__(self, app: FastAPI):
         """
         configure the API based on the current environment
 
+        Clients for S3, MusicBrainz, and last.fm (and the libraries they need) are only
+        created when first used, so that worker startup is fast and nothing that can't
+        be shared across processes is created before gunicorn forks the workers.
+
         Parameters
         ----------
         app : FastAPI
@@ -24,38 +50,72 @@ class ApiConfig:
             # get environment from local .env
             load_dotenv()
 
-            import pandas as pd
+        # MusicBrainz allows 1 request per second, enforced by a shared limiter that
+        # (unlike musicbrainzngs' own) lets concurrent requests be in flight at once
+        self.mb_limiter = TokenBucket(float(os.getenv("MB_REQUESTS_PER_SECOND", "1")))
 
-            # set Pandas options
-            pd.set_option("display.max_columns", 30)
-            pd.set_option("display.max_colwidth", 50)
-            pd.set_option("display.max_info_columns", 30)
-            pd.set_option("display.max_info_rows", 20)
-            pd.set_option("display.max_rows", 20)
-            pd.set_option("display.max_seq_items", None)
-            pd.set_option("display.width", 200)
-            pd.set_option("expand_frame_repr", True)
-            pd.set_option("mode.chained_assignment", "warn")
+        self.tmp_mp3s_dir = "/tmp/mp3s"
+        # bytes (may be given in scientific notation)
+        self.tmp_mp3s_max_size = int(float(os.getenv("TMP_MP3S_MAX_SIZE", "1e9")))
+        self.mp3_cache = Mp3Cache(
+            self.tmp_mp3s_dir, self.tmp_mp3s_max_size, "/tmp/mp3_cache.sqlite3"
+        )
 
-        # must identify this app to MusicBrainz API
-        mb.set_useragent(
-            os.environ["MUSICBRAINZ_APP_NAME"],
-            os.environ["MUSICBRAINZ_APP_VERSION"],
-            os.environ["MUSICBRAINZ_CONTACT"],
+        # blocking S3/DB/last.fm calls run in a dedicated thread pool and CPU-bound
+        # fingerprinting runs in a bounded process pool (see `fp_executor`), so the event
+        # loop stays free to serve other requests (e.g. health checks) while an import is
+        # in flight
+        self.io_pool_size = int(os.getenv("IO_POOL_SIZE", "16"))
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=self.io_pool_size, thread_name_prefix="io"
         )
-        mb.set_format("json")
-        mb.set_rate_limit(1, 1)
+        app.add_event_handler("startup", self.warm_up)
+        app.add_event_handler("shutdown", self.shutdown)
 
-        self.tmp_mp3s_dir = "/tmp/mp3s"
-        self.tmp_mp3s_max_size = int(1e9)  # in bytes
-        os.makedirs(self.tmp_mp3s_dir, exist_ok=True)
+        # fingerprints and tags of imported files, so that re-importing the same file
+        # only costs a HEAD request
+        self.fp_cache = FingerprintCache(
+            "/tmp/fp_cache.sqlite3",
+            max_entries=int(os.getenv("FP_CACHE_MAX_ENTRIES", "10000")),
+        )
 
-        self.s3_client = boto3.client(
-            "s3",
-            region_name="us-east-2",  # should be region available on render.com
-            config=Config(signature_version="s3v4", retries={"max_attempts": 3}),
+        # limit how many files are downloaded from S3 at once across all requests
+        self.download_semaphore = asyncio.Semaphore(
+            int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "8"))
+        )
+
+        # limit how many tracks are being retagged at once, and keep track of background
+        # retag jobs for a day
+        self.retag_semaphore = asyncio.Semaphore(
+            int(os.getenv("MAX_CONCURRENT_RETAGS", "8"))
+        )
+        self.retag_jobs = RetagJobs(
+            "/tmp/retag_jobs.sqlite3",
+            max_age=24 * 60 * 60,
+            stale_after=float(os.getenv("RETAG_JOB_STALE_AFTER", "60")),
         )
 
+        # Postgres connections for DB-backed routes (opened after the worker starts)
+        self.db_pool = DbPool(
+            os.getenv("DATABASE_URL", ""),
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            check_after=float(os.getenv("DB_POOL_CHECK_AFTER", "30")),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        )
+
+        # scrobbles are queued and submitted to last.fm in batches in the background (if
+        # last.fm is configured)
+        self.scrobble_queue = ScrobbleQueue("/tmp/scrobble_queue.sqlite3")
+        self.scrobble_interval = float(os.getenv("SCROBBLE_INTERVAL", "10"))
+        self.scrobble_added = asyncio.Event()
+
+        # plays are buffered and inserted into the DB in batches in the background
+        self.play_buffer = PlayBuffer("/tmp/play_buffer.sqlite3")
+        self.play_flush_interval = float(os.getenv("PLAY_FLUSH_INTERVAL", "5"))
+
+        self.background_tasks: list[asyncio.Task] = []
+
         # S3 bucket name for mp3 storage
         self.bucket = os.environ["BUCKET_NAME"]
 
@@ -79,6 +139,288 @@ class ApiConfig:
             allow_credentials=True,
         )
 
+    @cached_property
+    def s3_client(self) -> BaseClient:
+        """
+        the S3 client (boto3 is slow to import and clients can't be shared across
+        processes)
+
+        Returns
+        -------
+        BaseClient
+        """
+
+        import boto3
+        from botocore.config import Config
+
+        return boto3.client(
+            "s3",
+            region_name="us-east-2",  # should be region available on render.com
+            config=Config(
+                signature_version="s3v4",
+                retries={"max_attempts": 3},
+                max_pool_connections=self.io_pool_size,  # one per I/O thread
+            ),
+        )
+
+    @cached_property
+    def fp_executor(self) -> ProcessPoolExecutor:
+        """
+        the process pool for fingerprinting (its queues can't be shared across
+        processes either)
+
+        Returns
+        -------
+        ProcessPoolExecutor
+        """
+
+        # by now the worker is running I/O threads, so forking it could copy a lock
+        # that one of them holds (e.g. the import or logging lock) into the child
+        return ProcessPoolExecutor(
+            max_workers=int(os.getenv("FP_POOL_SIZE", "2")),
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+
+    @cached_property
+    def mb_cache(self) -> MbCache:
+        """
+        the MusicBrainz response cache, so that retrying a failed artist check doesn't
+        spend the rate limit again (release groups are only cached briefly so that new
+        releases are still noticed on the next sweep, artist relationships rarely
+        change)
+
+        Returns
+        -------
+        MbCache
+        """
+
+        import musicbrainzngs as mb
+
+        # must identify this app to MusicBrainz API
+        mb.set_useragent(
+            os.environ["MUSICBRAINZ_APP_NAME"],
+            os.environ["MUSICBRAINZ_APP_VERSION"],
+            os.environ["MUSICBRAINZ_CONTACT"],
+        )
+        mb.set_format("json")
+        mb.set_rate_limit(False)  # see `mb_limiter`
+
+        return MbCache(
+            "/tmp/mb_cache.sqlite3",
+            self.mb_limiter,
+            ttls={"release-groups": 15 * 60, "artist": 12 * 60 * 60},
+            stale_while_revalidate=float(
+                os.getenv("MB_CACHE_STALE_WHILE_REVALIDATE", "0")
+            ),
+            executor=self.io_executor,
+        )
+
+    @cached_property
+    def cf_signer(self) -> CloudfrontSigner:
+        """
+        the Cloudfront URL signer (which parses the private key once per worker and
+        reuses signatures)
+
+        Returns
+        -------
+        CloudfrontSigner
+        """
+
+        return CloudfrontSigner(
+            cloudfront_url=os.environ["CLOUDFRONT_URL"],
+            cloudfront_keypair_id=os.environ["CLOUDFRONT_KEYPAIR_ID"],
+            cloudfront_private_key=base64.b64decode(
+                os.environ["CLOUDFRONT_PRIVATE_KEY"]
+            ).decode("utf8"),
+            expiry_granularity=int(os.getenv("CLOUDFRONT_EXPIRY_GRANULARITY", "300")),
+        )
+
+    @cached_property
+    def lastfm(self) -> pylast.LastFMNetwork:
+        """
+        the last.fm client
+
+        Returns
+        -------
+        pylast.LastFMNetwork
+        """
+
+        import pylast
+
+        return pylast.LastFMNetwork(
+            api_key=os.environ["LASTFM_API_KEY"],
+            api_secret=os.environ["LASTFM_API_SECRET"],
+            session_key=os.environ["LASTFM_SESSION_KEY"],
+            username=os.environ["LASTFM_USERNAME"],
+        )
+
+    def warm_up(self) -> None:
+        """
+        create the S3 client and open the DB pool in the background once a worker has
+        started, so that neither startup nor the first request that needs them waits,
+        and start submitting queued scrobbles and buffered plays
+
+        Returns
+        -------
+        None
+        """
+
+        self.io_executor.submit(lambda: self.s3_client)
+
+        if os.getenv("LASTFM_SESSION_KEY") is not None:
+            self.background_tasks.append(
+                asyncio.create_task(
+                    self.flush_forever(
+                        lambda: self.scrobble_queue.flush(self.lastfm),
+                        batch_size=self.scrobble_queue.batch_size,
+                        interval=self.scrobble_interval,
+                        wake_up=self.scrobble_added,
+                    )
+                )
+            )
+
+        if self.db_pool.db_url != "":
+            self.io_executor.submit(self.db_pool.open)
+
+            self.background_tasks.append(
+                asyncio.create_task(
+                    self.flush_forever(
+                        lambda: self.play_buffer.flush(self.db_pool),
+                        batch_size=self.play_buffer.batch_size,
+                        interval=self.play_flush_interval,
+                    )
+                )
+            )
+
+    async def flush_forever(
+        self,
+        flush: Callable[[], int],
+        batch_size: int,
+        interval: float,
+        wake_up: asyncio.Event | None = None,
+    ) -> None:
+        """
+        repeatedly flush a batch from a queue (in the I/O thread pool) until the worker
+        shuts down, waiting `interval` seconds (or until `wake_up` is set) whenever the
+        queue has been emptied
+
+        Parameters
+        ----------
+        flush : Callable[[], int]
+            flushes a batch and returns the number of items flushed
+        batch_size : int
+            maximum number of items `flush` flushes at once
+        interval : float
+        wake_up : asyncio.Event | None
+            set when something is added to the queue
+
+        Returns
+        -------
+        None
+        """
+
+        while True:
+            try:
+                n = await self.run_io(flush)
+            except Exception:
+                logger.exception("Failed to flush queue")
+                n = 0
+
+            if n == batch_size:
+                # there might be more
+                continue
+
+            if wake_up is None:
+                await asyncio.sleep(interval)
+                continue
+
+            try:
+                await asyncio.wait_for(wake_up.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+            wake_up.clear()
+
+    async def shutdown(self) -> None:
+        """
+        stop the background tasks, shut down the thread and process pools, and close
+        the DB connections
+
+        Returns
+        -------
+        None
+        """
+
+        for task in self.background_tasks:
+            task.cancel()
+
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+
+        self.io_executor.shutdown()
+
+        if "fp_executor" in self.__dict__:
+            self.fp_executor.shutdown()
+
+        self.db_pool.close()
+
+    async def queue_scrobble(self, scrobble: dict[str, Any]) -> None:
+        """
+        queue a scrobble to be submitted to last.fm in the background
+
+        Parameters
+        ----------
+        scrobble : dict[str, Any]
+            keyword arguments to `pylast.LastFMNetwork.scrobble`, including `timestamp`
+
+        Returns
+        -------
+        None
+        """
+
+        await self.run_io(self.scrobble_queue.add, scrobble)
+        self.scrobble_added.set()
+        logger.info(f"Queued scrobble of '{scrobble['title']}'.")
+
+    async def run_io(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        run a blocking (I/O-bound) function in the I/O thread pool
+
+        Parameters
+        ----------
+        func : Callable[..., T]
+        *args : Any
+        **kwargs : Any
+
+        Returns
+        -------
+        T
+            the return value of `func`
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.io_executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def run_cpu(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        run a CPU-bound function in the process pool (`func` and `args` must be
+        picklable)
+
+        Parameters
+        ----------
+        func : Callable[..., T]
+        *args : Any
+
+        Returns
+        -------
+        T
+            the return value of `func`
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.fp_executor, func, *args)
+
 
 async def get_api_key(
     api_key_header: str = Security(APIKeyHeader(name="X-Api-Key", auto_error=False)),
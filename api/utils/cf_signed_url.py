@@ -1,65 +1,215 @@
+from __future__ import annotations
+
 import base64
 import datetime
 import json
+import math
+import threading
+import time
+from functools import cached_property
+from typing import TYPE_CHECKING
 from urllib.parse import urlencode
 
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
 
+# when URLs signed at log-in expire, i.e. never
+forever = datetime.datetime(2300, 1, 1)
 
-def make_signed_wildcard_url(
-    cloudfront_url: str, cloudfront_keypair_id: str, cloudfront_private_key: str
-) -> str:
-    """
-    make a signed Cloudfront URL using a wildcard URL for mp3 files
 
-    Parameters
-    ----------
-    cloudfront_url : str
-    cloudfront_keypair_id : str
-    cloudfront_private_key : str
+class CloudfrontSigner:
+    def __init__(
+        self,
+        cloudfront_url: str,
+        cloudfront_keypair_id: str,
+        cloudfront_private_key: str,
+        expiry_granularity: int = 5 * 60,
+        max_entries: int = 10000,
+    ):
+        """
+        sign Cloudfront URLs, parsing the private key only once and reusing signatures
+        for the same resource and expiry (RSA signing is the expensive part, and the
+        policy is usually the same, e.g. the wildcard URL given out at log-in)
 
-    Returns
-    -------
-    str
-    """
+        Short-lived signatures have their expiry rounded up to a multiple of
+        `expiry_granularity` seconds, so that a URL for the same track or prefix is
+        only signed once per interval and is valid for at least as long as requested.
 
-    # allow access to any mp3 file forever
-    url = "/".join([cloudfront_url, "*.mp3"])
-    expiry_date = datetime.datetime(2300, 1, 1)
-    policy = make_policy(url, expiry_date)
+        Parameters
+        ----------
+        cloudfront_url : str
+            the Cloudfront distribution's URL, e.g. https://xyz.cloudfront.net
+        cloudfront_keypair_id : str
+        cloudfront_private_key : str
+            the PEM-encoded private key
+        expiry_granularity : int
+            number of seconds to round short-lived expiry times up to
+        max_entries : int
+            maximum number of signatures to keep
+        """
 
-    # sign the policy using private key
-    signature_bytes = rsa_signer(cloudfront_private_key, policy)
-    signature = base64_encode(signature_bytes).decode("utf8")
+        self.cloudfront_url = cloudfront_url
+        self.cloudfront_keypair_id = cloudfront_keypair_id
+        self.cloudfront_private_key = cloudfront_private_key
+        self.expiry_granularity = expiry_granularity
+        self.max_entries = max_entries
 
-    # construct the query string
-    params = {
-        "Policy": base64_encode(policy.encode("utf8")).decode("utf8"),
-        "Signature": signature,
-        "Key-Pair-Id": cloudfront_keypair_id,
-    }
+        # (resource, expiry timestamp) -> (encoded policy, signature)
+        self.signatures: dict[tuple[str, int], tuple[str, str]] = {}
+        self.lock = threading.Lock()
+
+    @cached_property
+    def private_key(self) -> RSAPrivateKey:
+        """
+        the parsed private key
+
+        Returns
+        -------
+        RSAPrivateKey
+        """
+
+        # imported here since it's slow to import and only needed at log-in
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import serialization
+
+        return serialization.load_pem_private_key(  # pyright: ignore
+            self.cloudfront_private_key.encode(),
+            password=None,
+            backend=default_backend(),
+        )
+
+    def signed_wildcard_url(self) -> str:
+        """
+        make a signed Cloudfront URL that allows access to any mp3 file forever
+
+        Returns
+        -------
+        str
+        """
+
+        return self.signed_url("*.mp3")
+
+    def signed_track_urls(
+        self, track_ids: list[str], expires_in: int
+    ) -> dict[str, str]:
+        """
+        make short-lived signed Cloudfront URLs for individual tracks
+
+        Parameters
+        ----------
+        track_ids : list[str]
+        expires_in : int
+            minimum number of seconds the URLs are valid for
+
+        Returns
+        -------
+        dict[str, str]
+            the signed URL for each track ID
+        """
+
+        return {x: self.signed_url(f"{x}.mp3", expires_in) for x in track_ids}
+
+    def signed_url(self, path: str, expires_in: int | None = None) -> str:
+        """
+        make a signed Cloudfront URL for a path, which can contain wildcards (e.g.
+        `*.mp3` or `some/prefix/*`), in which case the `*` in the returned URL is to be
+        replaced with the actual path
 
-    return "?".join([url, urlencode(params)])
+        Parameters
+        ----------
+        path : str
+            path relative to the Cloudfront URL
+        expires_in : int | None
+            minimum number of seconds the URL is valid for, or None for it to never
+            expire
 
+        Returns
+        -------
+        str
+        """
 
-def make_policy(resource: str, expiry_date: datetime.datetime) -> str:
+        url = "/".join([self.cloudfront_url, path])
+        policy, signature = self.sign(url, expires_in)
+
+        params = {
+            "Policy": policy,
+            "Signature": signature,
+            "Key-Pair-Id": self.cloudfront_keypair_id,
+        }
+
+        return "?".join([url, urlencode(params)])
+
+    def sign(self, resource: str, expires_in: int | None) -> tuple[str, str]:
+        """
+        get the encoded policy and signature for a resource, signing it unless it was
+        already signed with the same expiry
+
+        Parameters
+        ----------
+        resource : str
+        expires_in : int | None
+
+        Returns
+        -------
+        tuple[str, str]
+            the encoded policy and signature
+        """
+
+        if expires_in is None:
+            expiry = int(forever.timestamp())
+        else:
+            expiry = (
+                math.ceil((time.time() + expires_in) / self.expiry_granularity)
+                * self.expiry_granularity
+            )
+
+        key = (resource, expiry)
+
+        with self.lock:
+            if key in self.signatures:
+                return self.signatures[key]
+
+        policy = make_policy(resource, expiry)
+
+        # sign the policy using private key
+        signature_bytes = rsa_signer(self.private_key, policy)
+
+        res = (
+            base64_encode(policy.encode("utf8")).decode("utf8"),
+            base64_encode(signature_bytes).decode("utf8"),
+        )
+
+        with self.lock:
+            if len(self.signatures) >= self.max_entries:
+                # forget expired signatures, then the oldest ones if that's not enough
+                now = time.time()
+
+                self.signatures = {
+                    k: v for k, v in self.signatures.items() if k[1] > now
+                }
+
+                while len(self.signatures) >= self.max_entries:
+                    del self.signatures[next(iter(self.signatures))]
+
+            self.signatures[key] = res
+
+        return res
+
+
+def make_policy(resource: str, expiry_timestamp: int) -> str:
     """
     make a JSON-formatted policy string for a signed Cloudfront URL
 
     Parameters
     ----------
     resource : str
-    expiry_date : datetime
+    expiry_timestamp : int
 
     Returns
     -------
     str
     """
 
-    expiry_timestamp = int(expiry_date.timestamp())
-
     policy = {
         "Statement": [
             {
@@ -90,13 +240,13 @@ def base64_encode(x: bytes) -> bytes:
     )
 
 
-def rsa_signer(secret: str, message: str) -> bytes:
+def rsa_signer(private_key: RSAPrivateKey, message: str) -> bytes:
     """
     sha1-hash and sign a message using a private key
 
     Parameters
     ----------
-    secret : str
+    private_key : RSAPrivateKey
     message : str
 
     Returns
@@ -104,10 +254,7 @@ def rsa_signer(secret: str, message: str) -> bytes:
     bytes
     """
 
-    private_key = serialization.load_pem_private_key(
-        secret.encode(),
-        password=None,
-        backend=default_backend(),
-    )
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
 
     return private_key.sign(message.encode("utf8"), padding.PKCS1v15(), hashes.SHA1())
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator
+
+from fastapi.logger import logger
+
+if TYPE_CHECKING:
+    from psycopg2._psycopg import connection
+    from psycopg2.pool import ThreadedConnectionPool
+
+
+class DbPool:
+    def __init__(
+        self,
+        db_url: str,
+        min_size: int,
+        max_size: int,
+        check_after: float,
+        timeout: float,
+    ):
+        """
+        a thread-safe pool of Postgres connections, so that routes don't pay for a new
+        connection (and TLS handshake) on every request
+
+        The pool is opened by `open` (in a worker's startup hook, since connections
+        can't be shared across processes) or on first use. Unlike psycopg2's pool,
+        taking a connection waits for one to be returned when they're all in use, and
+        connections that have been idle for a while are checked before being handed out.
+
+        Parameters
+        ----------
+        db_url : str
+        min_size : int
+            number of connections to open up front and keep open while idle
+        max_size : int
+            maximum number of connections open at once
+        check_after : float
+            number of seconds a connection can be idle before it's checked (with
+            `select 1`) before being used
+        timeout : float
+            number of seconds to wait for a free connection before giving up
+        """
+
+        self.db_url = db_url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.check_after = check_after
+        self.timeout = timeout
+
+        self.pool: ThreadedConnectionPool | None = None
+        self.lock = threading.Lock()
+        self.available = threading.BoundedSemaphore(max_size)
+
+        # when each idle connection was returned to the pool, by `id()`
+        self.returned_at: dict[int, float] = {}
+
+        # metrics
+        self.in_use = 0
+        self.n_acquired = 0
+        self.n_timeouts = 0
+        self.n_discarded = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def open(self) -> ThreadedConnectionPool:
+        """
+        open the pool (and its first `min_size` connections) unless it's already open
+
+        Returns
+        -------
+        ThreadedConnectionPool
+        """
+
+        with self.lock:
+            if self.pool is None:
+                # imported here since it's only needed by DB-backed routes
+                from psycopg2.pool import ThreadedConnectionPool
+
+                self.pool = ThreadedConnectionPool(
+                    self.min_size, self.max_size, self.db_url
+                )
+
+            return self.pool
+
+    def close(self) -> None:
+        """
+        close all the connections in the pool
+
+        Returns
+        -------
+        None
+        """
+
+        with self.lock:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
+
+    @contextmanager
+    def connection(self) -> Iterator[connection]:
+        """
+        take a connection from the pool, waiting for one if they're all in use, and
+        return it afterwards (with any open transaction rolled back)
+
+        Returns
+        -------
+        Iterator[connection]
+        """
+
+        pool = self.open()
+        started_at = time.monotonic()
+
+        if not self.available.acquire(timeout=self.timeout):
+            with self.lock:
+                self.n_timeouts += 1
+
+            raise TimeoutError(f"No DB connection available after {self.timeout}s")
+
+        wait = time.monotonic() - started_at
+
+        with self.lock:
+            self.in_use += 1
+            self.n_acquired += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+        conn = None
+
+        try:
+            conn = self.getconn(pool)
+            yield conn
+
+        finally:
+            if conn is not None:
+                self.putconn(pool, conn)
+
+            with self.lock:
+                self.in_use -= 1
+
+            self.available.release()
+
+    def getconn(self, pool: ThreadedConnectionPool) -> connection:
+        """
+        take a connection from the pool, replacing it with a new one if it's been idle
+        for a while and doesn't work anymore (e.g. the server closed it)
+
+        Parameters
+        ----------
+        pool : ThreadedConnectionPool
+
+        Returns
+        -------
+        connection
+        """
+
+        import psycopg2
+
+        conn = pool.getconn()
+
+        with self.lock:
+            returned_at = self.returned_at.pop(id(conn), None)
+
+        if returned_at is None or time.monotonic() - returned_at < self.check_after:
+            return conn
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("select 1")
+
+            conn.rollback()
+            return conn
+
+        except psycopg2.Error:
+            logger.warning("Discarding broken DB connection")
+            pool.putconn(conn, close=True)
+
+            with self.lock:
+                self.n_discarded += 1
+
+            return pool.getconn()
+
+    def putconn(self, pool: ThreadedConnectionPool, conn: connection) -> None:
+        """
+        return a connection to the pool, closing it if it's broken
+
+        Parameters
+        ----------
+        pool : ThreadedConnectionPool
+        conn : connection
+
+        Returns
+        -------
+        None
+        """
+
+        import psycopg2
+
+        try:
+            # don't leave a transaction open (or aborted) for the next user
+            conn.rollback()
+            broken = bool(conn.closed)
+
+        except psycopg2.Error:
+            broken = True
+
+        pool.putconn(conn, close=broken)
+
+        with self.lock:
+            if broken:
+                self.n_discarded += 1
+            else:
+                self.returned_at[id(conn)] = time.monotonic()
+
+            # forget connections the pool closed since it already had enough idle ones
+            idle = {id(x) for x in pool._pool}
+            self.returned_at = {k: v for k, v in self.returned_at.items() if k in idle}
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        get the pool's size and usage and how long callers have waited for connections
+
+        Returns
+        -------
+        dict[str, int | float]
+        """
+
+        with self.lock:
+            n_used = 0 if self.pool is None else len(self.pool._used)
+            n_idle = 0 if self.pool is None else len(self.pool._pool)
+
+            return {
+                "max_size": self.max_size,
+                "open": n_used + n_idle,
+                "in_use": self.in_use,
+                "idle": n_idle,
+                "acquired": self.n_acquired,
+                "timeouts": self.n_timeouts,
+                "discarded": self.n_discarded,
+                "mean_wait_ms": round(
+                    1000 * self.total_wait / max(self.n_acquired, 1), 2
+                ),
+                "max_wait_ms": round(1000 * self.max_wait, 2),
+            }
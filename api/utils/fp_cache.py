@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import json
+import time
+from contextlib import closing
+
+from fastapi.logger import logger
+
+from utils.sqlite_store import SqliteStore
+
+
+class FingerprintCache(SqliteStore):
+    def __init__(self, path: str, max_entries: int):
+        """
+        a persistent, LRU-evicted cache of fingerprints and ID3 tags of imported files,
+        keyed by the S3 ETag and size of the file in incoming/ (stored in SQLite so that
+        it's shared by all the API workers)
+
+        Parameters
+        ----------
+        path : str
+            path to SQLite database file
+        max_entries : int
+            maximum number of files to keep in the cache
+        """
+
+        super().__init__(path)
+        self.max_entries = max_entries
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                """
+                create table if not exists fingerprints (
+                    etag text not null,
+                    size integer not null,
+                    track text not null,
+                    last_used real not null,
+                    primary key (etag, size)
+                )
+                """
+            )
+
+            conn.execute(
+                """
+                create index if not exists fingerprints_last_used_index
+                on fingerprints(last_used)
+                """
+            )
+
+    def get(self, etag: str, size: int) -> dict[str, str | int] | None:
+        """
+        look up a file's fingerprint and tags, marking it as recently used
+
+        Parameters
+        ----------
+        etag : str
+        size : int
+
+        Returns
+        -------
+        dict[str, str | int] | None
+            the cached result of `read_track` or None if it's not in the cache
+        """
+
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute(
+                "select track from fingerprints where etag=? and size=?",
+                (etag, size),
+            ).fetchone()
+
+            if row is None:
+                self.increment(conn, "misses")
+                return None
+
+            conn.execute(
+                "update fingerprints set last_used=? where etag=? and size=?",
+                (time.time(), etag, size),
+            )
+
+            self.increment(conn, "hits")
+
+        logger.info(f"Fingerprint cache hit for {etag}")
+        return json.loads(row[0])
+
+    def put(self, etag: str, size: int, track: dict[str, str | int]) -> None:
+        """
+        store a file's fingerprint and tags, evicting the least recently used entries
+        beyond `max_entries`
+
+        Parameters
+        ----------
+        etag : str
+        size : int
+        track : dict[str, str | int]
+            the result of `read_track`
+
+        Returns
+        -------
+        None
+        """
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "insert or replace into fingerprints values (?, ?, ?, ?)",
+                (etag, size, json.dumps(track), time.time()),
+            )
+
+            n_evicted = conn.execute(
+                """
+                delete from fingerprints
+                where rowid in (
+                    select rowid from fingerprints
+                    order by last_used desc
+                    limit -1 offset ?
+                )
+                """,
+                (self.max_entries,),
+            ).rowcount
+
+            if n_evicted > 0:
+                self.increment(conn, "evictions", n_evicted)
+
+    def stats(self) -> dict[str, int]:
+        """
+        get the number of cached files and the hit/miss/eviction counts
+
+        Returns
+        -------
+        dict[str, int]
+        """
+
+        with closing(self.connect()) as conn:
+            counts = self.counters(conn)
+            n = conn.execute("select count(*) from fingerprints").fetchone()[0]
+
+        return {
+            "entries": n,
+            "max_entries": self.max_entries,
+            "hits": counts.get("hits", 0),
+            "misses": counts.get("misses", 0),
+            "evictions": counts.get("evictions", 0),
+        }
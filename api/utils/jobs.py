@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import time
+import uuid
+from contextlib import closing
+
+from utils.sqlite_store import SqliteStore
+
+
+class RetagJobs(SqliteStore):
+    def __init__(self, path: str, max_age: float, stale_after: float = 60):
+        """
+        per-track progress of background retag jobs (stored in SQLite so that any API
+        worker can report on a job started by another)
+
+        Jobs run in the worker that started them, so the worker records a heartbeat
+        while the job runs. If it's killed (e.g. by gunicorn's timeout or a redeploy),
+        the heartbeat stops and the job's unfinished tracks are reported as failed.
+
+        Parameters
+        ----------
+        path : str
+            path to SQLite database file
+        max_age : float
+            number of seconds to keep records of a job
+        stale_after : float
+            number of seconds without a heartbeat after which a job's unfinished
+            tracks are reported as failed
+        """
+
+        super().__init__(path)
+        self.max_age = max_age
+        self.stale_after = stale_after
+        self.heartbeat_interval = stale_after / 4
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                """
+                create table if not exists retag_jobs (
+                    job_id text not null,
+                    track_id text not null,
+                    status text not null,
+                    error text,
+                    created_at real not null,
+                    heartbeat_at real,
+                    primary key (job_id, track_id)
+                )
+                """
+            )
+
+            columns = [x[1] for x in conn.execute("pragma table_info(retag_jobs)")]
+
+            if "heartbeat_at" not in columns:
+                # the DB was created before heartbeats were recorded
+                conn.execute("alter table retag_jobs add column heartbeat_at real")
+
+            conn.execute(
+                """
+                create index if not exists retag_jobs_created_at_index
+                on retag_jobs(created_at)
+                """
+            )
+
+    def create(self, track_ids: list[str]) -> str:
+        """
+        record a new job with all of its tracks pending, and forget old jobs
+
+        Parameters
+        ----------
+        track_ids : list[str]
+
+        Returns
+        -------
+        str
+            the job ID
+        """
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "delete from retag_jobs where created_at < ?", (now - self.max_age,)
+            )
+
+            conn.executemany(
+                "insert into retag_jobs values (?, ?, 'pending', null, ?, ?)",
+                [(job_id, x, now, now) for x in track_ids],
+            )
+
+        return job_id
+
+    def update(
+        self, job_id: str, track_id: str, status: str, error: str | None = None
+    ) -> None:
+        """
+        set the status of a track in a job
+
+        Parameters
+        ----------
+        job_id : str
+        track_id : str
+        status : str
+            one of "pending", "running", "done", or "failed"
+        error : str | None
+            the error message if the track failed
+
+        Returns
+        -------
+        None
+        """
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                """
+                update retag_jobs set status=?, error=?, heartbeat_at=?
+                where job_id=? and track_id=?
+                """,
+                (status, error, time.time(), job_id, track_id),
+            )
+
+    def heartbeat(self, job_id: str) -> None:
+        """
+        record that the worker running a job is still alive
+
+        Parameters
+        ----------
+        job_id : str
+
+        Returns
+        -------
+        None
+        """
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                """
+                update retag_jobs set heartbeat_at=?
+                where job_id=? and status in ('pending', 'running')
+                """,
+                (time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> dict[str, object] | None:
+        """
+        get the progress of a job
+
+        Parameters
+        ----------
+        job_id : str
+
+        Returns
+        -------
+        dict[str, object] | None
+            counts of tracks by status and the status/error of each track, or None if
+            there's no such job (unfinished tracks of a job whose worker stopped are
+            reported as failed)
+        """
+
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                """
+                select track_id, status, error, heartbeat_at
+                from retag_jobs
+                where job_id=?
+                """,
+                (job_id,),
+            ).fetchall()
+
+        if len(rows) == 0:
+            return None
+
+        stale_before = time.time() - self.stale_after
+
+        rows = [
+            (x[0], "failed", "The worker running this job stopped")
+            if x[1] in {"pending", "running"} and (x[3] is None or x[3] < stale_before)
+            else x[:3]
+            for x in rows
+        ]
+
+        statuses = [x[1] for x in rows]
+
+        return {
+            "job_id": job_id,
+            "n_tracks": len(rows),
+            "n_done": statuses.count("done"),
+            "n_failed": statuses.count("failed"),
+            "finished": all(x in {"done", "failed"} for x in statuses),
+            "tracks": {x[0]: {"status": x[1], "error": x[2]} for x in rows},
+        }
@@ -1,9 +1,19 @@
-from typing import Iterable
+from __future__ import annotations
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from hashlib import sha1
+from typing import NamedTuple
 
 import musicbrainzngs as mb
-import pandas as pd
 from fastapi.logger import logger
-from psycopg2._psycopg import cursor
+from psycopg2._psycopg import connection, cursor
+from psycopg2.extras import execute_values
+
+from utils.db_pool import DbPool
+from utils.mb_cache import MbCache
 
 # release group types to save in DB (ignoring audiobooks, bootlegs, etc.)
 valid_release_types = {
@@ -26,37 +36,365 @@ valid_artist_rel_types = {
     "is person": None,
 }
 
+# arbitrary key for the Postgres advisory lock held while sweeping artists
+sweep_lock_id = 9000
+
+
+class ReleaseGroup(NamedTuple):
+    # a release group by an artist in MusicBrainz
+    mb_artist_id: str
+    mb_release_id: str
+    title: str
+    release_date: str
+    type: str | None
+    secondary_types: list[str]
+
+
+class NewRelease(NamedTuple):
+    # a release group of interest that isn't in the DB yet
+    mb_artist_id: str
+    mb_release_id: str
+    title: str
+    release_date: str
+    types: frozenset[str]
+
+
+class Relationship(NamedTuple):
+    # a relationship between an artist and another artist in MusicBrainz
+    mb_artist_id: str
+    type: str
+    direction: str
+    other_mb_artist_id: str
+    other_mb_artist_name: str
+
+    @property
+    def key(self) -> tuple[str, str, str, str]:
+        # identifies the relationship in the DB (the other artist might be renamed)
+        return self.mb_artist_id, self.type, self.direction, self.other_mb_artist_id
+
+
+def check_an_artist(db_pool: DbPool, mb_cache: MbCache) -> None:
+    """
+    check MusicBrainz for new releases and artist relationships for the artist that was
+    checked least recently and store them in the DB
+
+    Parameters
+    ----------
+    db_pool : DbPool
+    mb_cache : MbCache
+        cache (and rate limiter) for MusicBrainz API requests
+
+    Returns
+    -------
+    None
+    """
+
+    with db_pool.connection() as conn:
+        artists = claim_artists(conn, 1)
+
+        # if checking fails, the artist keeps the claim's `last_checked` value so that
+        # it isn't retried right away
+        for artist_id, artist_name, _ in artists:
+            with conn, conn.cursor() as cur:
+                check_artist(cur, artist_id, artist_name, mb_cache)
+
+
+def sweep_artists(
+    db_pool: DbPool,
+    mb_cache: MbCache,
+    time_budget: float,
+    n_workers: int = 4,
+    batch_size: int = 5,
+) -> dict[str, int | float]:
+    """
+    check as many artists as possible (least recently checked first) until a time
+    budget expires, with several workers sharing a rate limiter so that the allowed
+    MusicBrainz request rate is saturated while others are waiting on the API or DB
+
+    Parameters
+    ----------
+    db_pool : DbPool
+    mb_cache : MbCache
+        cache (and rate limiter) for MusicBrainz API requests
+    time_budget : float
+        number of seconds after which no more artists are claimed (artists already
+        being checked are finished)
+    n_workers : int
+        number of artists to check concurrently (each with its own connection from
+        `db_pool`, plus one for the sweep itself)
+    batch_size : int
+        number of artists each worker claims at a time
+
+    Returns
+    -------
+    dict[str, int | float]
+        counts of artists checked and failed, number of MusicBrainz requests made, and
+        the elapsed time
+    """
+
+    started_at = time.monotonic()
+    deadline = started_at + time_budget
+    n_requests = mb_cache.limiter.n_acquired
+
+    with db_pool.connection() as conn:
+        # only one sweep at a time (e.g. across API workers), since each worker process
+        # has its own rate limiter (the lock is held by the session, so the transaction
+        # is committed right away instead of sitting open for the whole sweep)
+        with conn, conn.cursor() as cur:
+            cur.execute("select pg_try_advisory_lock(%s)", (sweep_lock_id,))
+            locked = cur.fetchone()[0]
+
+        if not locked:
+            logger.info("Another MusicBrainz sweep is already running")
+            return {"n_checked": 0, "n_failed": 0, "n_requests": 0, "elapsed": 0.0}
+
+        try:
+            with ThreadPoolExecutor(n_workers, thread_name_prefix="mb") as executor:
+                results = list(
+                    executor.map(
+                        lambda _: sweep_worker(db_pool, mb_cache, deadline, batch_size),
+                        range(n_workers),
+                    )
+                )
+
+        finally:
+            with conn, conn.cursor() as cur:
+                cur.execute("select pg_advisory_unlock(%s)", (sweep_lock_id,))
+
+    stats = {
+        "n_checked": sum(x[0] for x in results),
+        "n_failed": sum(x[1] for x in results),
+        "n_requests": mb_cache.limiter.n_acquired - n_requests,
+        "elapsed": round(time.monotonic() - started_at, 1),
+    }
+
+    logger.info(f"MusicBrainz sweep finished: {stats}")
+    return stats
+
+
+def sweep_worker(
+    db_pool: DbPool, mb_cache: MbCache, deadline: float, batch_size: int
+) -> tuple[int, int]:
+    """
+    repeatedly claim a batch of artists and check them until the deadline passes or
+    there are no artists left to claim
+
+    Parameters
+    ----------
+    db_pool : DbPool
+    mb_cache : MbCache
+    deadline : float
+        `time.monotonic()` value after which no more artists are checked
+    batch_size : int
+
+    Returns
+    -------
+    tuple[int, int]
+        the number of artists checked and the number that failed
+    """
+
+    n_checked = 0
+    n_failed = 0
+
+    with db_pool.connection() as conn:
+        while time.monotonic() < deadline:
+            artists = claim_artists(conn, batch_size)
+
+            if len(artists) == 0:
+                break
+
+            for i, (artist_id, artist_name, _) in enumerate(artists):
+                if time.monotonic() >= deadline:
+                    # out of time, so put the rest of the batch back in the queue
+                    for x in artists[i:]:
+                        release_artist(conn, x[0], x[2])
+
+                    break
+
+                try:
+                    with conn, conn.cursor() as cur:
+                        check_artist(cur, artist_id, artist_name, mb_cache)
+
+                    n_checked += 1
+
+                except Exception:
+                    # leave the claim's `last_checked` value in place so that this
+                    # artist goes to the back of the queue instead of being reclaimed
+                    # (and spending rate limiter tokens) right away
+                    logger.exception(f"Failed to check {artist_name} ({artist_id})")
+                    n_failed += 1
 
-def get_an_artist_and_releases(cur: cursor) -> tuple[str, list[str]]:
+    return n_checked, n_failed
+
+
+def claim_artists(conn: connection, n: int) -> list[tuple[str, str, int | None]]:
     """
-    get the least recently checked artist's MusicBrains ID and a list of release group
-    IDs already stored in dB
+    claim the least recently checked artists by setting their `last_checked` to now,
+    skipping any that another worker is claiming at the same time
+
+    Parameters
+    ----------
+    conn : connection
+    n : int
+        maximum number of artists to claim
+
+    Returns
+    -------
+    list[tuple[str, str, int | None]]
+        the MusicBrainz ID, name, and previous `last_checked` value of each artist
+    """
+
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            with claimed as (
+                select id, name, last_checked
+                from mb_artists
+                order by last_checked nulls first
+                limit %s
+                for update skip locked
+            )
+            update mb_artists
+            set last_checked = %s
+            from claimed
+            where mb_artists.id = claimed.id
+            returning claimed.id, claimed.name, claimed.last_checked
+            """,
+            (n, now_ms()),
+        )
+
+        return cur.fetchall()
+
+
+def release_artist(conn: connection, artist_id: str, last_checked: int | None) -> None:
+    """
+    restore a claimed artist's previous `last_checked` value so that it keeps its place
+    in the queue (e.g. because the sweep ran out of time before checking it)
+
+    Parameters
+    ----------
+    conn : connection
+    artist_id : str
+    last_checked : int | None
+
+    Returns
+    -------
+    None
+    """
+
+    # connection might be in an aborted transaction
+    conn.rollback()
+
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "update mb_artists set last_checked = %s where id = %s",
+            (last_checked, artist_id),
+        )
+
+
+def check_artist(
+    cur: cursor, artist_id: str, artist_name: str, mb_cache: MbCache
+) -> None:
+    """
+    check MusicBrainz for an artist's new releases and artist relationships and store
+    them in the DB
 
     Parameters
     ----------
     cur : cursor
+    artist_id : str
+        a MusicBrainz artist ID
+    artist_name : str
+    mb_cache : MbCache
+        cache (and rate limiter) for MusicBrainz API requests
 
     Returns
     -------
-    tuple[str, list[str]]
-        a MusicBrainz artist ID and a list of MusicBrainz release group IDs for that
-        artist
+    None
+    """
+
+    logger.info(f"Checking: {artist_name} ({artist_id})")
+
+    # check for new releases (if anything changed since the last check)
+    last_count, last_digest = get_release_group_state(cur, artist_id)
+    releases, release_group_count, digest = get_mb_releases(
+        artist_id, mb_cache, last_count, last_digest
+    )
+
+    if releases is not None and len(releases) > 0:
+        # there are releases in the MusicBrainz DB
+        existing_release_ids = get_existing_release_ids(cur, artist_id)
+        new_releases = filter_new_releases(artist_id, existing_release_ids, releases)
+
+        if len(new_releases) > 0:
+            # there are releases of interest not in DB
+            insert_releases(cur, new_releases)
+            insert_artist_releases(cur, new_releases)
+
+    # check for new artist relationships (e.g. is a member of band X)
+    relationships = get_mb_relationships(artist_id, mb_cache)
+
+    if len(relationships) > 0:
+        # there are artist relationships in the MusicBrainz DB
+        existing_relationships = get_existing_relationships(cur, artist_id)
+        new_relationships = filter_new_relationships(
+            relationships, existing_relationships
+        )
+
+        if len(new_relationships) > 0:
+            # there are artist relationships of interest not in DB
+            insert_relationships(cur, new_relationships)
+
+    # mark artist as checked (i.e. send to back of queue)
+    checked_artist(cur, artist_id, release_group_count, digest)
+
+
+def get_release_group_state(
+    cur: cursor, artist_id: str
+) -> tuple[int | None, str | None]:
+    """
+    get an artist's release group count and first page digest as of the last check
+
+    Parameters
+    ----------
+    cur : cursor
+    artist_id : str
+        a MusicBrainz artist ID
+
+    Returns
+    -------
+    tuple[int | None, str | None]
+        the count and digest (both None if the artist hasn't been checked yet)
     """
 
-    # get a single artist ID
     cur.execute(
         """
-        select id, name
+        select release_group_count, releases_digest
         from mb_artists
-        order by last_checked nulls first
-        limit 1;
-        """
+        where id=%s
+        """,
+        (artist_id,),
     )
 
-    artist_id, artist_name = cur.fetchone()
-    logger.info(f"Checking: {artist_name} ({artist_id})")
+    return cur.fetchone()
+
+
+def get_existing_release_ids(cur: cursor, artist_id: str) -> set[str]:
+    """
+    get the list of an artist's release group IDs already stored in DB
+
+    Parameters
+    ----------
+    cur : cursor
+    artist_id : str
+        a MusicBrainz artist ID
+
+    Returns
+    -------
+    set[str]
+        the MusicBrainz release group IDs for that artist
+    """
 
-    # get all of their previously stored release group IDs
     cur.execute(
         """
         select mb_release_id
@@ -66,25 +404,40 @@ def get_an_artist_and_releases(cur: cursor) -> tuple[str, list[str]]:
         (artist_id,),
     )
 
-    existing_release_ids = [r[0] for r in cur.fetchall()]
+    existing_release_ids = {r[0] for r in cur.fetchall()}
     logger.info(f"{len(existing_release_ids)} existing releases")
-    return artist_id, existing_release_ids
+    return existing_release_ids
 
 
-def get_mb_releases(artist_id: str) -> list[dict[str, str | list[str]]]:
+def get_mb_releases(
+    artist_id: str,
+    mb_cache: MbCache,
+    last_count: int | None = None,
+    last_digest: str | None = None,
+) -> tuple[list[ReleaseGroup] | None, int, str]:
     """
     get all release groups by an artist in MusicBrainz
 
+    If the artist's release group count is the same as at the last check, only the
+    first page is fetched (i.e. one request), and if that page is also unchanged, no
+    release groups are returned at all.
+
     Parameters
     ----------
     artist_id : str
         a MusicBrainz artist ID
+    mb_cache : MbCache
+        cache (and rate limiter) for MusicBrainz API requests
+    last_count : int | None
+        the artist's release group count at the last check
+    last_digest : str | None
+        the digest of the first page of release groups at the last check
 
     Returns
     -------
-    list[dict[str, str | list[str]]]
-         a list of dictionaries containing release group metadata (ID, title, date,
-         etc.)
+    tuple[list[ReleaseGroup] | None, int, str]
+         the release groups or None if nothing has changed since the last check, the
+         release group count, and the digest of the first page
     """
 
     limit = 100
@@ -92,24 +445,41 @@ def get_mb_releases(artist_id: str) -> list[dict[str, str | list[str]]]:
     releases = []
 
     while True:
-        rgs = mb.browse_release_groups(artist=artist_id, limit=limit, offset=offset)
+        rgs = mb_cache.request(
+            "release-groups",
+            mb.browse_release_groups,
+            artist=artist_id,
+            limit=limit,
+            offset=offset,
+        )
 
         releases.extend(
             [
-                {
-                    "mb_artist_id": artist_id,
-                    "mb_release_id": x["id"],
-                    "title": x["title"],
-                    "release_date": x["first-release-date"],
-                    "type": x["primary-type"],
-                    "secondary_types": x["secondary-types"],
-                }
+                ReleaseGroup(
+                    mb_artist_id=artist_id,
+                    mb_release_id=x["id"],
+                    title=x["title"],
+                    release_date=x["first-release-date"],
+                    type=x["primary-type"],
+                    secondary_types=x["secondary-types"],
+                )
                 for x in rgs["release-groups"]
             ]
         )
 
         n = rgs["release-group-count"]
 
+        if offset == 0:
+            digest = releases_digest(releases)
+
+            if n == last_count:
+                if digest == last_digest:
+                    logger.info(f"{n} release groups in MusicBrainz, none changed")
+                    return None, n, digest
+
+                # nothing can have been added, so only look at the changes on this page
+                break
+
         if offset + limit >= n:
             # no need to continue pagination
             break
@@ -118,14 +488,36 @@ def get_mb_releases(artist_id: str) -> list[dict[str, str | list[str]]]:
         offset += limit
 
     logger.info(f"{len(releases)} unfiltered release groups from MusicBrainz")
-    return releases
+    return releases, n, digest
+
+
+def releases_digest(releases: list[ReleaseGroup]) -> str:
+    """
+    hash a list of release groups (in any order) from `get_mb_releases`
+
+    Parameters
+    ----------
+    releases : list[ReleaseGroup]
+
+    Returns
+    -------
+    str
+        a 40-character hex digest
+    """
+
+    payload = json.dumps(
+        [x._asdict() for x in sorted(releases, key=lambda x: x.mb_release_id)],
+        sort_keys=True,
+    )
+
+    return sha1(payload.encode()).hexdigest()
 
 
 def filter_new_releases(
     artist_id: str,
-    existing_release_ids: list[str],
-    releases: list[dict[str, str | list[str]]],
-) -> pd.DataFrame:
+    existing_release_ids: set[str],
+    releases: list[ReleaseGroup],
+) -> list[NewRelease]:
     """
     filter an artist's release groups to ones with a type in `valid_rel_types` that
     haven't already been stored in the DB
@@ -134,25 +526,25 @@ def filter_new_releases(
     ----------
     artist_id : str
         a MusicBrainz artist ID
-    existing_release_ids : list[str]
-        a list of MusicBrainz release group IDs for that artist
-    releases : list[dict[str, str | list[str]]]
+    existing_release_ids : set[str]
+        the MusicBrainz release group IDs for that artist
+    releases : list[ReleaseGroup]
         all release groups for that artist in MusicBrainz
 
     Returns
     -------
-    list[dict[str, str | list[str]]]
+    list[NewRelease]
     """
 
     new_releases = []
 
     for r in releases:
-        if r["mb_release_id"] in existing_release_ids:
+        if r.mb_release_id in existing_release_ids:
             # ignore this release group
             continue
 
         # release groups should have a type and optional secondary types
-        types = {r["type"], *r["secondary_types"]}
+        types = frozenset({r.type, *r.secondary_types})
 
         if len(types) == 0 or not valid_release_types.issuperset(types):
             # the release group only has types that aren't in the list of valid types
@@ -160,31 +552,27 @@ def filter_new_releases(
 
         # this is a "new" release to store in the database
         new_releases.append(
-            {
-                "mb_artist_id": artist_id,
-                "mb_release_id": r["mb_release_id"],
-                "title": r["title"],
-                "release_date": r["release_date"],
-                "types": types,
-            }
+            NewRelease(
+                mb_artist_id=artist_id,
+                mb_release_id=r.mb_release_id,
+                title=r.title,
+                release_date=r.release_date,
+                types=types,
+            )
         )
 
     logger.info(f"{len(new_releases)} new releases")
+    return new_releases
 
-    # make a data frame
-    nr_df = pd.DataFrame(new_releases)
-    nr_df = nr_df.convert_dtypes()
-    return nr_df
 
-
-def insert_releases(cur: cursor, releases_df: pd.DataFrame) -> None:
+def insert_releases(cur: cursor, releases: list[NewRelease]) -> None:
     """
-    insert releases (technically, release groups) into database
+    insert releases (technically, release groups) into database in a single statement
 
     Parameters
     ----------
     cur : cursor
-    releases_df : pd.DataFrame
+    releases : list[NewRelease]
 
     Returns
     -------
@@ -192,45 +580,48 @@ def insert_releases(cur: cursor, releases_df: pd.DataFrame) -> None:
     """
 
     # release groups might belong to multiple artists, so de-dup
-    releases_sql = releases_df.copy().drop(columns="mb_artist_id")
-    releases_sql = releases_sql.drop_duplicates(subset="mb_release_id")
-    releases_sql["release_date"] = releases_sql["release_date"]
+    releases_sql: dict[str, NewRelease] = {}
 
-    for i, (_, r) in enumerate(releases_sql.iterrows()):
-        logger.info(
-            f"Inserting release {i + 1} of {len(releases_sql)}: "
-            f"{r['title']} ({r['mb_release_id']})"
-        )
+    for r in releases:
+        releases_sql.setdefault(r.mb_release_id, r)
 
-        types = list(r["types"])
-        types.sort()
+    created_at = now_ms()
 
-        cur.execute(
-            """
-            insert into mb_releases
-            (id, title, types, release_date, created_at)
-            values
-            (%s, %s, %s, %s, %s)
-            on conflict do nothing
-            """,
-            (
-                r["mb_release_id"],
-                r["title"],
-                "".join(["{", ",".join(types), "}"]),
-                dt_to_int(r["release_date"]),
-                dt_to_int(pd.to_datetime("now", utc=True)),
-            ),
+    rows = [
+        (
+            r.mb_release_id,
+            r.title,
+            sorted(r.types),
+            date_to_ms(r.release_date),
+            created_at,
         )
+        for r in releases_sql.values()
+    ]
+
+    logger.info(f"Inserting {len(rows)} releases")
+
+    execute_values(
+        cur,
+        """
+        insert into mb_releases
+        (id, title, types, release_date, created_at)
+        values %s
+        on conflict do nothing
+        """,
+        rows,
+        template="(%s::uuid, %s, %s::text[], %s::bigint, %s::bigint)",
+        page_size=max(len(rows), 1),
+    )
 
 
-def insert_artist_releases(cur: cursor, releases_df: pd.DataFrame) -> None:
+def insert_artist_releases(cur: cursor, releases: list[NewRelease]) -> None:
     """
-    insert artist releases (join table records) into database
+    insert artist releases (join table records) into database in a single statement
 
     Parameters
     ----------
     cur : cursor
-    releases_df : pd.DataFrame
+    releases : list[NewRelease]
 
     Returns
     -------
@@ -239,26 +630,25 @@ def insert_artist_releases(cur: cursor, releases_df: pd.DataFrame) -> None:
 
     # release groups might belong to multiple artists, so store this relationship in a
     # join table
-    artist_releases_sql = releases_df.loc[:, ["mb_artist_id", "mb_release_id"]]
-    artist_releases_sql = artist_releases_sql.rename(columns={"id": "mb_release_id"})
-    artist_releases_sql = artist_releases_sql.drop_duplicates()
+    rows = list(dict.fromkeys((r.mb_artist_id, r.mb_release_id) for r in releases))
 
-    for i, r in artist_releases_sql.iterrows():
-        logger.info(f"Inserting artist release {i + 1} of {len(artist_releases_sql)}")
+    logger.info(f"Inserting {len(rows)} artist releases")
 
-        cur.execute(
-            """
-            insert into mb_artist_releases
-            (mb_artist_id, mb_release_id)
-            values
-            (%s, %s)
-            on conflict do nothing
-            """,
-            (r["mb_artist_id"], r["mb_release_id"]),
-        )
+    execute_values(
+        cur,
+        """
+        insert into mb_artist_releases
+        (mb_artist_id, mb_release_id)
+        values %s
+        on conflict do nothing
+        """,
+        rows,
+        template="(%s::uuid, %s::uuid)",
+        page_size=max(len(rows), 1),
+    )
 
 
-def get_mb_relationships(artist_id: str) -> list[dict[str, str]]:
+def get_mb_relationships(artist_id: str, mb_cache: MbCache) -> list[Relationship]:
     """
     get all of an artist's relationships in MusicBrainz
 
@@ -266,14 +656,17 @@ def get_mb_relationships(artist_id: str) -> list[dict[str, str]]:
     ----------
     artist_id : str
         a MusicBrainz artist ID
+    mb_cache : MbCache
+        cache (and rate limiter) for MusicBrainz API requests
 
     Returns
     -------
-    list[dict[str, str]]
-         a list of dictionaries containing artist relationship metadata
+    list[Relationship]
     """
 
-    artist = mb.get_artist_by_id(artist_id, includes=["artist-rels"])
+    artist = mb_cache.request(
+        "artist", mb.get_artist_by_id, id=artist_id, includes=["artist-rels"]
+    )
 
     if "relations" not in artist:
         return []
@@ -292,20 +685,22 @@ def get_mb_relationships(artist_id: str) -> list[dict[str, str]]:
     logger.info(f"{len(valid_rels)} artist relationships")
 
     return [
-        {
-            "mb_artist_id": artist_id,
-            "type": x["type"],
-            "direction": x["direction"],
-            "other_mb_artist_id": x["artist"]["id"],
-            "other_mb_artist_name": x["artist"]["name"],
-        }
+        Relationship(
+            mb_artist_id=artist_id,
+            type=x["type"],
+            direction=x["direction"],
+            other_mb_artist_id=x["artist"]["id"],
+            other_mb_artist_name=x["artist"]["name"],
+        )
         for x in valid_rels
     ]
 
 
-def get_existing_relationships(cur: cursor, artist_id: str) -> list[dict[str, str]]:
+def get_existing_relationships(
+    cur: cursor, artist_id: str
+) -> set[tuple[str, str, str, str]]:
     """
-    get the list of artist relationships already stored in database
+    get the artist relationships already stored in database
 
     Parameters
     ----------
@@ -315,8 +710,8 @@ def get_existing_relationships(cur: cursor, artist_id: str) -> list[dict[str, st
 
     Returns
     -------
-    list[dict[str, str]]
-        the existing artist relationships
+    set[tuple[str, str, str, str]]
+        the keys (see `Relationship.key`) of the existing artist relationships
     """
 
     # get all of their previously stored relationships
@@ -335,108 +730,96 @@ def get_existing_relationships(cur: cursor, artist_id: str) -> list[dict[str, st
         (artist_id,),
     )
 
-    existing_relationships = [
-        {
-            "mb_artist_id": x[0],
-            "type": x[1],
-            "direction": x[2],
-            "other_mb_artist_id": x[3],
-        }
-        for x in cur.fetchall()
-    ]
+    existing_relationships = set(cur.fetchall())
 
     logger.info(f"{len(existing_relationships)} existing relationships")
     return existing_relationships
 
 
 def filter_new_relationships(
-    relationships: list[dict[str, str]],
-    existing_relationships: list[dict[str, str]],
-) -> pd.DataFrame:
+    relationships: list[Relationship],
+    existing_relationships: set[tuple[str, str, str, str]],
+) -> list[Relationship]:
     """
     filter the artist relationships to those not already stored in database
 
     Parameters
     ----------
+    relationships : list[Relationship]
+        all of an artist's relationships in MusicBrainz
+    existing_relationships : set[tuple[str, str, str, str]]
+        the keys of the relationships already in the DB
 
     Returns
     -------
-    pd.DataFrame
+    list[Relationship]
         just the new artist relationships
     """
 
-    rel_df = pd.DataFrame(relationships, dtype="string")
-
-    if len(existing_relationships) == 0:
-        new_relationships = rel_df
-    else:
-        existing_rel_df = pd.DataFrame(existing_relationships, dtype="string")
-
-        new_relationships = anti_join(
-            rel_df,
-            existing_rel_df,
-            on=["mb_artist_id", "type", "direction", "other_mb_artist_id"],
-        )
-
-    new_relationships = new_relationships.drop_duplicates()  # just in case
+    # de-dup, just in case
+    new_relationships = list(
+        dict.fromkeys(r for r in relationships if r.key not in existing_relationships)
+    )
 
     logger.info(f"{len(new_relationships)} new relationships")
     return new_relationships
 
 
-def insert_relationships(cur: cursor, relationships_df: pd.DataFrame) -> None:
+def insert_relationships(cur: cursor, relationships: list[Relationship]) -> None:
     """
-    insert artist relationships into database
+    insert artist relationships into database in a single statement
 
     Parameters
     ----------
     cur : cursor
-    relationships_df : pd.DataFrame
+    relationships : list[Relationship]
 
     Returns
     -------
     None
     """
 
-    for i, (_, r) in enumerate(relationships_df.iterrows()):
+    created_at = now_ms()
+    rows = [(*r, created_at) for r in relationships]
+
+    for r in relationships:
         logger.info(
-            f"Inserting relationship {i + 1} of {len(relationships_df)}: "
-            f"{r['type']} {r['other_mb_artist_name']} ({r['other_mb_artist_id']})"
+            f"Inserting relationship: {r.type} {r.other_mb_artist_name} "
+            f"({r.other_mb_artist_id})"
         )
 
-        cur.execute(
-            """
-            insert into mb_artist_relationships
-                (
-                    mb_artist_id,
-                    type,
-                    direction,
-                    other_mb_artist_id,
-                    other_mb_artist_name,
-                    created_at
-            ) values
-                (%s, %s, %s, %s, %s, %s)
-            """,
+    execute_values(
+        cur,
+        """
+        insert into mb_artist_relationships
             (
-                r["mb_artist_id"],
-                r["type"],
-                r["direction"],
-                r["other_mb_artist_id"],
-                r["other_mb_artist_name"],
-                dt_to_int(pd.to_datetime("now", utc=True)),
-            ),
-        )
+                mb_artist_id,
+                type,
+                direction,
+                other_mb_artist_id,
+                other_mb_artist_name,
+                created_at
+        ) values %s
+        """,
+        rows,
+        page_size=max(len(rows), 1),
+    )
 
 
-def checked_artist(cur: cursor, artist_id: str) -> None:
+def checked_artist(
+    cur: cursor, artist_id: str, release_group_count: int, digest: str
+) -> None:
     """
     touch last_checked column in database so that this artist is put at the back of the
-    queue
+    queue, and store what the artist's release groups looked like for the next check
 
     Parameters
     ----------
     cur : cursor
     artist_id : str
+    release_group_count : int
+    digest : str
+        digest of the first page of release groups
 
     Returns
     -------
@@ -446,69 +829,49 @@ def checked_artist(cur: cursor, artist_id: str) -> None:
     cur.execute(
         """
         update mb_artists
-        set last_checked = %s
+        set last_checked = %s, release_group_count = %s, releases_digest = %s
         where id=%s
         """,
-        (dt_to_int(pd.to_datetime("now", utc=True)), artist_id),
+        (now_ms(), release_group_count, digest, artist_id),
     )
 
 
-def dt_to_int(x: str | pd.Timestamp) -> int | None:
+def now_ms() -> int:
     """
-    convert possibly empty string or timestamp to int
-
-    Parameters
-    ----------
-    x : str | pd.Timestamp
+    get the current time as milliseconds since the epoch (the representation used for
+    timestamps in the DB)
 
     Returns
     -------
-    int | None
+    int
     """
 
-    if isinstance(x, str):
-        x = pd.to_datetime(x)
-
-        if pd.isna(x):
-            return None
+    return round(time.time() * 1000)
 
-    return round(x.value / 1e6)
 
-
-def anti_join(
-    x: pd.DataFrame, y: pd.DataFrame, on: str | Iterable[str]
-) -> pd.DataFrame:
+def date_to_ms(x: str) -> int | None:
     """
-    anti-join
+    convert a possibly empty or partial (e.g. "2001" or "2001-05") MusicBrainz date to
+    milliseconds since the epoch
 
     Parameters
     ----------
-    x : pd.DataFrame
-    y: pd.DataFrame
-    on: str | Iterable[str]
-        the columns to anti join on
+    x : str
 
     Returns
     -------
-    pd.DataFrame
-        a subsetted data frame
-
+    int | None
+        None if the date is empty or invalid
     """
 
-    if len(y) == 0:
-        return x
-
-    # make a data frame of just the join columns
-    dummy = y.loc[:, on]  # pyright: ignore
-
-    # convert to data frame if `on` was a single column
-    if isinstance(dummy, pd.Series):
-        dummy = dummy.to_frame()
-
-    dummy.loc[:, "dummy_col"] = 1  # indicator variable
+    if x == "":
+        return None
 
-    # attempt to join left data frame (`x`) to the dummy data frame
-    merged = x.merge(dummy, on=on, how="left")
+    try:
+        year, month, day = [int(p) for p in x.split("-")] + [1] * (2 - x.count("-"))
+        dt = datetime(year, month, day, tzinfo=timezone.utc)
+    except ValueError:
+        logger.warning(f"Invalid release date: {x}")
+        return None
 
-    # keep only the non-matches
-    return merged.loc[merged["dummy_col"].isna(), x.columns.tolist()]
+    return round(dt.timestamp() * 1000)
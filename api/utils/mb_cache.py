@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from concurrent.futures import Executor
+from contextlib import closing
+from typing import Any, Callable
+
+from fastapi.logger import logger
+
+from utils.rate_limit import TokenBucket
+from utils.sqlite_store import SqliteStore
+
+
+class MbCache(SqliteStore):
+    def __init__(
+        self,
+        path: str,
+        limiter: TokenBucket,
+        ttls: dict[str, float],
+        stale_while_revalidate: float,
+        executor: Executor,
+    ):
+        """
+        a persistent cache of (parsed) MusicBrainz API responses, so that retrying a
+        failed artist check or looking up the same artist again soon is served locally
+        instead of spending the 1 request/s budget (stored in SQLite so that it's shared
+        by all the API workers and survives restarts)
+
+        Parameters
+        ----------
+        path : str
+            path to SQLite database file
+        limiter : TokenBucket
+            rate limiter for requests that miss the cache
+        ttls : dict[str, float]
+            number of seconds a response is fresh for, by endpoint (responses from
+            endpoints not listed here aren't cached)
+        stale_while_revalidate : float
+            number of seconds after a response goes stale during which it's still
+            returned while a fresh copy is fetched in the background
+        executor : Executor
+            where to run background revalidations
+        """
+
+        super().__init__(path)
+        self.limiter = limiter
+        self.ttls = ttls
+        self.stale_while_revalidate = stale_while_revalidate
+        self.executor = executor
+
+        # keys currently being revalidated by this worker
+        self.revalidating: set[str] = set()
+        self.lock = threading.Lock()
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                """
+                create table if not exists responses (
+                    key text primary key,
+                    endpoint text not null,
+                    response text not null,
+                    fetched_at real not null
+                )
+                """
+            )
+
+            conn.execute(
+                """
+                create index if not exists responses_fetched_at_index
+                on responses(fetched_at)
+                """
+            )
+
+    def request(
+        self, endpoint: str, func: Callable[..., dict[str, Any]], **kwargs: Any
+    ) -> dict[str, Any]:
+        """
+        get a response from the cache, or call a `musicbrainzngs` function (subject to
+        the rate limit) and cache its response
+
+        Parameters
+        ----------
+        endpoint : str
+            the name of the endpoint (the key in `ttls`)
+        func : Callable[..., dict[str, Any]]
+            the `musicbrainzngs` function, e.g. `browse_release_groups`
+        **kwargs : Any
+            arguments to `func` (must be JSON-serializable)
+
+        Returns
+        -------
+        dict[str, Any]
+            the parsed response
+        """
+
+        if endpoint not in self.ttls:
+            return self.fetch(endpoint, None, func, **kwargs)
+
+        key = endpoint + json.dumps(kwargs, sort_keys=True)
+        ttl = self.ttls[endpoint]
+
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute(
+                "select response, fetched_at from responses where key=?", (key,)
+            ).fetchone()
+
+            if row is not None:
+                age = time.time() - row[1]
+
+                if age < ttl:
+                    self.increment(conn, "hits")
+                    return json.loads(row[0])
+
+                if age < ttl + self.stale_while_revalidate:
+                    self.increment(conn, "stale_hits")
+                    self.revalidate(endpoint, key, func, **kwargs)
+                    return json.loads(row[0])
+
+            self.increment(conn, "misses")
+
+        return self.fetch(endpoint, key, func, **kwargs)
+
+    def fetch(
+        self,
+        endpoint: str,
+        key: str | None,
+        func: Callable[..., dict[str, Any]],
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        """
+        call a `musicbrainzngs` function (subject to the rate limit) and cache its
+        response
+
+        Parameters
+        ----------
+        endpoint : str
+        key : str | None
+            the cache key, or None to not cache the response
+        func : Callable[..., dict[str, Any]]
+        **kwargs : Any
+
+        Returns
+        -------
+        dict[str, Any]
+            the parsed response
+        """
+
+        self.limiter.acquire()
+        res = func(**kwargs)
+
+        if key is None:
+            return res
+
+        max_age = max(self.ttls.values()) + self.stale_while_revalidate
+        now = time.time()
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "insert or replace into responses values (?, ?, ?, ?)",
+                (key, endpoint, json.dumps(res), now),
+            )
+
+            # forget responses that are too old to ever be returned
+            conn.execute("delete from responses where fetched_at < ?", (now - max_age,))
+
+        return res
+
+    def revalidate(
+        self,
+        endpoint: str,
+        key: str,
+        func: Callable[..., dict[str, Any]],
+        **kwargs: Any,
+    ) -> None:
+        """
+        refresh a stale response in the background (unless that's already happening)
+
+        Parameters
+        ----------
+        endpoint : str
+        key : str
+        func : Callable[..., dict[str, Any]]
+        **kwargs : Any
+
+        Returns
+        -------
+        None
+        """
+
+        with self.lock:
+            if key in self.revalidating:
+                return
+
+            self.revalidating.add(key)
+
+        def refresh() -> None:
+            try:
+                self.fetch(endpoint, key, func, **kwargs)
+
+                with closing(self.connect()) as conn, conn:
+                    self.increment(conn, "revalidations")
+
+            except Exception:
+                logger.exception(f"Failed to revalidate {key}")
+
+            finally:
+                with self.lock:
+                    self.revalidating.discard(key)
+
+        self.executor.submit(refresh)
+
+    def stats(self) -> dict[str, int]:
+        """
+        get the number of cached responses and the hit/miss/revalidation counts
+
+        Returns
+        -------
+        dict[str, int]
+        """
+
+        with closing(self.connect()) as conn:
+            counts = self.counters(conn)
+            n = conn.execute("select count(*) from responses").fetchone()[0]
+
+        return {
+            "entries": n,
+            "hits": counts.get("hits", 0),
+            "stale_hits": counts.get("stale_hits", 0),
+            "misses": counts.get("misses", 0),
+            "revalidations": counts.get("revalidations", 0),
+        }
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from fastapi.logger import logger
+
+from utils.sqlite_store import SqliteStore
+
+
+class Mp3Cache(SqliteStore):
+    def __init__(self, cache_dir: str, max_size: int, index_path: str):
+        """
+        a size-limited, least recently used cache of mp3 files on the local filesystem
+
+        The files' sizes, S3 ETags, and last access times are kept in a SQLite index
+        shared by all the API workers, so the cache's total size is known without
+        listing the directory, files are evicted as soon as it goes over budget, and
+        cached copies can be checked against S3 cheaply.
+
+        Parameters
+        ----------
+        cache_dir : str
+            path to directory of cached mp3 files
+        max_size : int
+            maximum total size of cached files (in bytes)
+        index_path : str
+            path to SQLite database file for the index
+        """
+
+        super().__init__(index_path)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                """
+                create table if not exists files (
+                    name text primary key,
+                    size integer not null,
+                    last_used real not null,
+                    etag text
+                )
+                """
+            )
+
+            # index might predate the etag column
+            columns = [x[1] for x in conn.execute("pragma table_info(files)")]
+
+            if "etag" not in columns:
+                conn.execute("alter table files add column etag text")
+
+            conn.execute(
+                "create index if not exists files_last_used_index on files(last_used)"
+            )
+
+    def path(self, name: str) -> str:
+        """
+        get the local path of a (possibly not yet cached) file
+
+        Parameters
+        ----------
+        name : str
+            file name
+
+        Returns
+        -------
+        str
+        """
+
+        return os.path.join(self.cache_dir, name)
+
+    def get(self, name: str) -> tuple[str, str | None] | None:
+        """
+        look up a file in the cache, marking it as recently used
+
+        Parameters
+        ----------
+        name : str
+            file name
+
+        Returns
+        -------
+        tuple[str, str | None] | None
+            the local path of the file and the S3 ETag it was cached with (if known),
+            or None if it's not cached
+        """
+
+        path = self.path(name)
+
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute(
+                "select etag from files where name=?", (name,)
+            ).fetchone()
+
+            if row is not None and os.path.isfile(path):
+                conn.execute(
+                    "update files set last_used=? where name=?", (time.time(), name)
+                )
+
+                self.increment(conn, "hits")
+                return path, row[0]
+
+            # forget about the file if it was deleted from outside the cache
+            conn.execute("delete from files where name=?", (name,))
+            self.increment(conn, "misses")
+            return None
+
+    def add(self, name: str, etag: str | None = None) -> None:
+        """
+        record a file that was just written (or rewritten) to the cache directory, then
+        evict least recently used files until the cache is within budget
+
+        Parameters
+        ----------
+        name : str
+            file name
+        etag : str | None
+            the S3 ETag of the object the file is a copy of
+
+        Returns
+        -------
+        None
+        """
+
+        size = os.path.getsize(self.path(name))
+
+        with closing(self.connect()) as conn, conn:
+            # take the write lock now so that workers don't evict concurrently
+            conn.execute("begin immediate")
+
+            conn.execute(
+                "insert or replace into files values (?, ?, ?, ?)",
+                (name, size, time.time(), etag),
+            )
+
+            self.evict(conn, keep=name)
+
+    def remove(self, name: str) -> None:
+        """
+        delete a file from the cache (e.g. because it's out of date)
+
+        Parameters
+        ----------
+        name : str
+            file name
+
+        Returns
+        -------
+        None
+        """
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute("delete from files where name=?", (name,))
+
+        if os.path.isfile(self.path(name)):
+            os.remove(self.path(name))
+
+    def clean(self, min_age: float = 60 * 60) -> None:
+        """
+        reconcile the index with the cache directory (dropping files that no longer
+        exist and adopting untracked mp3 files that haven't been touched in a while,
+        e.g. ones left by a crashed worker) and then evict files beyond the budget
+
+        Parameters
+        ----------
+        min_age : float
+            untracked files modified less than this many seconds ago are assumed to
+            still be in use and ignored
+
+        Returns
+        -------
+        None
+        """
+
+        now = time.time()
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute("begin immediate")
+            indexed = {x[0] for x in conn.execute("select name from files")}
+
+            with os.scandir(self.cache_dir) as it:
+                files = {x.name: x.stat() for x in it if x.is_file()}
+
+            conn.executemany(
+                "delete from files where name=?",
+                [(x,) for x in indexed - files.keys()],
+            )
+
+            conn.executemany(
+                "insert into files values (?, ?, ?, null)",
+                [
+                    (name, st.st_size, st.st_mtime)
+                    for name, st in files.items()
+                    if name not in indexed
+                    and name.endswith(".mp3")
+                    and st.st_mtime < now - min_age
+                ],
+            )
+
+            self.evict(conn)
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        get the cache's occupancy and hit/miss/eviction counts
+
+        Returns
+        -------
+        dict[str, int | float]
+        """
+
+        with closing(self.connect()) as conn:
+            counts = self.counters(conn)
+            n, size = conn.execute("select count(*), sum(size) from files").fetchone()
+
+        hits, misses = counts.get("hits", 0), counts.get("misses", 0)
+
+        return {
+            "files": n,
+            "size": size or 0,
+            "max_size": self.max_size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses > 0 else 0.0,
+            "evictions": counts.get("evictions", 0),
+        }
+
+    def evict(self, conn: sqlite3.Connection, keep: str | None = None) -> None:
+        """
+        delete least recently used files until the cache is within budget (must be
+        called inside a write transaction)
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+        keep : str | None
+            a file name to never evict (i.e. the one that was just added)
+
+        Returns
+        -------
+        None
+        """
+
+        total = conn.execute("select coalesce(sum(size), 0) from files").fetchone()[0]
+
+        if total <= self.max_size:
+            return
+
+        to_evict = []
+
+        for name, size in conn.execute(
+            "select name, size from files order by last_used"
+        ).fetchall():
+            if total <= self.max_size:
+                break
+
+            if name != keep:
+                to_evict.append(name)
+                total -= size
+
+        logger.info(f"Evicting {len(to_evict)} files from {self.cache_dir}")
+
+        for name in to_evict:
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+        conn.executemany("delete from files where name=?", [(x,) for x in to_evict])
+        self.increment(conn, "evictions", len(to_evict))
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import time
+import uuid
+from contextlib import closing
+from typing import TYPE_CHECKING
+
+from fastapi.logger import logger
+
+from utils.sqlite_store import SqliteStore
+
+if TYPE_CHECKING:
+    from utils.db_pool import DbPool
+
+
+class PlayBuffer(SqliteStore):
+    def __init__(self, path: str, batch_size: int = 1000, claim_timeout: float = 60):
+        """
+        a persistent buffer of track plays waiting to be inserted into the `plays`
+        table, so that plays from all clients are inserted a batch at a time instead of
+        one per request (stored in SQLite so that it's shared by all the API workers and
+        buffered plays survive restarts)
+
+        Parameters
+        ----------
+        path : str
+            path to SQLite database file
+        batch_size : int
+            maximum number of plays to insert at once
+        claim_timeout : float
+            number of seconds after which plays claimed by a worker that never reported
+            back (e.g. because it was killed) can be claimed again
+        """
+
+        super().__init__(path)
+        self.batch_size = batch_size
+        self.claim_timeout = claim_timeout
+
+        with closing(self.connect()) as conn, conn:
+            # a client retrying a request doesn't record the same play twice
+            conn.execute(
+                """
+                create table if not exists plays (
+                    id integer primary key autoincrement,
+                    track_id text not null,
+                    dt integer not null,
+                    claim text,
+                    claimed_until real,
+                    unique (track_id, dt)
+                )
+                """
+            )
+
+    def add(self, track_id: str, dt: int) -> None:
+        """
+        add a play to the buffer
+
+        Parameters
+        ----------
+        track_id : str
+        dt : int
+            when the track was played (in ms since the epoch)
+
+        Returns
+        -------
+        None
+        """
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "insert or ignore into plays (track_id, dt) values (?, ?)",
+                (track_id, dt),
+            )
+
+    def claim(self) -> list[tuple[int, str, int]]:
+        """
+        claim the oldest batch of buffered plays (so that another worker flushing the
+        buffer at the same time doesn't insert them too)
+
+        Returns
+        -------
+        list[tuple[int, str, int]]
+            the buffer ID, track ID, and time of each claimed play
+        """
+
+        claim = uuid.uuid4().hex
+        now = time.time()
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                """
+                update plays
+                set claim = ?, claimed_until = ?
+                where id in (
+                    select id
+                    from plays
+                    where claimed_until is null or claimed_until < ?
+                    order by id
+                    limit ?
+                )
+                """,
+                (claim, now + self.claim_timeout, now, self.batch_size),
+            )
+
+            return conn.execute(
+                "select id, track_id, dt from plays where claim = ? order by id",
+                (claim,),
+            ).fetchall()
+
+    def flush(self, db_pool: DbPool) -> int:
+        """
+        insert a batch of buffered plays into the DB with a single statement and remove
+        them from the buffer (plays of tracks that have since been deleted and plays
+        that were already inserted, e.g. by a flush that crashed before removing them,
+        are dropped)
+
+        Parameters
+        ----------
+        db_pool : DbPool
+
+        Returns
+        -------
+        int
+            the number of plays taken from the buffer
+        """
+
+        from psycopg2.extras import execute_values
+
+        plays = self.claim()
+
+        if len(plays) == 0:
+            return 0
+
+        try:
+            with db_pool.connection() as conn, conn, conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    """
+                    insert into plays (track_id, dt)
+                    select v.track_id, v.dt
+                    from (values %s) as v (track_id, dt)
+                    inner join tracks on tracks.id = v.track_id
+                    on conflict (track_id, dt) do nothing
+                    """,
+                    [x[1:] for x in plays],
+                    template="(%s, %s::bigint)",
+                    page_size=len(plays),
+                )
+
+                n_inserted = cur.rowcount
+
+        except Exception:
+            # release the plays so they're retried on the next flush
+            with closing(self.connect()) as conn, conn:
+                conn.executemany(
+                    "update plays set claim = null, claimed_until = null where id = ?",
+                    [(x[0],) for x in plays],
+                )
+
+            raise
+
+        with closing(self.connect()) as conn, conn:
+            conn.executemany("delete from plays where id = ?", [(x[0],) for x in plays])
+            self.increment(conn, "inserted", n_inserted)
+            self.increment(conn, "dropped", len(plays) - n_inserted)
+
+        logger.info(f"Inserted {n_inserted} plays")
+        return len(plays)
+
+    def stats(self) -> dict[str, int]:
+        """
+        get the number of buffered plays and counts of inserted and dropped plays
+
+        Returns
+        -------
+        dict[str, int]
+        """
+
+        with closing(self.connect()) as conn:
+            counts = self.counters(conn)
+            n = conn.execute("select count(*) from plays").fetchone()[0]
+
+        return {
+            "buffered": n,
+            "inserted": counts.get("inserted", 0),
+            "dropped": counts.get("dropped", 0),
+        }
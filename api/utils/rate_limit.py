@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1):
+        """
+        a thread-safe token bucket rate limiter
+
+        Unlike musicbrainzngs' built-in limiter, the lock is only held while reserving a
+        token (not for the duration of the request), so callers in different threads
+        can have requests in flight at once while still starting no more than `rate`
+        requests per second on average.
+
+        Parameters
+        ----------
+        rate : float
+            number of tokens added per second
+        capacity : float
+            maximum number of tokens that can accumulate (i.e. the burst size)
+        """
+
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.n_acquired = 0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        take a token, blocking until one is available
+
+        Returns
+        -------
+        None
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+
+            # reserve the token now (possibly going into debt) so that concurrent
+            # callers queue up behind this one instead of racing for the same token
+            self.tokens -= 1
+            self.n_acquired += 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
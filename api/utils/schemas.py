@@ -8,10 +8,42 @@ class Auth(BaseModel):
 
 class Import(BaseModel):
     filename: str
+    ranged: bool = False
+
+
+class ImportBatch(BaseModel):
+    filenames: list[str]
+    ranged: bool = False
+
+
+class SignTracks(BaseModel):
+    track_ids: list[str]
+    expires_in: int = 60 * 60
+
+
+class PresignBatch(BaseModel):
+    filenames: list[str]
+
+
+class MultipartStart(BaseModel):
+    filename: str
+    size: int
+    part_size: int = 8 * 1024 * 1024
+
+
+class MultipartUpload(BaseModel):
+    filename: str
+    upload_id: str
+
+
+class MultipartParts(MultipartUpload):
+    size: int
+    part_size: int
 
 
 class Retag(BaseModel):
     track_tags: dict[str, dict[str, str]]
+    in_place: bool = False
 
 
 class Scrobble(BaseModel):
@@ -21,3 +53,9 @@ class Scrobble(BaseModel):
     track_number: int | None = None
     title: str
     duration: int | None = None
+
+
+class Play(BaseModel):
+    track_id: str
+    dt: int | None = None
+    scrobble: Scrobble | None = None
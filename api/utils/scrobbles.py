@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import json
+import time
+import uuid
+from contextlib import closing
+from typing import TYPE_CHECKING, Any
+
+from fastapi.logger import logger
+
+from utils.sqlite_store import SqliteStore
+
+if TYPE_CHECKING:
+    import pylast
+
+
+class ScrobbleQueue(SqliteStore):
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 50,
+        max_age: float = 14 * 24 * 60 * 60,
+        min_backoff: float = 30,
+        max_backoff: float = 60 * 60,
+        claim_timeout: float = 5 * 60,
+    ):
+        """
+        a persistent queue of scrobbles waiting to be submitted to last.fm, so that the
+        scrobble route doesn't wait for last.fm and scrobbles aren't lost while it's
+        down (stored in SQLite so that it's shared by all the API workers and survives
+        restarts)
+
+        Parameters
+        ----------
+        path : str
+            path to SQLite database file
+        batch_size : int
+            maximum number of scrobbles to submit at once (last.fm allows 50)
+        max_age : float
+            number of seconds after which a scrobble that still hasn't been submitted is
+            dropped (last.fm ignores scrobbles more than 14 days old)
+        min_backoff : float
+            number of seconds to wait before retrying a scrobble that failed once,
+            doubling after each further failure
+        max_backoff : float
+            maximum number of seconds to wait before retrying a scrobble
+        claim_timeout : float
+            number of seconds after which scrobbles claimed by a worker that never
+            reported back (e.g. because it was killed) can be claimed again
+        """
+
+        super().__init__(path)
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.claim_timeout = claim_timeout
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                """
+                create table if not exists scrobbles (
+                    id integer primary key autoincrement,
+                    scrobble text not null,
+                    timestamp integer not null,
+                    attempts integer not null default 0,
+                    next_attempt_at real not null,
+                    claim text,
+                    claimed_until real
+                )
+                """
+            )
+
+            conn.execute(
+                """
+                create index if not exists scrobbles_next_attempt_at_index
+                on scrobbles(next_attempt_at)
+                """
+            )
+
+    def add(self, scrobble: dict[str, Any]) -> None:
+        """
+        add a scrobble to the queue
+
+        Parameters
+        ----------
+        scrobble : dict[str, Any]
+            keyword arguments to `pylast.LastFMNetwork.scrobble`, including `timestamp`
+
+        Returns
+        -------
+        None
+        """
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                """
+                insert into scrobbles (scrobble, timestamp, next_attempt_at)
+                values (?, ?, ?)
+                """,
+                (json.dumps(scrobble), scrobble["timestamp"], time.time()),
+            )
+
+    def claim(self) -> list[tuple[int, dict[str, Any]]]:
+        """
+        claim the oldest batch of scrobbles that are due to be submitted (so that
+        another worker flushing the queue at the same time doesn't submit them too),
+        dropping any that are too old to submit
+
+        Returns
+        -------
+        list[tuple[int, dict[str, Any]]]
+            the ID and scrobble of each claimed scrobble
+        """
+
+        claim = uuid.uuid4().hex
+        now = time.time()
+
+        with closing(self.connect()) as conn, conn:
+            n_dropped = conn.execute(
+                "delete from scrobbles where timestamp < ?", (now - self.max_age,)
+            ).rowcount
+
+            if n_dropped > 0:
+                logger.warning(f"Dropped {n_dropped} scrobbles that were too old")
+                self.increment(conn, "dropped", n_dropped)
+
+            conn.execute(
+                """
+                update scrobbles
+                set claim = ?, claimed_until = ?
+                where id in (
+                    select id
+                    from scrobbles
+                    where next_attempt_at <= ?
+                    and (claimed_until is null or claimed_until < ?)
+                    order by id
+                    limit ?
+                )
+                """,
+                (claim, now + self.claim_timeout, now, now, self.batch_size),
+            )
+
+            rows = conn.execute(
+                "select id, scrobble from scrobbles where claim = ? order by id",
+                (claim,),
+            ).fetchall()
+
+        return [(x[0], json.loads(x[1])) for x in rows]
+
+    def flush(self, lastfm: pylast.LastFMNetwork) -> int:
+        """
+        submit a batch of scrobbles that are due, removing them from the queue if that
+        succeeds and backing off before retrying them if it doesn't
+
+        Parameters
+        ----------
+        lastfm : pylast.LastFMNetwork
+
+        Returns
+        -------
+        int
+            the number of scrobbles submitted
+        """
+
+        scrobbles = self.claim()
+
+        if len(scrobbles) == 0:
+            return 0
+
+        ids = [x[0] for x in scrobbles]
+
+        try:
+            lastfm.scrobble_many([x[1] for x in scrobbles])
+
+        except Exception:
+            logger.exception(f"Failed to submit {len(scrobbles)} scrobbles")
+            self.retry_later(ids)
+            return 0
+
+        with closing(self.connect()) as conn, conn:
+            conn.executemany("delete from scrobbles where id = ?", [(x,) for x in ids])
+            self.increment(conn, "submitted", len(ids))
+
+        logger.info(f"Scrobbled {len(ids)} tracks")
+        return len(ids)
+
+    def retry_later(self, ids: list[int]) -> None:
+        """
+        release claimed scrobbles and push back their next attempt (exponentially
+        with the number of attempts so far)
+
+        Parameters
+        ----------
+        ids : list[int]
+
+        Returns
+        -------
+        None
+        """
+
+        with closing(self.connect()) as conn, conn:
+            conn.executemany(
+                """
+                update scrobbles
+                set attempts = attempts + 1,
+                    next_attempt_at = ? + min(? * (1 << min(attempts, 20)), ?),
+                    claim = null,
+                    claimed_until = null
+                where id = ?
+                """,
+                [(time.time(), self.min_backoff, self.max_backoff, x) for x in ids],
+            )
+
+            self.increment(conn, "failed_attempts", len(ids))
+
+    def stats(self) -> dict[str, int | float | None]:
+        """
+        get the queue depth, the age of the oldest queued scrobble, and counts of
+        submitted, failed, and dropped scrobbles
+
+        Returns
+        -------
+        dict[str, int | float | None]
+        """
+
+        with closing(self.connect()) as conn:
+            counts = self.counters(conn)
+
+            n, oldest, n_retrying = conn.execute(
+                """
+                select count(*), min(timestamp), coalesce(sum(attempts > 0), 0)
+                from scrobbles
+                """
+            ).fetchone()
+
+        return {
+            "depth": n,
+            "retrying": n_retrying,
+            "oldest_age": None if oldest is None else round(time.time() - oldest),
+            "submitted": counts.get("submitted", 0),
+            "failed_attempts": counts.get("failed_attempts", 0),
+            "dropped": counts.get("dropped", 0),
+        }
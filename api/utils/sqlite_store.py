@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import sqlite3
+from contextlib import closing
+
+
+class SqliteStore:
+    def __init__(self, db_path: str):
+        """
+        base class for state kept in a SQLite database so that it's shared by all the API
+        workers (e.g. caches and queues), with a table of named counters for stats
+
+        Subclasses call this before creating their own tables.
+
+        Parameters
+        ----------
+        db_path : str
+            path to SQLite database file
+        """
+
+        self.db_path = db_path
+
+        with closing(self.connect()) as conn, conn:
+            # let workers read while another one writes
+            conn.execute("pragma journal_mode=wal")
+
+            conn.execute(
+                """
+                create table if not exists counters (
+                    name text primary key,
+                    value integer not null
+                )
+                """
+            )
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        open a new connection to the DB (connections aren't shared across threads)
+
+        Returns
+        -------
+        sqlite3.Connection
+        """
+
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def counters(conn: sqlite3.Connection) -> dict[str, int]:
+        """
+        get the values of all the counters that have been incremented
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+
+        Returns
+        -------
+        dict[str, int]
+        """
+
+        return dict(conn.execute("select name, value from counters").fetchall())
+
+    @staticmethod
+    def increment(conn: sqlite3.Connection, name: str, by: int = 1) -> None:
+        """
+        increment a counter
+
+        Parameters
+        ----------
+        conn : sqlite3.Connection
+        name : str
+        by : int
+
+        Returns
+        -------
+        None
+        """
+
+        conn.execute(
+            """
+            insert into counters values (?, ?)
+            on conflict (name) do update set value = value + excluded.value
+            """,
+            (name, by),
+        )
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+from hashlib import sha1
+
+# pandas' JSON encoder writes floats with at most this many decimal places
+double_precision = 10
+
+
+def make_track_id(duration: float, fingerprint: str) -> str:
+    """
+    construct a persistent track ID by sha1-hashing an AcoustID fingerprint and the
+    track duration (handles the case where an extended version of an existing track has
+    the same initial 30s of audio)
+
+    The hashed JSON is byte-identical to the legacy method of calling `to_json` on a
+    one-row pandas data frame with `duration` and `fingerprint` columns, so IDs of
+    previously imported tracks don't change.
+
+    Parameters
+    ----------
+    duration : float
+    fingerprint : str
+        an AcoustID fingerprint
+
+    Returns
+    -------
+    str
+        a 40-character hex digest
+    """
+
+    payload = "".join(
+        [
+            '{"duration":',
+            json_float(float(duration)),
+            ',"fingerprint":',
+            json_str(fingerprint),
+            "}",
+        ]
+    )
+
+    return sha1(payload.encode()).hexdigest()
+
+
+def json_float(x: float) -> str:
+    """
+    format a float like pandas' (ujson-based) JSON encoder does, i.e. rounded half-even
+    to `double_precision` decimal places with trailing zeros dropped, switching to
+    `%.10g` for very large or very small values
+
+    Parameters
+    ----------
+    x : float
+
+    Returns
+    -------
+    str
+    """
+
+    neg = x < 0
+    value = -x if neg else x
+
+    if value > 1e16 - 1 or (value != 0.0 and value < 1e-15):
+        return "%.*g" % (double_precision, x)
+
+    pow10 = 10**double_precision
+    whole = int(value)
+    tmp = (value - whole) * pow10
+    frac = int(tmp)
+    diff = tmp - frac
+
+    if diff > 0.5 or (diff == 0.5 and (frac == 0 or frac & 1)):
+        frac += 1
+
+    if frac >= pow10:
+        # rounding rolled over into the whole part (e.g. 0.99999999999)
+        frac = 0
+        whole += 1
+
+    if frac == 0:
+        frac_s = "0"
+    else:
+        frac_s = str(frac).rjust(double_precision, "0").rstrip("0")
+
+    return f"{'-' if neg else ''}{whole}.{frac_s}"
+
+
+def json_str(x: str) -> str:
+    """
+    format a string like pandas' JSON encoder does (ASCII-only, except that DEL characters
+    aren't escaped, and with "/" escaped)
+
+    Parameters
+    ----------
+    x : str
+
+    Returns
+    -------
+    str
+    """
+
+    escaped = "\x7f".join(json.dumps(part)[1:-1] for part in x.split("\x7f"))
+    return '"' + escaped.replace("/", "\\/") + '"'
@@ -1,21 +1,25 @@
 from __future__ import annotations
 
-import datetime
+import asyncio
+import io
 import itertools
 import os
-from hashlib import sha1
+from typing import TYPE_CHECKING
 
-import acoustid
-import pandas as pd
-from botocore.client import BaseClient
-from botocore.exceptions import ClientError
 from fastapi import HTTPException
 from fastapi.logger import logger
-from mutagen import File as Mp3File
-from mutagen.easyid3 import EasyID3
 
-# ID3 tag names that can be edited by EasyID3
-editable_tags = EasyID3.valid_keys.keys()
+from utils.track_id import make_track_id
+
+# botocore, mutagen, and acoustid are imported where they're used to keep API worker
+# startup fast
+if TYPE_CHECKING:
+    from botocore.client import BaseClient
+    from mutagen import PaddingInfo
+    from mutagen.easyid3 import EasyID3
+
+    from utils.api import ApiConfig
+    from utils.mp3_cache import Mp3Cache
 
 # ID3 tag names I actually use
 relevant_tags = [
@@ -31,6 +35,19 @@ relevant_tags = [
     "date",
 ]
 
+# seconds of audio at the start of a track used for fingerprinting
+fingerprint_seconds = 30
+
+# upper bound on MPEG audio byte rate (384 kbps, the max for layer II; layer III tops
+# out at 320 kbps) used to size ranged downloads of the first `fingerprint_seconds`
+max_audio_bytes_per_second = 384_000 // 8
+
+# bytes fetched from the end of a file for ID3v1/APE tags in ranged downloads
+tail_bytes = 64 * 1024
+
+# S3's minimum size for all but the last part of a multipart upload
+min_part_size = 5 * 1024 * 1024
+
 
 def fingerprint_track(f: str) -> dict[str, str | int]:
     """
@@ -47,6 +64,9 @@ def fingerprint_track(f: str) -> dict[str, str | int]:
         a dictionary containing an AcoustID, track duration, and bitrate
     """
 
+    import acoustid
+    from mutagen import File as Mp3File
+
     # this is a good time to get the bitrate since it's not available via ID3 tags
     logger.info("Reading with mutagen...")
     mut = Mp3File(f)
@@ -54,34 +74,269 @@ def fingerprint_track(f: str) -> dict[str, str | int]:
 
     # fingerprint 30s of audio
     logger.info("Fingerprinting...")
-    duration_fingerprint = acoustid.fingerprint_file(f, maxlength=30)
-
-    # using a one-row data frame for consistency with legacy fingerprinting method
-    tracks_to_fp = pd.DataFrame([{"path": f}], index=None)
-    tracks_to_fp[["duration", "fingerprint"]] = duration_fingerprint
-    tracks_to_fp["duration"] = tracks_to_fp["duration"].astype("Float64")
-    tracks_to_fp["fingerprint"] = [x.decode() for x in tracks_to_fp["fingerprint"]]
-    tracks_to_fp["fingerprint"] = tracks_to_fp["fingerprint"].astype("string")
-
-    # use AcoustID fingerprint and the duration to construct persistent ID (handles the
-    # case where an extended version of an existing track has the same initial 30s of
-    # audio) using sha1 hash (good enough since no need for cryptographic security)
-    tracks_to_fp = tracks_to_fp.assign(
-        hash=tracks_to_fp[["duration", "fingerprint"]]
-        .apply(lambda x: sha1(x.to_json().encode()).hexdigest(), axis=1)
-        .astype("string")
-    )
+    duration, fingerprint = acoustid.fingerprint_file(f, maxlength=fingerprint_seconds)
+    duration = float(duration)
 
-    tid = tracks_to_fp["hash"].values[0]
+    # use AcoustID fingerprint and the duration to construct persistent ID
+    tid = make_track_id(duration, fingerprint.decode())
     logger.info(f"id := {tid}")
 
     return {
         "id": tid,
-        "duration": tracks_to_fp["duration"].values[0],
+        "duration": duration,
         "bitrate": bitrate,
     }
 
 
+def read_track(f: str) -> dict[str, str | int]:
+    """
+    fingerprint an mp3 file and get its ID3 tags (a top-level function so that it can
+    be run in a process pool)
+
+    Parameters
+    ----------
+    f : str
+        path to mp3 file
+
+    Returns
+    -------
+    dict[str, str | int]
+        a dictionary containing an AcoustID, track duration, bitrate, and ID3 tags
+    """
+
+    clean_tags = extract_id3_tags(f)
+    fp_duration = fingerprint_track(f)
+    return {**fp_duration, **clean_tags}
+
+
+async def import_incoming_file(
+    config: ApiConfig, filename: str, ranged: bool = False
+) -> dict[str, str | int | bool]:
+    """
+    download an mp3 file in the incoming/ folder on S3 (unless its fingerprint is already
+    cached), fingerprint it, and move it to a permanent location without blocking the
+    event loop
+
+    Parameters
+    ----------
+    config : ApiConfig
+    filename : str
+        name of the file in incoming/
+    ranged : bool
+        if true, only download the parts of the file needed for fingerprinting and
+        reading tags (see `download_partial_mp3`) and delete it afterwards
+
+    Returns
+    -------
+    dict[str, str | int | bool]
+        a dictionary of ID3 tags and other file metadata for the front-end to store in
+        the DB
+    """
+
+    incoming_key = f"incoming/{filename}"
+    temp_f = config.mp3_cache.path(filename)
+    downloaded = False
+
+    # the same bytes might have been imported before (e.g. a retry after a timeout)
+    head = await config.run_io(
+        config.s3_client.head_object, Bucket=config.bucket, Key=incoming_key
+    )
+
+    etag, size = head["ETag"], head["ContentLength"]
+    track = await config.run_io(config.fp_cache.get, etag, size)
+
+    try:
+        if track is None:
+            async with config.download_semaphore:
+                logger.info(f"Saving {filename} to {config.tmp_mp3s_dir}...")
+
+                if ranged:
+                    await config.run_io(
+                        download_partial_mp3,
+                        config.s3_client,
+                        config.bucket,
+                        incoming_key,
+                        temp_f,
+                    )
+                else:
+                    await config.run_io(
+                        config.s3_client.download_file,
+                        config.bucket,
+                        incoming_key,
+                        temp_f,
+                    )
+
+                    downloaded = True
+
+            # get ID3 tags and other metadata
+            track = await config.run_cpu(read_track, temp_f)
+
+            if ranged:
+                os.remove(temp_f)
+
+            await config.run_io(config.fp_cache.put, etag, size, track)
+
+        perm_key = f"mp3s/{track['id']}.mp3"
+
+        # copy from incoming/ to mp3s/ if not already done
+        already_exists = await config.run_io(
+            check_file_exists, config.s3_client, config.bucket, perm_key
+        )
+
+        if not already_exists:
+            perm_etag = await config.run_io(
+                copy_incoming_file,
+                config.s3_client,
+                config.bucket,
+                incoming_key,
+                perm_key,
+            )
+
+    except Exception:
+        # the download isn't in the mp3 cache's index yet, so nothing would evict it
+        remove_file(temp_f)
+        raise
+
+    if downloaded:
+        if already_exists:
+            # the existing file might have been retagged since, so this copy is useless
+            os.remove(temp_f)
+        else:
+            # keep the file in the cache in case it's about to be retagged
+            os.replace(temp_f, config.mp3_cache.path(f"{track['id']}.mp3"))
+            await config.run_io(config.mp3_cache.add, f"{track['id']}.mp3", perm_etag)
+
+    return {**track, "already_exists": already_exists}
+
+
+def remove_file(f: str) -> None:
+    """
+    delete a file if it exists
+
+    Parameters
+    ----------
+    f : str
+        path to the file
+
+    Returns
+    -------
+    None
+    """
+
+    try:
+        os.remove(f)
+    except FileNotFoundError:
+        pass
+
+
+def download_partial_mp3(
+    s3_client: BaseClient, bucket: str, key: str, temp_f: str
+) -> None:
+    """
+    download only the ID3v2 tag, the first `fingerprint_seconds` of audio, and the last
+    `tail_bytes` (ID3v1/APE tags) of an mp3 file on S3 using ranged GETs, writing them to
+    a sparse local file of the same size as the original
+
+    Since the local file has the original's size and its unfetched middle is never read,
+    mutagen and fpcalc report the same bitrate and duration (and therefore the same
+    track ID) as they would for a full download.
+
+    Parameters
+    ----------
+    s3_client : BaseClient
+    bucket : str
+    key : str
+        S3 object key of the mp3 file
+    temp_f : str
+        path to write the sparse mp3 file to
+
+    Returns
+    -------
+    None
+    """
+
+    # the ID3v2 header (if any) says how long the tag at the start of the file is
+    head, file_size, _ = get_object_range(s3_client, bucket, key, 0, tail_bytes)
+    id3_size = id3v2_size(head)
+
+    # allow an extra chunk for the first frame's Xing/VBRI header and decoder priming
+    head_end = min(
+        file_size,
+        id3_size + max_audio_bytes_per_second * fingerprint_seconds + tail_bytes,
+    )
+
+    if head_end > len(head):
+        head += get_object_range(s3_client, bucket, key, len(head), head_end)[0]
+
+    tail_start = max(head_end, file_size - tail_bytes)
+    tail = b""
+
+    if tail_start < file_size:
+        tail = get_object_range(s3_client, bucket, key, tail_start, file_size)[0]
+
+    logger.info(f"Fetched {len(head) + len(tail)} of {file_size} bytes of {key}")
+
+    with open(temp_f, "wb") as f:
+        f.write(head)
+        f.truncate(file_size)  # leaves a hole instead of writing zeros to disk
+        f.seek(tail_start)
+        f.write(tail)
+
+
+def get_object_range(
+    s3_client: BaseClient, bucket: str, key: str, start: int, end: int
+) -> tuple[bytes, int, dict]:
+    """
+    fetch part of an object on S3 with a ranged GET
+
+    Parameters
+    ----------
+    s3_client : BaseClient
+    bucket : str
+    key : str
+    start : int
+        first byte to fetch
+    end : int
+        byte to stop at (exclusive)
+
+    Returns
+    -------
+    tuple[bytes, int, dict]
+        the fetched bytes, the total size of the object, and the GetObject response
+    """
+
+    obj = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}")
+    return obj["Body"].read(), int(obj["ContentRange"].split("/")[-1]), obj
+
+
+def id3v2_size(head: bytes) -> int:
+    """
+    get the total size of the ID3v2 tag at the start of an mp3 file
+
+    Parameters
+    ----------
+    head : bytes
+        at least the first 10 bytes of the file
+
+    Returns
+    -------
+    int
+        size of the tag in bytes (including header, padding, and footer), or 0 if
+        there's no tag
+    """
+
+    if head[:3] != b"ID3" or len(head) < 10:
+        return 0
+
+    # tag size is a 28-bit "syncsafe" integer, excluding the header and footer
+    size = 10 + sum((b & 0x7F) << (7 * (3 - i)) for i, b in enumerate(head[6:10]))
+
+    if head[5] & 0x10:
+        size += 10
+
+    return size
+
+
 def check_file_exists(s3_client: BaseClient, bucket: str, perm_key: str) -> bool:
     """
     check if an mp3 file has previously been imported and saved on S3 already
@@ -99,6 +354,8 @@ def check_file_exists(s3_client: BaseClient, bucket: str, perm_key: str) -> bool
         true if file already exists on S3
     """
 
+    from botocore.exceptions import ClientError
+
     already_exists = True
 
     try:
@@ -131,6 +388,8 @@ def extract_id3_tags(temp_f: str) -> dict[str, str]:
         a dictionary of ID3 tag names and values
     """
 
+    from mutagen.easyid3 import EasyID3
+
     logger.info("Reading ID3 tags...")
     clean_tags = {}
 
@@ -153,7 +412,7 @@ def extract_id3_tags(temp_f: str) -> dict[str, str]:
 
 def copy_incoming_file(
     s3_client: BaseClient, bucket: str, incoming_key: str, perm_key: str
-) -> None:
+) -> str:
     """
     copy mp3 file on S3 from incoming/ to a permanent location, then delete the incoming
     version
@@ -169,11 +428,12 @@ def copy_incoming_file(
 
     Returns
     -------
-    None
+    str
+        the ETag of the permanent file
     """
 
     logger.info(f"Copying {incoming_key} to {perm_key}...")
-    s3_client.copy_object(
+    res = s3_client.copy_object(
         Bucket=bucket,
         Key=perm_key,
         CopySource={"Bucket": bucket, "Key": incoming_key},
@@ -182,93 +442,412 @@ def copy_incoming_file(
     logger.info(f"Deleting {incoming_key}...")
     s3_client.delete_object(Bucket=bucket, Key=incoming_key)
 
+    return res["CopyObjectResult"]["ETag"]
 
-def update_id3_tags(temp_f: str, updated_tags: dict[str, str]) -> None:
+
+def trash_track(s3_client: BaseClient, bucket: str, track_id: str) -> None:
     """
-    update ID3 tags for mp3 file on local filesystem
+    move an mp3 file on S3 to the trash/ folder
 
     Parameters
     ----------
-    temp_f : str
-        path to mp3 file on local filesystem
-    updated_tags :
-        a dictionary of new/updated ID3 tag names and values
+    s3_client : BaseClient
+    bucket : str
+    track_id : str
 
     Returns
     -------
     None
     """
 
-    current_tags = EasyID3(temp_f)
+    from botocore.exceptions import ClientError
 
-    for tag, val in updated_tags.items():
-        if tag not in editable_tags:
-            raise HTTPException(status_code=400, detail=f"Tag {tag} is not an ID3 tag")
+    obj_key = f"mp3s/{track_id}.mp3"
 
-        elif val is None or val == "":
-            # remove the tag from the mp3 file
-            if tag in current_tags:
-                logger.info(f"Deleting {tag}...")
-                del current_tags[tag]
-            else:
-                logger.info(f"{tag} is already blank")
+    try:
+        logger.info(f"Copying {obj_key} to trash...")
+        s3_client.copy_object(
+            Bucket=bucket,
+            Key=f"trash/{track_id}.mp3",
+            CopySource={"Bucket": bucket, "Key": obj_key},
+        )
+
+        # can delete copy in incoming/ now
+        logger.info(f"Deleting {obj_key}...")
+        s3_client.delete_object(Bucket=bucket, Key=obj_key)
 
+    except ClientError as err:
+        if err.response["ResponseMetadata"]["HTTPStatusCode"] == 404:
+            logger.info("Not found")
         else:
-            # tag is new or updated
-            logger.info(f"Setting {tag} to '{val}'")
-            current_tags[tag] = str(val)
+            logger.info(err)
+            raise HTTPException(
+                status_code=400, detail=err.response["Error"]["Message"]
+            )
 
-    logger.info("Saving tags...")
-    current_tags.save()
 
+def retag_track(
+    s3_client: BaseClient,
+    bucket: str,
+    mp3_cache: Mp3Cache,
+    track_id: str,
+    updated_tags: dict[str, str],
+) -> None:
+    """
+    download an existing mp3 file from S3 (unless an up-to-date copy is already cached),
+    update its ID3 tags, and re-upload it
+
+    Parameters
+    ----------
+    s3_client : BaseClient
+    bucket : str
+    mp3_cache : Mp3Cache
+    track_id : str
+    updated_tags : dict[str, str]
+        a dictionary of new/updated ID3 tag names and values
+
+    Returns
+    -------
+    None
+    """
+
+    obj_key = f"mp3s/{track_id}.mp3"
+    name = f"{track_id}.mp3"
+    temp_f = mp3_cache.path(name)
+
+    # the cached copy might be stale (e.g. retagged by another worker or restored from
+    # trash), so only use it if its ETag still matches
+    cached = mp3_cache.get(name)
+    cached_etag = cached[1] if cached is not None else None
+    download_if_changed(s3_client, bucket, obj_key, temp_f, cached_etag)
+
+    try:
+        update_id3_tags(temp_f, updated_tags)
+
+        logger.info("Reuploading file...")
+        s3_client.upload_file(Filename=temp_f, Bucket=bucket, Key=obj_key)
+        etag = s3_client.head_object(Bucket=bucket, Key=obj_key)["ETag"]
 
-def do_clean_tmp_mp3s_dir(tmp_mp3s_dir: str, tmp_mp3s_max_size: int) -> None:
+    except Exception:
+        # local copy no longer matches what's on S3
+        mp3_cache.remove(name)
+        raise
+
+    mp3_cache.add(name, etag)
+
+
+def download_if_changed(
+    s3_client: BaseClient, bucket: str, key: str, temp_f: str, etag: str | None
+) -> str:
     """
-    clean up temporary mp3s directory
+    download a file from S3 unless the local copy's ETag is still current, using a
+    conditional GET so that an up-to-date copy costs a single bodiless request
 
     Parameters
     ----------
-    tmp_mp3s_dir : str
-        path to temporary mp3s directory
-    tmp_mp3s_max_size : int
-        maximum size of temporary mp3s directory (in bytes)
+    s3_client : BaseClient
+    bucket : str
+    key : str
+    temp_f : str
+        path to the local copy of the file
+    etag : str | None
+        ETag of the local copy, or None to download unconditionally
+
+    Returns
+    -------
+    str
+        the current ETag of the file
+    """
+
+    from botocore.exceptions import ClientError
+
+    try:
+        obj = s3_client.get_object(
+            Bucket=bucket, Key=key, **({} if etag is None else {"IfNoneMatch": etag})
+        )
+
+    except ClientError as err:
+        if err.response["ResponseMetadata"]["HTTPStatusCode"] == 304:
+            logger.info(f"Local copy of {key} is up to date")
+            return etag
+
+        raise
+
+    if etag is not None:
+        logger.info(f"Local copy of {key} is stale")
+
+    logger.info(f"Downloading {key} to {temp_f}...")
+    part_f = f"{temp_f}.part"
+
+    try:
+        with open(part_f, "wb") as f:
+            for chunk in obj["Body"].iter_chunks(1024 * 1024):
+                f.write(chunk)
+
+    except Exception:
+        remove_file(part_f)
+        raise
+
+    os.replace(part_f, temp_f)
+    return obj["ETag"]
+
+
+def retag_track_in_place(
+    s3_client: BaseClient,
+    bucket: str,
+    mp3_cache: Mp3Cache,
+    track_id: str,
+    updated_tags: dict[str, str],
+) -> None:
+    """
+    update the ID3 tags of an mp3 file on S3 by rewriting only the ID3v2 tag at the
+    start of the file: the new object is assembled with a multipart upload of the new
+    tag (plus enough audio to satisfy S3's minimum part size) followed by a server-side
+    copy of the rest of the audio
+
+    Falls back to `retag_track` for files that are too small for a multipart upload,
+    have no ID3v2 tag, have an ID3v1 tag at the end (which mutagen would also update),
+    or whose new tag is itself at least as big as S3's minimum part size.
+
+    Parameters
+    ----------
+    s3_client : BaseClient
+    bucket : str
+    mp3_cache : Mp3Cache
+    track_id : str
+    updated_tags : dict[str, str]
+        a dictionary of new/updated ID3 tag names and values
 
     Returns
     -------
     None
     """
 
-    file_data = []
+    from mutagen.easyid3 import EasyID3
 
-    for file_name in os.listdir(tmp_mp3s_dir):
-        file_path = os.path.join(tmp_mp3s_dir, file_name)
+    obj_key = f"mp3s/{track_id}.mp3"
 
-        if os.path.isfile(file_path):
-            file_size = os.path.getsize(file_path)
-            update_time = datetime.datetime.fromtimestamp(os.path.getmtime(file_path))
+    head, file_size, obj = get_object_range(s3_client, bucket, obj_key, 0, 10)
+    old_tag_size = id3v2_size(head)
+    audio_size = file_size - old_tag_size
 
-            file_data.append(
-                {
-                    "filename": file_name,
-                    "size": file_size,
-                    "updated": update_time,
-                }
-            )
+    if old_tag_size == 0 or audio_size <= min_part_size:
+        retag_track(s3_client, bucket, mp3_cache, track_id, updated_tags)
+        return
+
+    tail = get_object_range(s3_client, bucket, obj_key, file_size - 128, file_size)[0]
+
+    if tail[:3] == b"TAG":
+        retag_track(s3_client, bucket, mp3_cache, track_id, updated_tags)
+        return
+
+    # build the new tag from the old one, reusing its padding if the new tag fits
+    logger.info(f"Fetching ID3 tag of {obj_key}...")
+    tag_f = io.BytesIO(get_object_range(s3_client, bucket, obj_key, 0, old_tag_size)[0])
+    current_tags = EasyID3(tag_f)
+    set_id3_tags(current_tags, updated_tags)
+
+    def padding(info: PaddingInfo) -> int:
+        # like mutagen's default, but based on the size of the whole file
+        if 0 <= info.padding <= 10 * 1024 + audio_size // 100:
+            return info.padding
+
+        return 1024 + audio_size // 1000
 
-    if len(file_data) == 0:
+    tag_f.seek(0)
+    current_tags.save(tag_f, padding=padding)
+    new_tag = tag_f.getvalue()
+
+    if len(new_tag) >= min_part_size:
+        # no audio would go in the first part (e.g. after adding large cover art)
+        retag_track(s3_client, bucket, mp3_cache, track_id, updated_tags)
         return
 
-    mp3s = pd.DataFrame(file_data)
+    # the first part must be at least 5 MiB, so it includes the start of the audio
+    first_part_end = old_tag_size + min_part_size - len(new_tag)
+    first_audio = get_object_range(
+        s3_client, bucket, obj_key, old_tag_size, first_part_end
+    )[0]
+
+    logger.info(f"Rewriting {obj_key} with a {len(new_tag)}-byte ID3 tag...")
+    mpu = s3_client.create_multipart_upload(
+        Bucket=bucket, Key=obj_key, ContentType=obj["ContentType"]
+    )
+
+    try:
+        part1 = s3_client.upload_part(
+            Bucket=bucket,
+            Key=obj_key,
+            UploadId=mpu["UploadId"],
+            PartNumber=1,
+            Body=new_tag + first_audio,
+        )
+
+        part2 = s3_client.upload_part_copy(
+            Bucket=bucket,
+            Key=obj_key,
+            UploadId=mpu["UploadId"],
+            PartNumber=2,
+            CopySource={"Bucket": bucket, "Key": obj_key},
+            CopySourceRange=f"bytes={first_part_end}-{file_size - 1}",
+            CopySourceIfMatch=obj["ETag"],  # fail if file changed in the meantime
+        )
+
+        s3_client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=obj_key,
+            UploadId=mpu["UploadId"],
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": 1, "ETag": part1["ETag"]},
+                    {"PartNumber": 2, "ETag": part2["CopyPartResult"]["ETag"]},
+                ]
+            },
+        )
+
+    except Exception:
+        s3_client.abort_multipart_upload(
+            Bucket=bucket, Key=obj_key, UploadId=mpu["UploadId"]
+        )
+        raise
+
+    # a local copy would now be out of date
+    mp3_cache.remove(f"{track_id}.mp3")
+
+
+async def retag_many(
+    config: ApiConfig,
+    track_tags: dict[str, dict[str, str]],
+    job_id: str | None = None,
+    in_place: bool = False,
+) -> dict[str, str | None]:
+    """
+    retag many tracks concurrently (bounded by `config.retag_semaphore`), so that one
+    track's S3 download/upload overlaps with others', without letting a failed track
+    abort the rest
+
+    Parameters
+    ----------
+    config : ApiConfig
+    track_tags : dict[str, dict[str, str]]
+        new/updated ID3 tag names and values for each track ID
+    job_id : str | None
+        if provided, record each track's progress in `config.retag_jobs`
+    in_place : bool
+        if true, only rewrite the ID3 tag of each file on S3 (see
+        `retag_track_in_place`) instead of re-uploading it
+
+    Returns
+    -------
+    dict[str, str | None]
+        an error message (or None if successful) for each track ID
+    """
+
+    async def set_status(track_id: str, status: str, error: str | None = None) -> None:
+        if job_id is not None:
+            await config.run_io(
+                config.retag_jobs.update, job_id, track_id, status, error
+            )
+
+    async def retag_one(track_id: str, updated_tags: dict[str, str]) -> str | None:
+        async with config.retag_semaphore:
+            try:
+                await set_status(track_id, "running")
+
+                await config.run_io(
+                    retag_track_in_place if in_place else retag_track,
+                    config.s3_client,
+                    config.bucket,
+                    config.mp3_cache,
+                    track_id,
+                    updated_tags,
+                )
+            except Exception as err:
+                error = err.detail if isinstance(err, HTTPException) else str(err)
+                logger.error(f"Failed to retag {track_id}: {error}")
+                await set_status(track_id, "failed", error)
+                return error
+
+            await set_status(track_id, "done")
+            return None
+
+    async def heartbeat() -> None:
+        while True:
+            await asyncio.sleep(config.retag_jobs.heartbeat_interval)
+
+            # not in the I/O pool, where it could wait behind the retags for long
+            # enough to make this job look dead
+            try:
+                await asyncio.to_thread(config.retag_jobs.heartbeat, job_id)
+            except Exception:
+                logger.exception(f"Failed to record heartbeat of retag job {job_id}")
+
+    # let pollers tell this job apart from one whose worker was killed
+    heartbeat_task = None if job_id is None else asyncio.create_task(heartbeat())
+
+    try:
+        errors = await asyncio.gather(*[retag_one(k, v) for k, v in track_tags.items()])
+    finally:
+        if heartbeat_task is not None:
+            heartbeat_task.cancel()
+
+    return dict(zip(track_tags.keys(), errors))
 
-    # delete oldest files beyond directory size limit
-    mp3s = mp3s.sort_values("updated", ascending=False)
-    mp3s["cum_size"] = mp3s["size"].cumsum()
-    logger.info(f"{tmp_mp3s_dir} size is {mp3s['cum_size'].values[-1]} bytes")
 
-    to_delete = mp3s.loc[mp3s["cum_size"].gt(tmp_mp3s_max_size)]
+def update_id3_tags(temp_f: str, updated_tags: dict[str, str]) -> None:
+    """
+    update ID3 tags for mp3 file on local filesystem
+
+    Parameters
+    ----------
+    temp_f : str
+        path to mp3 file on local filesystem
+    updated_tags :
+        a dictionary of new/updated ID3 tag names and values
+
+    Returns
+    -------
+    None
+    """
 
-    if len(to_delete) > 0:
-        logger.info(f"Deleting {len(to_delete)} files from {tmp_mp3s_dir}")
+    from mutagen.easyid3 import EasyID3
 
-        for filename in to_delete["filename"]:
-            os.remove(os.path.join(tmp_mp3s_dir, filename))
+    current_tags = EasyID3(temp_f)
+    set_id3_tags(current_tags, updated_tags)
+
+    logger.info("Saving tags...")
+    current_tags.save()
+
+
+def set_id3_tags(current_tags: EasyID3, updated_tags: dict[str, str]) -> None:
+    """
+    set, update, or delete (if blank) ID3 tags without saving them
+
+    Parameters
+    ----------
+    current_tags : EasyID3
+        the tags loaded from an mp3 file
+    updated_tags :
+        a dictionary of new/updated ID3 tag names and values
+
+    Returns
+    -------
+    None
+    """
+
+    for tag, val in updated_tags.items():
+        if tag not in current_tags.valid_keys:
+            raise HTTPException(status_code=400, detail=f"Tag {tag} is not an ID3 tag")
+
+        elif val is None or val == "":
+            # remove the tag from the mp3 file
+            if tag in current_tags:
+                logger.info(f"Deleting {tag}...")
+                del current_tags[tag]
+            else:
+                logger.info(f"{tag} is already blank")
+
+        else:
+            # tag is new or updated
+            logger.info(f"Setting {tag} to '{val}'")
+            current_tags[tag] = str(val)
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING, Any
+
+from fastapi import HTTPException
+from fastapi.logger import logger
+
+if TYPE_CHECKING:
+    from botocore.client import BaseClient
+
+# how long presigned upload URLs are valid for (in seconds)
+presign_expires_in = 60000
+
+# S3 requires parts other than the last to be at least 5 MiB, and allows up to 10,000
+# parts per upload
+min_part_size = 5 * 1024 * 1024
+max_n_parts = 10000
+
+
+def presign_posts(
+    s3_client: BaseClient, bucket: str, filenames: list[str]
+) -> dict[str, dict[str, Any]]:
+    """
+    presign upload URLs for mp3 files to the incoming/ folder on S3 (signing happens
+    locally, so this doesn't make any requests)
+
+    Parameters
+    ----------
+    s3_client : BaseClient
+    bucket : str
+    filenames : list[str]
+
+    Returns
+    -------
+    dict[str, dict[str, Any]]
+        a payload for a presigned file upload to S3 for each filename
+    """
+
+    return {
+        x: s3_client.generate_presigned_post(
+            bucket, f"incoming/{x}", ExpiresIn=presign_expires_in
+        )
+        for x in dict.fromkeys(filenames)
+    }
+
+
+def part_size_for(size: int, part_size: int) -> int:
+    """
+    get the part size to use to upload a file in parts, increasing the requested one if
+    the file would otherwise have too many parts
+
+    Parameters
+    ----------
+    size : int
+        size of the file (in bytes)
+    part_size : int
+        requested part size (in bytes)
+
+    Returns
+    -------
+    int
+    """
+
+    return max(part_size, min_part_size, math.ceil(size / max_n_parts))
+
+
+def start_multipart_upload(
+    s3_client: BaseClient, bucket: str, filename: str, size: int, part_size: int
+) -> dict[str, Any]:
+    """
+    start a multipart upload of an mp3 file to the incoming/ folder on S3 and presign
+    an upload URL for each part, so that the parts can be uploaded in parallel (with
+    `PUT` requests) and failed ones retried individually
+
+    Parameters
+    ----------
+    s3_client : BaseClient
+    bucket : str
+    filename : str
+    size : int
+        size of the file (in bytes)
+    part_size : int
+        requested part size (in bytes)
+
+    Returns
+    -------
+    dict[str, Any]
+        the upload ID, the part size, and the part number and presigned URL of each part
+    """
+
+    key = f"incoming/{filename}"
+    part_size = part_size_for(size, part_size)
+
+    res = s3_client.create_multipart_upload(
+        Bucket=bucket, Key=key, ContentType="audio/mpeg"
+    )
+
+    upload_id = res["UploadId"]
+    n_parts = max(math.ceil(size / part_size), 1)
+    logger.info(f"Started multipart upload of {key} in {n_parts} parts")
+
+    return {
+        "upload_id": upload_id,
+        "part_size": part_size,
+        "uploaded": [],
+        "parts": presign_parts(
+            s3_client, bucket, key, upload_id, range(1, n_parts + 1)
+        ),
+    }
+
+
+def resume_multipart_upload(
+    s3_client: BaseClient,
+    bucket: str,
+    filename: str,
+    upload_id: str,
+    size: int,
+    part_size: int,
+) -> dict[str, Any]:
+    """
+    get the parts of a multipart upload that have already been uploaded and presign
+    new upload URLs for the rest (e.g. after the page was reloaded or the URLs expired)
+
+    Parameters
+    ----------
+    s3_client : BaseClient
+    bucket : str
+    filename : str
+    upload_id : str
+    size : int
+        size of the file (in bytes)
+    part_size : int
+        the part size returned when the upload was started (in bytes)
+
+    Returns
+    -------
+    dict[str, Any]
+        the upload ID, the part size, the part numbers already uploaded, and the part
+        number and presigned URL of each remaining part
+    """
+
+    key = f"incoming/{filename}"
+    n_parts = max(math.ceil(size / part_size), 1)
+
+    uploaded = {
+        x["PartNumber"]
+        for x in list_parts(s3_client, bucket, key, upload_id)
+        # a part that was cut off isn't the size it's supposed to be
+        if x["Size"] == min(part_size, size - (x["PartNumber"] - 1) * part_size)
+    }
+
+    remaining = [x for x in range(1, n_parts + 1) if x not in uploaded]
+
+    return {
+        "upload_id": upload_id,
+        "part_size": part_size,
+        "uploaded": sorted(uploaded),
+        "parts": presign_parts(s3_client, bucket, key, upload_id, remaining),
+    }
+
+
+def complete_multipart_upload(
+    s3_client: BaseClient, bucket: str, filename: str, upload_id: str, size: int
+) -> None:
+    """
+    finish a multipart upload once all of its parts have been uploaded (the parts are
+    listed here rather than sent by the browser, which can't necessarily read their
+    ETags)
+
+    Parameters
+    ----------
+    s3_client : BaseClient
+    bucket : str
+    filename : str
+    upload_id : str
+    size : int
+        size of the file (in bytes)
+
+    Returns
+    -------
+    None
+    """
+
+    key = f"incoming/{filename}"
+    parts = list_parts(s3_client, bucket, key, upload_id)
+
+    if sum(x["Size"] for x in parts) != size:
+        raise HTTPException(
+            status_code=400, detail=f"Not all parts of {filename} have been uploaded"
+        )
+
+    s3_client.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={
+            "Parts": [{"PartNumber": x["PartNumber"], "ETag": x["ETag"]} for x in parts]
+        },
+    )
+
+    logger.info(f"Completed multipart upload of {key}")
+
+
+def abort_multipart_upload(
+    s3_client: BaseClient, bucket: str, filename: str, upload_id: str
+) -> None:
+    """
+    abort a multipart upload and delete any parts uploaded so far
+
+    Parameters
+    ----------
+    s3_client : BaseClient
+    bucket : str
+    filename : str
+    upload_id : str
+
+    Returns
+    -------
+    None
+    """
+
+    s3_client.abort_multipart_upload(
+        Bucket=bucket, Key=f"incoming/{filename}", UploadId=upload_id
+    )
+
+
+def presign_parts(
+    s3_client: BaseClient,
+    bucket: str,
+    key: str,
+    upload_id: str,
+    part_numbers: range | list[int],
+) -> list[dict[str, int | str]]:
+    """
+    presign upload URLs for parts of a multipart upload
+
+    Parameters
+    ----------
+    s3_client : BaseClient
+    bucket : str
+    key : str
+    upload_id : str
+    part_numbers : range | list[int]
+
+    Returns
+    -------
+    list[dict[str, int | str]]
+        the part number and presigned URL of each part
+    """
+
+    return [
+        {
+            "part_number": x,
+            "url": s3_client.generate_presigned_url(
+                "upload_part",
+                Params={
+                    "Bucket": bucket,
+                    "Key": key,
+                    "UploadId": upload_id,
+                    "PartNumber": x,
+                },
+                ExpiresIn=presign_expires_in,
+            ),
+        }
+        for x in part_numbers
+    ]
+
+
+def list_parts(
+    s3_client: BaseClient, bucket: str, key: str, upload_id: str
+) -> list[dict[str, Any]]:
+    """
+    list all the uploaded parts of a multipart upload
+
+    Parameters
+    ----------
+    s3_client : BaseClient
+    bucket : str
+    key : str
+    upload_id : str
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        the part number, ETag, and size of each uploaded part
+    """
+
+    from botocore.exceptions import ClientError
+
+    try:
+        pages = s3_client.get_paginator("list_parts").paginate(
+            Bucket=bucket, Key=key, UploadId=upload_id
+        )
+
+        return [x for page in pages for x in page.get("Parts", [])]
+
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchUpload":
+            raise HTTPException(status_code=404, detail=f"No such upload: {upload_id}")
+
+        raise
@@ -0,0 +1,8 @@
+BEGIN;
+
+-- what an artist's MusicBrainz release groups looked like at the last check, so that
+-- unchanged artists only cost one request
+ALTER TABLE mb_artists ADD COLUMN release_group_count integer;
+ALTER TABLE mb_artists ADD COLUMN releases_digest text;
+
+END;
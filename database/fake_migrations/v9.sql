@@ -0,0 +1,22 @@
+BEGIN;
+
+-- a play is identified by its track and the time it was played (sent by the client), so
+-- that a play that's delivered more than once (e.g. a retried request or a batch that's
+-- inserted again after a crash) is only recorded once
+--
+-- plays converted from play counts in v3 share their track's last_played time, so all
+-- but one of each group are moved back a millisecond at a time to keep the counts
+WITH duplicates AS (
+    SELECT id, row_number() OVER (PARTITION BY track_id, dt ORDER BY id) - 1 AS n
+    FROM plays
+)
+UPDATE plays SET dt = plays.dt - duplicates.n
+FROM duplicates
+WHERE plays.id = duplicates.id AND duplicates.n > 0;
+
+ALTER TABLE plays ADD CONSTRAINT plays_track_id_dt_key UNIQUE (track_id, dt);
+
+-- covered by the unique constraint's index
+DROP INDEX plays_track_id_index;
+
+END;
@@ -18,7 +18,23 @@ import { writable, type Writable } from './tansuStore';
 
 type Presign = { fields: any; url: string };
 
+type MultipartUpload = {
+  upload_id: string;
+  part_size: number;
+  uploaded: number[];
+  parts: { part_number: number; url: string }[];
+};
+
 const maxConcurrentImports = 3;
+
+// files at least this big are uploaded in parts, several at a time
+const multipartThreshold = 32 * 1024 * 1024;
+const maxConcurrentParts = 4;
+
+// presigned uploads fetched in advance for all the files being imported, and
+// multipart uploads in progress (so that retrying a file resumes its upload)
+const presigns = new Map<string, Presign>();
+const multipartUploads = new Map<string, MultipartUpload>();
 const startingStateCounts: Record<ImportState, number> = {
   todo: 0,
   uploading: 0,
@@ -69,6 +85,12 @@ export function importTracks(
     }
   );
 
+  void preSignUploads(
+    [...impMap.values()]
+      .map((impMp3: ImportingMp3): File => impMp3.file)
+      .filter((file: File): boolean => file.size < multipartThreshold)
+  );
+
   importingFn ||= window.setInterval(processImportQueue, 500, artistGenres);
 }
 
@@ -145,8 +167,16 @@ async function importSingleTrack(
   file: File,
   artistGenres: Map<string, ImportArtistGenre>
 ): Promise<Track> {
-  const presign = await preSignUpload(file);
-  await uploadToS3(presign, file);
+  if (file.size >= multipartThreshold) {
+    await uploadToS3InParts(file);
+  } else {
+    const presign: Presign =
+      presigns.get(file.name) ?? (await preSignUpload(file));
+
+    presigns.delete(file.name);
+    await uploadToS3(presign, file);
+  }
+
   const tags = await fingerprintAndGetId3Tags(file);
 
   const track: Track = applyId3Tags(
@@ -183,6 +213,110 @@ async function preSignUpload(file: File): Promise<Presign> {
   return await res.json();
 }
 
+async function preSignUploads(files: File[]): Promise<void> {
+  // get presigned URLs for many uploads in one request
+  if (files.length === 0) return;
+
+  const url: string = [
+    appSettings.get().apiUrl,
+    'tracks',
+    'presign',
+    'batch',
+  ].join('/');
+
+  try {
+    const res: Response = await fetch(url, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-Api-Key': appSettings.get().apiKey!,
+      },
+      body: JSON.stringify({ filenames: files.map((f: File) => f.name) }),
+    });
+
+    if (!res.ok) throw Error(res.statusText);
+
+    const batch: Record<string, Presign> = await res.json();
+
+    for (const [filename, presign] of Object.entries(batch)) {
+      presigns.set(filename, presign);
+    }
+  } catch (e: unknown) {
+    // files will be presigned one at a time instead
+    console.log(e);
+  }
+}
+
+async function multipartRequest<T>(
+  action: string | null,
+  payload: Record<string, string | number>
+): Promise<T> {
+  const url: string = [appSettings.get().apiUrl, 'tracks', 'multipart', action]
+    .filter((x: string | null): boolean => x != null)
+    .join('/');
+
+  const res: Response = await fetch(url, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'X-Api-Key': appSettings.get().apiKey!,
+    },
+    body: JSON.stringify(payload),
+  });
+
+  if (!res.ok) throw Error(res.statusText);
+  return (await res.json()) as T;
+}
+
+async function uploadToS3InParts(file: File): Promise<void> {
+  // upload a large file in parts, resuming a previous attempt if there was one
+  let upload: MultipartUpload | undefined = multipartUploads.get(file.name);
+
+  if (upload == null) {
+    upload = await multipartRequest<MultipartUpload>(null, {
+      filename: file.name,
+      size: file.size,
+    });
+
+    multipartUploads.set(file.name, upload);
+  } else {
+    upload = await multipartRequest<MultipartUpload>('resume', {
+      filename: file.name,
+      upload_id: upload.upload_id,
+      size: file.size,
+      part_size: upload.part_size,
+    });
+  }
+
+  const partSize: number = upload.part_size;
+  const remaining = [...upload.parts];
+
+  async function uploadParts(): Promise<void> {
+    while (remaining.length > 0) {
+      const part = remaining.shift()!;
+      const start: number = (part.part_number - 1) * partSize;
+
+      const res: Response = await fetch(part.url, {
+        method: 'PUT',
+        body: file.slice(start, start + partSize),
+      });
+
+      if (!res.ok) throw Error(res.statusText);
+    }
+  }
+
+  await Promise.all(Array.from({ length: maxConcurrentParts }, uploadParts));
+
+  await multipartRequest<null>('complete', {
+    filename: file.name,
+    upload_id: upload.upload_id,
+    size: file.size,
+    part_size: partSize,
+  });
+
+  multipartUploads.delete(file.name);
+}
+
 async function uploadToS3(presign: Presign, file: File): Promise<void> {
   // upload file directly to S3
   const formData: FormData = new FormData();
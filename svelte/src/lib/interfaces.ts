@@ -130,6 +130,12 @@ export interface ScrobblePayload {
   track_number?: number;
 }
 
+export interface PlayPayload {
+  track_id: string;
+  dt: number;
+  scrobble?: ScrobblePayload;
+}
+
 export interface TrackMod {
   changed: boolean;
   old: string;
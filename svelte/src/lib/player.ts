@@ -7,7 +7,6 @@ import {
   canPlayPrev,
   currentPlaylist,
   currentTime,
-  DB,
   duration,
   getCachedMp3,
   getPlaylist,
@@ -24,6 +23,7 @@ import {
   playingPlaylist,
   playingPlaylistId,
   playingTrack,
+  type PlayPayload,
   type Playlist,
   playlists,
   playQueue,
@@ -537,9 +537,7 @@ async function markTrackAsPlayed(track: Track): Promise<void> {
   track.lastPlayed = DateTime.utc();
 
   try {
-    const play: Play = new Play({ trackId: track.id! });
-    play.dt = track.lastPlayed.toMillis();
-    await insertPlay(play);
+    await recordPlay(track);
   } catch (e: unknown) {
     if (e instanceof Error) {
       logMessage(`Error marking track as played: ${e.message}`, 'error');
@@ -549,7 +547,6 @@ async function markTrackAsPlayed(track: Track): Promise<void> {
   }
 
   playingTrack.set(track);
-  void scrobbleTrack(track);
 
   const tracks: Track[] = trackResults.get()!.results;
 
@@ -562,29 +559,15 @@ async function markTrackAsPlayed(track: Track): Promise<void> {
   updateTrackInPlayQueue(track);
 }
 
-async function scrobbleTrack(track: Track): Promise<void> {
-  if (
-    !appSettings.get().doScrobble ||
-    track.artist == null ||
-    track.title == null ||
-    track.duration == null ||
-    !DB.online
-  ) {
-    return;
-  }
-
-  const payload: ScrobblePayload = {
-    album_artist: track.albumArtist ?? undefined,
-    artist: track.artist,
-    album: track.album ?? undefined,
-    track_number: track.trackI ?? undefined,
-    title: track.title,
-    duration: track.duration,
+async function recordPlay(track: Track): Promise<void> {
+  // the API records the play and submits the scrobble (if any) in the background
+  const payload: PlayPayload = {
+    track_id: track.id!,
+    dt: track.lastPlayed!.toMillis(),
+    scrobble: scrobblePayload(track),
   };
 
-  const url: string = [appSettings.get().apiUrl, 'tracks', 'scrobble'].join(
-    '/'
-  );
+  const url: string = [appSettings.get().apiUrl, 'tracks', 'play'].join('/');
 
   try {
     const res: Response = await fetch(url, {
@@ -599,13 +582,34 @@ async function scrobbleTrack(track: Track): Promise<void> {
     if (!res.ok) {
       throw Error(res.statusText);
     }
-  } catch (e: unknown) {
-    if (e instanceof Error) {
-      logMessage(`Error scrobbling "${track.title}"`, 'error');
-    } else {
-      console.log(e);
-    }
+  } catch {
+    // fall back to inserting the play directly, which is retried while offline
+    // (if the API did buffer the play, the DB only keeps one play per track and
+    // time)
+    const play: Play = new Play({ trackId: track.id! });
+    play.dt = payload.dt;
+    await insertPlay(play);
+  }
+}
+
+function scrobblePayload(track: Track): ScrobblePayload | undefined {
+  if (
+    !appSettings.get().doScrobble ||
+    track.artist == null ||
+    track.title == null ||
+    track.duration == null
+  ) {
+    return undefined;
   }
+
+  return {
+    album_artist: track.albumArtist ?? undefined,
+    artist: track.artist,
+    album: track.album ?? undefined,
+    track_number: track.trackI ?? undefined,
+    title: track.title,
+    duration: track.duration,
+  };
 }
 
 export async function rateSingleTrack(
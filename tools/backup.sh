@@ -10,11 +10,8 @@ aws s3 rm s3://${BUCKET_NAME}/trash/ --recursive --profile ${AWS_PROFILE_NAME}
 echo "Emptying incoming folder..."
 aws s3 rm s3://${BUCKET_NAME}/incoming/ --recursive --profile ${AWS_PROFILE_NAME}
 
-echo "Syncing mp3s down..."
-aws s3 sync s3://${BUCKET_NAME}/mp3s ${BACKUP_PATH}/mp3s --delete --profile ${AWS_PROFILE_NAME}
-
-echo "Running do_backup.py..."
-poetry run python do_backup.py
+echo "Syncing mp3s down and running do_backup.py..."
+poetry run python do_backup.py --mirror
 
 echo "Dumping prod database..."
 PGPASSWORD=${DATABASE_PASSWORD} pg_dump ${DATABASE_NAME} \
@@ -0,0 +1,193 @@
+"""
+load a synthetic tracks table with the previous `pd.read_sql` method and with
+`get_tracks`/`iter_tracks`, checking that they return the same tracks and comparing
+time, time to the first batch, and peak memory
+
+    poetry run python benchmarks/get_tracks.py postgresql://localhost/scratch --n 200000
+
+The table is created in a temporary schema of the given (scratch) database, which is
+dropped afterwards.
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils import get_tracks, iter_tracks  # noqa: E402
+
+schema = "benchmark_get_tracks"
+
+
+def random_text(min_len: int = 3, max_len: int = 30) -> str:
+    return "".join(
+        random.choices(string.ascii_letters + " ", k=random.randint(min_len, max_len))
+    )
+
+
+def make_rows(n: int) -> list[tuple]:
+    genres = [random_text() for _ in range(200)]
+    album_artists = [random_text() for _ in range(max(n // 25, 1))]
+    rows = []
+
+    while len(rows) < n:
+        album_artist = random.choice(album_artists)
+        album = random_text()
+        year = random.randint(1950, 2024)
+        genre = random.choice(genres)
+        n_tracks = random.randint(1, 20)
+
+        for i in range(1, n_tracks + 1):
+            rows.append(
+                (
+                    f"{len(rows):040x}",
+                    album_artist,
+                    random_text(),
+                    album,
+                    1,
+                    i,
+                    random_text(),
+                    year,
+                    genre,
+                    random.random() < 0.1,
+                    random.randint(0, 2**40),
+                )
+            )
+
+    return rows[:n]
+
+
+def legacy_get_tracks(db_url: str) -> pd.DataFrame:
+    # the previous method, which holds the result as objects and converted copies
+    # at the same time
+    with psycopg2.connect(db_url) as conn:
+        tracks = pd.read_sql(
+            """
+            select
+                id,
+                album_artist,
+                artist,
+                album,
+                disc_i,
+                track_i,
+                title,
+                year,
+                genre,
+                compilation,
+                updated_at
+            from tracks
+            order by album_artist, album, disc_i, track_i
+        """,
+            conn,
+        )
+
+    return tracks.convert_dtypes()
+
+
+def measure(fn: Callable[[], Any]) -> tuple[Any, float, float]:
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    res = fn()
+    elapsed = time.perf_counter() - started_at
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return res, elapsed, peak / 1024**2
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("db_url", help="URL of a scratch database")
+    parser.add_argument("--n", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rows = make_rows(args.n)
+
+    with psycopg2.connect(args.db_url) as conn, conn.cursor() as cur:
+        cur.execute(f"drop schema if exists {schema} cascade")
+        cur.execute(f"create schema {schema}")
+
+        cur.execute(f"""
+            create table {schema}.tracks (
+                id text primary key,
+                album_artist text,
+                artist text,
+                album text,
+                disc_i integer,
+                track_i integer,
+                title text,
+                year integer,
+                genre text,
+                compilation boolean not null,
+                updated_at bigint
+            )
+            """)
+
+        execute_values(cur, f"insert into {schema}.tracks values %s", rows)
+
+    del rows
+
+    # make the loaders' connections find the synthetic table as `tracks`
+    os.environ["PGOPTIONS"] = f"-c search_path={schema}"
+
+    try:
+        legacy, t_legacy, mem_legacy = measure(lambda: legacy_get_tracks(args.db_url))
+        print(f"legacy: {t_legacy:.2f} s, peak {mem_legacy:.0f} MiB")
+
+        tracks, t_new, mem_new = measure(
+            lambda: get_tracks(args.db_url, batch_size=args.batch_size)
+        )
+
+        print(f"get_tracks: {t_new:.2f} s, peak {mem_new:.0f} MiB")
+
+        pd.testing.assert_frame_equal(tracks, legacy)
+        print(f"{len(tracks)} tracks match")
+
+        tracks_cat, t_cat, mem_cat = measure(
+            lambda: get_tracks(
+                args.db_url, batch_size=args.batch_size, categorical=True
+            )
+        )
+
+        print(f"get_tracks(categorical=True): {t_cat:.2f} s, peak {mem_cat:.0f} MiB")
+
+        for name, x in [
+            ("legacy", legacy),
+            ("get_tracks", tracks),
+            ("get_tracks(categorical=True)", tracks_cat),
+        ]:
+            print(
+                f"{name} data frame: {x.memory_usage(deep=True).sum() / 1024**2:.0f} MiB"
+            )
+
+        del legacy, tracks, tracks_cat
+
+        started_at = time.perf_counter()
+        batches = iter_tracks(args.db_url, batch_size=args.batch_size)
+        next(batches)
+        print(
+            f"iter_tracks: first batch after {time.perf_counter() - started_at:.2f} s"
+        )
+        batches.close()
+
+    finally:
+        del os.environ["PGOPTIONS"]
+
+        with psycopg2.connect(args.db_url) as conn, conn.cursor() as cur:
+            cur.execute(f"drop schema {schema} cascade")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+time `make_sym_paths` against the previous row-wise method over a synthetic library
+(their paths must match, which `tests/test_sym_paths.py` checks)
+
+    poetry run python benchmarks/sym_paths.py --n 80000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from unicodedata import normalize
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils import make_sym_paths  # noqa: E402
+
+# awkward characters for paths: reserved ones, leading dots and spaces, and ones
+# that NFKD normalization changes
+chars = list("abcdefghij ABC 0123") + list('\\/:*?"<>|.') + list("éüñ½ﬁ①")
+
+
+def random_text(min_len: int = 1, max_len: int = 20) -> str:
+    return "".join(random.choices(chars, k=random.randint(min_len, max_len)))
+
+
+def legacy_safe_path_text(x: str) -> str:
+    x = re.sub(r"[\\/:*?\"<>|]", "_", x)
+    x = x.strip()
+    x = re.sub(r"^\.+", "_", x)
+    x = normalize("NFKD", x)
+    return x
+
+
+def legacy_make_sym_path(r: pd.Series, music_folder: str) -> str:
+    # the previous row-wise method (after joining each album's highest track number
+    # as `track_i_max`)
+    genre = r["genre"]
+
+    genre = re.sub(r"^C:", "Celtic -", genre)
+    genre = re.sub(r"^F:", "French -", genre)
+
+    path_parts = [genre, r["album_artist"]]
+
+    if r["album"] is not pd.NA:
+        album_parts = []
+
+        if r["year"] is not pd.NA:
+            album_parts.append(str(r["year"]))
+
+        album_parts.append(r["album"])
+        path_parts.append(" - ".join(album_parts))
+
+    if r["disc_i"] is not pd.NA:
+        path_parts.append(f"Disc {r['disc_i']}")
+
+    filename_parts = []
+
+    if r["track_i_max"] is not pd.NA and r["track_i"] is not None:
+        if r["track_i_max"] >= 100:
+            filename_parts.append(f"{r['track_i']:03d}")
+        elif r["track_i_max"] >= 10:
+            filename_parts.append(f"{r['track_i']:02d}")
+        else:
+            filename_parts.append(str(r["track_i"]))
+
+    if r["compilation"]:
+        filename_parts.append(r["artist"])
+
+    filename_parts.append(r["title"])
+
+    filename = " - ".join(filename_parts)
+    filename += ".mp3"
+
+    path_parts.append(filename)
+
+    path_parts = [legacy_safe_path_text(x) for x in path_parts]
+    return "/".join([music_folder, *path_parts])
+
+
+def make_library(n: int) -> pd.DataFrame:
+    genres = [random_text() for _ in range(50)]
+    genres += ["C:" + random_text() for _ in range(5)]
+    genres += ["F:" + random_text() for _ in range(5)]
+
+    album_artists = [random_text() for _ in range(max(n // 100, 1))]
+    rows = []
+
+    while len(rows) < n:
+        album_artist = random.choice(album_artists)
+        album = None if random.random() < 0.05 else random_text()
+        year = None if random.random() < 0.2 else random.randint(1950, 2024)
+        genre = random.choice(genres)
+        compilation = random.random() < 0.1
+        n_discs = random.choice([None, 1, 1, 2])
+
+        # some albums have more than 9 or 99 tracks, some are missing numbers
+        n_tracks = random.choice([1, 5, 9, 10, 12, 99, 100, 120])
+        numbered = random.choice(["all", "all", "all", "some", "none"])
+
+        for i in range(1, n_tracks + 1):
+            if numbered == "none" or (numbered == "some" and random.random() < 0.2):
+                track_i = None
+            else:
+                track_i = i
+
+            rows.append(
+                {
+                    "id": f"{len(rows):040x}",
+                    "album_artist": album_artist,
+                    "artist": random_text(),
+                    "album": album,
+                    "disc_i": None if n_discs is None else random.randint(1, n_discs),
+                    "track_i": track_i,
+                    "title": random_text(),
+                    "year": year,
+                    "genre": genre,
+                    "compilation": compilation,
+                }
+            )
+
+    return pd.DataFrame(rows[:n]).convert_dtypes()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--n", type=int, default=80000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    tracks = make_library(args.n)
+    music_folder = "/backup/music"
+
+    started_at = time.perf_counter()
+
+    tracks.join(
+        tracks.groupby(["album_artist", "album"])["track_i"].max(),
+        on=["album_artist", "album"],
+        rsuffix="_max",
+    ).apply(legacy_make_sym_path, axis=1, music_folder=music_folder)
+
+    t_legacy = time.perf_counter() - started_at
+    started_at = time.perf_counter()
+    make_sym_paths(tracks, music_folder)
+    t_new = time.perf_counter() - started_at
+
+    print(f"legacy: {t_legacy:.2f} s")
+    print(f"new: {t_new:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
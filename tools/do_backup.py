@@ -1,11 +1,30 @@
+import argparse
 import os
+import sys
 from glob import glob
 
+import boto3
 import pandas as pd
+from botocore.config import Config
 from dotenv import load_dotenv
 from unidecode import unidecode
 
-from utils import get_tracks, make_sym_path
+from utils import (
+    add_sym_paths,
+    apply_plan,
+    download_objects,
+    get_changed_tracks,
+    get_tracks,
+    list_objects,
+    load_manifest,
+    max_workers,
+    plan_mirror,
+    plan_sync,
+    print_plan,
+    prune_dirs,
+    save_manifest,
+    scan_symlinks,
+)
 
 load_dotenv()
 
@@ -16,81 +35,242 @@ pd.set_option("display.max_colwidth", 50)
 pd.set_option("display.width", 130)
 pd.set_option("mode.chained_assignment", "raise")
 
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--full",
+    action="store_true",
+    help="rescan the whole symlink tree instead of only syncing tracks changed since "
+    "the last run",
+)
+parser.add_argument(
+    "--mirror",
+    action="store_true",
+    help="download mp3s that are missing or changed from S3 (and delete ones that "
+    "aren't there anymore) first",
+)
+parser.add_argument(
+    "--verify",
+    action="store_true",
+    help="with --mirror, check the ETag of local mp3s that haven't been checked "
+    "before instead of trusting their size",
+)
+parser.add_argument(
+    "--dry-run",
+    action="store_true",
+    help="print the changes to the symlink tree without making them",
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=max_workers,
+    help="number of filesystem operations to run at once",
+)
+args = parser.parse_args()
 
 mp3s_folder = os.path.join(os.environ["BACKUP_PATH"], "mp3s")
 music_folder = os.path.join(os.environ["BACKUP_PATH"], "music")
 
+# size, ETag, and mtime of each mp3 as of the last mirror
+mirror_state_path = os.path.join(os.environ["BACKUP_PATH"], "mp3s_mirror.json")
+
+# what's in the symlink tree as of the last run
+manifest_path = os.path.join(os.environ["BACKUP_PATH"], "music_manifest.json")
+
+# tracks updated this long (in ms) before the last run's most recent update are
+# synced again, in case clocks disagree about when they were updated
+updated_at_margin = 24 * 60 * 60 * 1000
+
 excluded_genres = os.environ["EXCLUDED_GENRES"].split("|")
 excluded_album_artists = os.environ["EXCLUDED_ALBUM_ARTISTS"].split("|")
 excluded_albums = os.environ["EXCLUDED_ALBUMS"].split("|")
 
-print("Getting tracks from DB...")
-tracks = get_tracks(os.environ["DATABASE_URL"])
+settings = {
+    "mp3s_folder": mp3s_folder,
+    "music_folder": music_folder,
+    "excluded_genres": excluded_genres,
+    "excluded_album_artists": excluded_album_artists,
+    "excluded_albums": excluded_albums,
+}
+
+if args.mirror:
+    bucket = os.environ["BUCKET_NAME"]
+    mirror_settings = {"bucket": bucket, "prefix": "mp3s/", "mp3s_folder": mp3s_folder}
+    mirror = load_manifest(mirror_state_path, mirror_settings) or {"files": {}}
+
+    s3_client = boto3.Session(
+        profile_name=os.getenv("AWS_PROFILE_NAME") or None
+    ).client("s3", config=Config(max_pool_connections=args.workers))
+
+    print(f"Listing s3://{bucket}/mp3s/...")
+    objects = list_objects(s3_client, bucket, "mp3s/")
 
-print(f"Getting contents of {mp3s_folder}")
-mp3_files = pd.DataFrame(glob(f"{mp3s_folder}/*.mp3"), columns=["path"], dtype="string")
-mp3_files["id"] = mp3_files["path"].str.extract("([0-9 a-f]{40})")
+    print(f"Comparing with {mp3s_folder}")
+    os.makedirs(mp3s_folder, exist_ok=True)
 
-missing_files = tracks.loc[~tracks["id"].isin(mp3_files["id"])]
+    mirror_plan = plan_mirror(
+        objects, "mp3s/", mp3s_folder, mirror["files"], verify=args.verify
+    )
+
+    download_size = sum(x[2] for x in mirror_plan.downloads)
+    print(len(mirror_plan.downloads), f"mp3s to download ({download_size:,} bytes)")
+    print(len(mirror_plan.deletes), "files to delete")
+
+    if args.dry_run:
+        for x in mirror_plan.downloads:
+            print("download", x[0])
+
+        for x in mirror_plan.deletes:
+            print("delete", x)
+
+        sys.exit()
+
+    for x in mirror_plan.deletes:
+        os.unlink(x)
 
-if len(missing_files) > 0:
-    raise ValueError("Missing files:", missing_files)
+    downloaded, errors = download_objects(
+        s3_client, bucket, mirror_plan.downloads, n_workers=args.workers
+    )
+
+    save_manifest(
+        mirror_state_path,
+        {
+            "version": 1,
+            "settings": mirror_settings,
+            "files": {**mirror_plan.state, **downloaded},
+        },
+    )
 
-missing_tracks = mp3_files.loc[~mp3_files["id"].isin(tracks["id"])]
+    if len(errors) > 0:
+        raise ValueError("Failed downloads:", errors)
 
-if len(missing_tracks) > 0:
-    raise ValueError("Missing track records:", missing_tracks["id"])
+manifest = None if args.full else load_manifest(manifest_path, settings)
+
+if manifest is None:
+    print("Getting tracks from DB...")
+    tracks = get_tracks(os.environ["DATABASE_URL"], categorical=True)
+    previous = {}
+    deleted_ids = set()
+
+    print(f"Getting contents of {mp3s_folder}")
+    mp3_files = pd.DataFrame(
+        glob(f"{mp3s_folder}/*.mp3"), columns=["path"], dtype="string"
+    )
+    mp3_files["id"] = mp3_files["path"].str.extract("([0-9 a-f]{40})")
+
+    missing_files = tracks.loc[~tracks["id"].isin(mp3_files["id"])]
+
+    if len(missing_files) > 0:
+        raise ValueError("Missing files:", missing_files)
+
+    missing_tracks = mp3_files.loc[~mp3_files["id"].isin(tracks["id"])]
+
+    if len(missing_tracks) > 0:
+        raise ValueError("Missing track records:", missing_tracks["id"])
+
+    print(f"Getting contents of {music_folder}")
+    current, stray = scan_symlinks(music_folder)
+
+else:
+    print("Getting changed tracks from DB...")
+    all_tracks = get_changed_tracks(
+        os.environ["DATABASE_URL"], manifest["updated_at"] - updated_at_margin
+    )
+
+    previous = manifest["tracks"]
+    deleted_ids = set(previous) - set(all_tracks["id"])
+    changed = all_tracks.loc[all_tracks["changed"]]
+
+    # a track's symlink path depends on the other tracks in its album, so resync
+    # whole albums that a changed or deleted track is (or was) in
+    groups = {
+        (x.album_artist, x.album)
+        for x in changed.itertuples(index=False)
+        if pd.notna(x.album_artist) and pd.notna(x.album)
+    }
+
+    for track_id in set(changed["id"]) | deleted_ids:
+        if track_id in previous and None not in previous[track_id][1:]:
+            groups.add(tuple(previous[track_id][1:]))
+
+    tracks = get_tracks(
+        os.environ["DATABASE_URL"], ids=list(changed["id"]), groups=sorted(groups)
+    )
+
+    current = {
+        k: os.path.join(music_folder, previous[k][0])
+        for k in set(tracks["id"]) | deleted_ids
+        if k in previous and previous[k][0] is not None
+    }
+
+    stray = []
 
 print("Constructing symlink paths...")
-tracks = tracks.join(
-    tracks.groupby(["album_artist", "album"])["track_i"].max(),
-    on=["album_artist", "album"],
-    rsuffix="_max",
-)
+tracks = add_sym_paths(tracks, mp3s_folder, music_folder)
 
-tracks["mp3_path"] = mp3s_folder + "/" + tracks["id"] + ".mp3"
-tracks["sym_path"] = tracks.apply(make_sym_path, axis=1, music_folder=music_folder)
-tracks = tracks.drop(columns="track_i_max")
+excluded = (
+    tracks["genre"].isin(excluded_genres)
+    | tracks["album_artist"].isin(excluded_album_artists)
+    | tracks["album"].isin(excluded_albums)
+)
 
-tracks = tracks.loc[
-    ~(
-        tracks["genre"].isin(excluded_genres)
-        | tracks["album_artist"].isin(excluded_album_artists)
-        | tracks["album"].isin(excluded_albums)
+desired = {
+    track_id: None if is_excluded else sym_path
+    for track_id, sym_path, is_excluded in zip(
+        tracks["id"], tracks["sym_path"], excluded
     )
-]
+}
 
-print(f"Getting contents of {music_folder}")
-existing_symlink_files = glob(f"{music_folder}/**/*.mp3", recursive=True)
-linked_tracks = [os.readlink(x) for x in existing_symlink_files]
-existing_symlinks = pd.DataFrame(
-    {"sym_path": existing_symlink_files, "mp3_path": linked_tracks}, dtype="string"
+desired.update({x: None for x in deleted_ids})
+
+plan = plan_sync(
+    current, desired, dict(zip(tracks["id"], tracks["mp3_path"])), stray=stray
 )
 
-links_to_remove = existing_symlinks.loc[
-    ~existing_symlinks["sym_path"].isin(tracks["sym_path"])
-]
-print(len(links_to_remove), "links to remove")
+print_plan(plan, music_folder, verbose=args.dry_run)
 
-for sym_path in links_to_remove["sym_path"].values:
-    os.unlink(sym_path)
+if args.dry_run:
+    sys.exit()
 
-tracks_to_link = tracks.loc[~tracks["sym_path"].isin(existing_symlinks["sym_path"])]
-print(len(tracks_to_link), "tracks to link")
+if manifest is not None:
+    missing_files = [
+        x[-1] for x in [*plan.renames, *plan.links] if not os.path.exists(x[-1])
+    ]
 
-for r in tracks_to_link[["sym_path", "mp3_path"]].itertuples(index=False):
-    sym_dir = os.path.dirname(r.sym_path)
+    if len(missing_files) > 0:
+        raise ValueError("Missing files:", missing_files)
 
-    if not os.path.exists(sym_dir):
-        os.makedirs(sym_dir)
+sym_paths = apply_plan(plan, music_folder, n_workers=args.workers)
 
-    os.symlink(r.mp3_path, r.sym_path)
+if manifest is None:
+    print("Cleaning up empty folders...")
+    prune_dirs({x[0] for x in os.walk(music_folder)}, music_folder)
 
-print("Cleaning up empty folders...")
-for (dirpath, dirnames, filenames) in os.walk(music_folder):
-    if len(dirnames) == 0 and len(filenames) == 0:
-        print(dirpath)
-        os.removedirs(dirpath)
+# record where each track's symlink is (and which album it's in)
+manifest_tracks = {k: v for k, v in previous.items() if k not in deleted_ids}
+
+for r in tracks[["id", "album_artist", "album"]].itertuples(index=False):
+    sym_path = sym_paths[r.id]
+
+    manifest_tracks[r.id] = [
+        None if sym_path is None else os.path.relpath(sym_path, music_folder),
+        None if pd.isna(r.album_artist) else r.album_artist,
+        None if pd.isna(r.album) else r.album,
+    ]
+
+updated_at = tracks["updated_at"].max()
+
+save_manifest(
+    manifest_path,
+    {
+        "version": 1,
+        "settings": settings,
+        "updated_at": max(
+            0 if manifest is None else manifest["updated_at"],
+            0 if pd.isna(updated_at) else int(updated_at),
+        ),
+        "tracks": manifest_tracks,
+    },
+)
 
 print(f"Getting contents of {music_folder}")
 folder_names = glob(f"{music_folder}/*/*", recursive=True)
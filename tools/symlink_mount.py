@@ -1,9 +1,18 @@
+import argparse
 import os
 
 import pandas as pd
 from dotenv import load_dotenv
 
-from utils import get_tracks, make_sym_path
+from utils import (
+    apply_plan,
+    get_tracks,
+    make_sym_paths,
+    max_workers,
+    plan_sync,
+    print_plan,
+    scan_symlinks,
+)
 
 load_dotenv()
 
@@ -14,6 +23,20 @@ pd.set_option("display.max_colwidth", 50)
 pd.set_option("display.width", 130)
 pd.set_option("mode.chained_assignment", "raise")
 
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--dry-run",
+    action="store_true",
+    help="print the changes to the symlink tree without making them",
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=max_workers,
+    help="number of filesystem operations to run at once",
+)
+args = parser.parse_args()
+
 mp3s_folder = os.environ["MOUNT_PATH"]
 music_folder = os.environ["MUSIC_PATH"]
 
@@ -22,7 +45,7 @@ excluded_album_artists = os.environ["EXCLUDED_ALBUM_ARTISTS"].split("|")
 excluded_albums = os.environ["EXCLUDED_ALBUMS"].split("|")
 
 print("Getting tracks from DB...")
-tracks = get_tracks(os.environ["DATABASE_URL"])
+tracks = get_tracks(os.environ["DATABASE_URL"], categorical=True)
 
 tracks = tracks.loc[
     ~(
@@ -33,19 +56,23 @@ tracks = tracks.loc[
 ]
 
 print("Constructing symlink paths...")
-tracks = tracks.join(
-    tracks.groupby(["album_artist", "album"])["track_i"].max(),
-    on=["album_artist", "album"],
-    rsuffix="_max",
-)
-
 tracks["mp3_path"] = mp3s_folder + "/" + tracks["id"] + ".mp3"
-tracks["sym_path"] = tracks.apply(make_sym_path, axis=1, music_folder=music_folder)
+tracks["sym_path"] = make_sym_paths(tracks, music_folder)
+
+print(f"Getting contents of {music_folder}")
+current, stray = scan_symlinks(music_folder)
 
-for r in tracks[["sym_path", "mp3_path"]].itertuples(index=False):
-    sym_dir = os.path.dirname(r.sym_path)
+# only existing symlinks to tracks that have since been deleted or excluded are
+# removed, so running this again only changes what's changed
+desired = {x: None for x in current}
+desired.update(zip(tracks["id"], tracks["sym_path"]))
+
+plan = plan_sync(
+    current, desired, dict(zip(tracks["id"], tracks["mp3_path"])), stray=stray
+)
 
-    if not os.path.exists(sym_dir):
-        os.makedirs(sym_dir)
+print_plan(plan, music_folder, verbose=args.dry_run)
 
-    os.symlink(r.mp3_path, r.sym_path)
+if not args.dry_run:
+    apply_plan(plan, music_folder, n_workers=args.workers)
+    print("Done.")
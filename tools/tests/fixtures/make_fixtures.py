@@ -0,0 +1,54 @@
+"""
+regenerate the golden test fixtures from the previous row-wise symlink path method in
+`benchmarks` (only needed if the cases change, since the expected paths must never
+change)
+
+    poetry run python tests/fixtures/make_fixtures.py
+"""
+
+import json
+import os
+import random
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from benchmarks.sym_paths import legacy_make_sym_path, make_library  # noqa: E402
+
+fixtures_dir = os.path.dirname(__file__)
+music_folder = "/backup/music"
+
+
+def make_sym_paths_fixture() -> None:
+    random.seed(0)
+    tracks = make_library(6000)
+
+    # a few tracks from each album (including the last one, so there are still track
+    # numbers padded to two or three digits), to get a variety of albums
+    albums = tracks.groupby(["album_artist", "album"], dropna=False, sort=False)
+    tracks = pd.concat([albums.head(3), albums.tail(1)]).drop_duplicates("id")
+    tracks = tracks.sort_index().reset_index(drop=True)
+
+    tracks["sym_path"] = tracks.join(
+        tracks.groupby(["album_artist", "album"])["track_i"].max(),
+        on=["album_artist", "album"],
+        rsuffix="_max",
+    ).apply(legacy_make_sym_path, axis=1, music_folder=music_folder)
+
+    rows = [
+        {
+            k: None if v is pd.NA else getattr(v, "item", lambda: v)()
+            for k, v in r.items()
+        }
+        for r in tracks.drop(columns="id").to_dict("records")
+    ]
+
+    with open(os.path.join(fixtures_dir, "sym_paths.json"), "w") as f:
+        json.dump({"music_folder": music_folder, "tracks": rows}, f, ensure_ascii=False)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    make_sym_paths_fixture()
@@ -0,0 +1,145 @@
+import json
+import os
+
+import boto3
+import pytest
+from boto3.s3.transfer import TransferConfig
+from moto import mock_aws
+
+import utils
+from utils import download_objects, etag_matches, list_objects, plan_mirror
+
+bucket = "bucket"
+prefix = "mp3s/"
+mib = 1024 * 1024
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    # moto never uses these, but boto3 won't make a client without them
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "x")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+
+    with mock_aws():
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket=bucket)
+        yield s3_client
+
+
+@pytest.fixture
+def mp3s_folder(tmp_path) -> str:
+    path = tmp_path / "mp3s"
+    path.mkdir()
+    return str(path)
+
+
+def count_gets(s3_client, monkeypatch) -> list:
+    ranges = []
+    get_object = s3_client.get_object
+
+    def counting_get_object(**kwargs):
+        ranges.append(kwargs["Range"])
+        return get_object(**kwargs)
+
+    monkeypatch.setattr(s3_client, "get_object", counting_get_object)
+    return ranges
+
+
+def test_download_resumes_partial_file(s3_client, mp3s_folder, monkeypatch) -> None:
+    monkeypatch.setattr(utils, "chunk_size", 1024)
+    body = os.urandom(3 * 1024 + 100)
+    s3_client.put_object(Bucket=bucket, Key="mp3s/a.mp3", Body=body)
+
+    objects = list_objects(s3_client, bucket, prefix)
+    plan = plan_mirror(objects, prefix, mp3s_folder, {})
+    key, path, size, etag = plan.downloads[0]
+
+    # a previous run downloaded the first two chunks before it was interrupted
+    with open(path + ".part", "wb") as f:
+        f.write(body[:2048])
+        f.truncate(size)
+
+    progress = {"etag": etag, "size": size, "chunk_size": 1024, "done": [0, 1]}
+
+    with open(path + ".part.json", "w") as f:
+        json.dump(progress, f)
+
+    # partial downloads of objects still to be downloaded aren't deleted
+    plan = plan_mirror(objects, prefix, mp3s_folder, {})
+    assert plan.deletes == []
+
+    ranges = count_gets(s3_client, monkeypatch)
+    state, errors = download_objects(s3_client, bucket, plan.downloads, n_workers=2)
+
+    assert errors == {}
+    assert sorted(ranges) == ["bytes=2048-3071", "bytes=3072-3171"]
+    assert sorted(os.listdir(mp3s_folder)) == ["a.mp3"]
+
+    with open(path, "rb") as f:
+        assert f.read() == body
+
+    # the next run trusts the recorded state without downloading or hashing
+    assert state["a.mp3"][:2] == [size, etag]
+    assert plan_mirror(objects, prefix, mp3s_folder, state).downloads == []
+
+
+def test_download_restarts_if_object_replaced(
+    s3_client, mp3s_folder, monkeypatch
+) -> None:
+    monkeypatch.setattr(utils, "chunk_size", 1024)
+    s3_client.put_object(Bucket=bucket, Key="mp3s/a.mp3", Body=os.urandom(3000))
+    objects = list_objects(s3_client, bucket, prefix)
+    plan = plan_mirror(objects, prefix, mp3s_folder, {})
+    path = plan.downloads[0][1]
+
+    # a partial download of an older version of the object isn't resumed
+    with open(path + ".part", "wb") as f:
+        f.write(os.urandom(3000))
+
+    with open(path + ".part.json", "w") as f:
+        json.dump({"etag": "old", "size": 3000, "chunk_size": 1024, "done": [0]}, f)
+
+    # and the object is replaced again after it's listed
+    s3_client.put_object(Bucket=bucket, Key="mp3s/a.mp3", Body=os.urandom(3000))
+    state, errors = download_objects(s3_client, bucket, plan.downloads, n_workers=2)
+
+    assert state == {}
+    assert list(errors) == ["mp3s/a.mp3"]
+    assert "PreconditionFailed" in errors["mp3s/a.mp3"]
+
+    # nothing is left to resume, so the next run starts over
+    assert os.listdir(mp3s_folder) == []
+
+
+def test_multipart_etag_verified(s3_client, mp3s_folder) -> None:
+    body = os.urandom(12 * mib)
+    path = os.path.join(mp3s_folder, "a.mp3")
+
+    with open(path, "wb") as f:
+        f.write(body)
+
+    s3_client.upload_file(
+        Filename=path,
+        Bucket=bucket,
+        Key="mp3s/a.mp3",
+        Config=TransferConfig(multipart_threshold=5 * mib, multipart_chunksize=5 * mib),
+    )
+
+    objects = list_objects(s3_client, bucket, prefix)
+    size, etag = objects["mp3s/a.mp3"]
+    assert etag.endswith("-3")
+    assert etag_matches(path, size, etag)
+
+    plan = plan_mirror(objects, prefix, mp3s_folder, {}, verify=True)
+    assert plan.downloads == []
+    assert plan.state["a.mp3"][:2] == [size, etag]
+
+    # a file of the right size with different contents is downloaded again
+    with open(path, "r+b") as f:
+        f.write(b"x")
+
+    assert not etag_matches(path, size, etag)
+
+    plan = plan_mirror(objects, prefix, mp3s_folder, {}, verify=True)
+    assert [x[0] for x in plan.downloads] == ["mp3s/a.mp3"]
@@ -0,0 +1,47 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from utils import categorical_columns, make_sym_paths, track_dtypes
+
+fixtures_dir = os.path.join(os.path.dirname(__file__), "fixtures")
+
+with open(os.path.join(fixtures_dir, "sym_paths.json")) as f:
+    fixture = json.load(f)
+
+
+def load_tracks() -> pd.DataFrame:
+    tracks = pd.DataFrame(fixture["tracks"])
+
+    return tracks.astype({k: v for k, v in track_dtypes.items() if k in tracks.columns})
+
+
+@pytest.mark.parametrize("categorical", [False, True])
+def test_make_sym_paths_matches_legacy(categorical: bool) -> None:
+    # existing symlinks would all be moved if the paths changed
+    tracks = load_tracks()
+
+    if categorical:
+        tracks = tracks.astype({x: "category" for x in categorical_columns})
+
+    sym_paths = make_sym_paths(tracks, fixture["music_folder"])
+    mismatches = tracks.loc[sym_paths != tracks["sym_path"]]
+
+    assert len(mismatches) == 0, mismatches
+
+
+def test_make_sym_paths_pads_to_album() -> None:
+    # track numbers are padded to the width of the highest one in the tracks given
+    tracks = load_tracks()
+    album = tracks.loc[tracks["track_i"] >= 100, ["album_artist", "album"]].iloc[0]
+
+    in_album = (tracks["album_artist"] == album["album_artist"]) & (
+        tracks["album"] == album["album"]
+    )
+
+    subset = tracks.loc[in_album & (tracks["track_i"] < 10)].head(1)
+    sym_path = make_sym_paths(subset, fixture["music_folder"]).iloc[0]
+
+    assert os.path.basename(sym_path).startswith(f"{subset['track_i'].iloc[0]} - ")
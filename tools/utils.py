@@ -1,81 +1,702 @@
+from __future__ import annotations
+
+import json
+import math
+import os
 import re
-from unicodedata import normalize
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from hashlib import md5
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional, TypeVar
 
 import pandas as pd
 import psycopg2
+from pandas.api.types import union_categoricals
+
+manifest_version = 1
+
+# columns (and their types) returned by `get_tracks`
+track_dtypes = {
+    "id": "string",
+    "album_artist": "string",
+    "artist": "string",
+    "album": "string",
+    "disc_i": "Int64",
+    "track_i": "Int64",
+    "title": "string",
+    "year": "Int64",
+    "genre": "string",
+    "compilation": "boolean",
+    "updated_at": "Int64",
+}
+
+# columns with few distinct values, stored as categoricals by `get_tracks` if asked
+categorical_columns = ["album_artist", "genre"]
+
+# number of filesystem calls to run at once (each one is a round trip on a network
+# mount)
+max_workers = 16
+
+# size of the ranged GETs mp3s are downloaded from S3 in (which is also the part
+# size `aws s3` and the web importer upload large files in)
+chunk_size = 8 * 1024 * 1024
+
+T = TypeVar("T")
+
+
+def iter_tracks(
+    db_url: str,
+    ids: Optional[list[str]] = None,
+    groups: Optional[list[tuple[str, str]]] = None,
+    batch_size: int = 10000,
+) -> Iterator[pd.DataFrame]:
+    # all tracks, or only the given tracks plus every track in the given
+    # (album_artist, album) groups, in batches as they arrive from a server-side
+    # cursor (so the whole result is never held in memory twice)
+    if ids is None and groups is None:
+        where = ""
+        params = None
+    else:
+        groups = groups or []
+
+        where = """
+            where id = any(%(ids)s)
+            or (album_artist, album) in (
+                select * from unnest(%(album_artists)s::text[], %(albums)s::text[])
+            )
+        """
+
+        params = {
+            "ids": ids or [],
+            "album_artists": [x[0] for x in groups],
+            "albums": [x[1] for x in groups],
+        }
+
+    with psycopg2.connect(db_url) as conn, conn.cursor(name="tracks") as cur:
+        cur.execute(
+            f"""
+            select {", ".join(track_dtypes)}
+            from tracks
+            {where}
+            order by album_artist, album, disc_i, track_i
+        """,
+            params,
+        )
+
+        while True:
+            rows = cur.fetchmany(batch_size)
+
+            if len(rows) == 0:
+                break
+
+            yield make_tracks_batch(rows)
 
 
-def get_tracks(db_url: str) -> pd.DataFrame:
+def make_tracks_batch(rows: list[tuple]) -> pd.DataFrame:
+    # set each column's type up front (rather than inferring it, which fails when
+    # a column is all nulls)
+    columns = list(zip(*rows)) if len(rows) > 0 else [[]] * len(track_dtypes)
+
+    return pd.DataFrame(
+        {
+            k: pd.array(x, dtype=dtype)
+            for (k, dtype), x in zip(track_dtypes.items(), columns)
+        }
+    )
+
+
+def get_tracks(
+    db_url: str,
+    ids: Optional[list[str]] = None,
+    groups: Optional[list[tuple[str, str]]] = None,
+    batch_size: int = 10000,
+    categorical: bool = False,
+) -> pd.DataFrame:
+    # all the tracks from `iter_tracks` in one data frame, optionally with
+    # repetitive columns stored as categoricals to save memory
+    batches = []
+
+    for batch in iter_tracks(db_url, ids=ids, groups=groups, batch_size=batch_size):
+        if categorical:
+            batch = batch.astype({x: "category" for x in categorical_columns})
+
+        batches.append(batch)
+
+    if len(batches) == 0:
+        tracks = make_tracks_batch([])
+
+        if categorical:
+            tracks = tracks.astype({x: "category" for x in categorical_columns})
+
+        return tracks
+
+    if not categorical:
+        return pd.concat(batches, ignore_index=True)
+
+    # concatenating categoricals with different categories would make them objects,
+    # so combine those columns separately
+    tracks = pd.concat(
+        [x.drop(columns=categorical_columns) for x in batches], ignore_index=True
+    )
+
+    for x in categorical_columns:
+        tracks[x] = union_categoricals([b[x] for b in batches])
+
+    return tracks[list(track_dtypes)]
+
+
+def get_changed_tracks(db_url: str, updated_since: int) -> pd.DataFrame:
+    # IDs of all tracks (to detect deletions) and whether each was updated since
+    # the given time (in ms)
     with psycopg2.connect(db_url) as conn:
         tracks = pd.read_sql(
             """
             select
                 id,
                 album_artist,
-                artist,
                 album,
-                disc_i,
-                track_i,
-                title,
-                year,
-                genre,
-                compilation
+                coalesce(updated_at >= %(updated_since)s, false) as changed
             from tracks
-            order by album_artist, album, disc_i, track_i
         """,
             conn,
+            params={"updated_since": updated_since},
         )
 
     return tracks.convert_dtypes()
 
 
-def safe_path_text(x: str) -> str:
-    x = re.sub(r"[\\/:*?\"<>|]", "_", x)
-    x = x.strip()
-    x = re.sub(r"^\.+", "_", x)
-    x = normalize("NFKD", x)
-    return x
+def add_sym_paths(
+    tracks: pd.DataFrame, mp3s_folder: str, music_folder: str
+) -> pd.DataFrame:
+    # tracks must include every track in each (album_artist, album) group, since
+    # track numbers are padded to the width of the highest one
+    tracks = tracks.copy()
+    tracks["mp3_path"] = mp3s_folder + "/" + tracks["id"] + ".mp3"
+    tracks["sym_path"] = make_sym_paths(tracks, music_folder)
+    return tracks
+
+
+def safe_path_texts(x: pd.Series) -> pd.Series:
+    # make text safe to use in a path, cleaning each distinct value only once
+    # (genres, artists, and albums repeat across many tracks)
+    codes, uniques = pd.factorize(x, use_na_sentinel=False)
+
+    uniques = (
+        pd.Series(uniques, dtype="string")
+        .str.replace(r"[\\/:*?\"<>|]", "_", regex=True)
+        .str.strip()
+        .str.replace(r"^\.+", "_", regex=True)
+        .str.normalize("NFKD")
+    )
 
+    return pd.Series(uniques.to_numpy()[codes], index=x.index, dtype="string")
 
-def make_sym_path(r: pd.Series, music_folder: str) -> str:
-    genre = r["genre"]
 
-    genre = re.sub(r"^C:", "Celtic -", genre)
-    genre = re.sub(r"^F:", "French -", genre)
+def make_sym_paths(tracks: pd.DataFrame, music_folder: str) -> pd.Series:
+    # the symlink path of each track, i.e. genre/album artist/[year - ]album/
+    # [Disc n/][track number - ][artist (for compilations) - ]title.mp3, with track
+    # numbers padded to the width of the highest one in each (album_artist, album)
+    # group of `tracks`
+    groups = tracks.groupby(["album_artist", "album"], observed=True)
+    track_i_max = groups["track_i"].transform("max")
 
-    path_parts = [genre, r["album_artist"]]
+    genre = (
+        tracks["genre"]
+        .astype("string")
+        .str.replace(r"^C:", "Celtic -", regex=True)
+        .str.replace(r"^F:", "French -", regex=True)
+    )
 
-    if r["album"] is not pd.NA:
-        album_parts = []
+    year = tracks["year"].astype(str)
 
-        if r["year"] is not pd.NA:
-            album_parts.append(str(r["year"]))
+    album = (
+        tracks["album"]
+        .astype("string")
+        .where(tracks["year"].isna(), year + " - " + tracks["album"])
+    )
 
-        album_parts.append(r["album"])
-        path_parts.append(" - ".join(album_parts))
+    disc = "Disc " + tracks["disc_i"].astype(str)
 
-    if r["disc_i"] is not pd.NA:
-        path_parts.append(f"Disc {r['disc_i']}")
+    # a missing track number in an otherwise numbered album comes out as "<NA>"
+    track_i = tracks["track_i"].astype(str)
+    track_i = track_i.where(track_i_max < 10, track_i.str.zfill(2))
+    track_i = track_i.where(track_i_max < 100, track_i.str.zfill(3))
 
-    filename_parts = []
+    filename = tracks["title"].astype("string")
+    filename = filename.where(
+        ~tracks["compilation"].astype(bool), tracks["artist"] + " - " + filename
+    )
+    filename = filename.where(track_i_max.isna(), track_i + " - " + filename)
+    filename = filename + ".mp3"
 
-    if r["track_i_max"] is not pd.NA and r["track_i"] is not None:
-        if r["track_i_max"] >= 100:
-            filename_parts.append(f"{r['track_i']:03d}")
-        elif r["track_i_max"] >= 10:
-            filename_parts.append(f"{r['track_i']:02d}")
+    sym_path = (
+        music_folder
+        + "/"
+        + safe_path_texts(genre)
+        + "/"
+        + safe_path_texts(tracks["album_artist"])
+    )
+
+    sym_path += ("/" + safe_path_texts(album)).fillna("")
+    sym_path += ("/" + safe_path_texts(disc.where(tracks["disc_i"].notna()))).fillna("")
+
+    return sym_path + "/" + safe_path_texts(filename)
+
+
+class SyncPlan(NamedTuple):
+    # paths of symlinks to remove
+    unlinks: list[str]
+    # (old path, new path, mp3 path) of symlinks to move
+    renames: list[tuple[str, str, str]]
+    # (symlink path, mp3 path) of symlinks to create
+    links: list[tuple[str, str]]
+    # the symlink path (or None) each track should end up with
+    sym_paths: dict[str, Optional[str]]
+
+
+def load_manifest(path: str, settings: dict) -> Optional[dict]:
+    # the manifest of a previous sync, unless there isn't one or it was made with
+    # different settings (folders, exclusions), in which case it can't be trusted
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        manifest = json.load(f)
+
+    if (
+        manifest.get("version") != manifest_version
+        or manifest.get("settings") != settings
+    ):
+        return None
+
+    return manifest
+
+
+def save_manifest(path: str, manifest: dict) -> None:
+    # write to a temporary file first so an interrupted write can't corrupt it
+    tmp_path = path + ".tmp"
+
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+
+    os.replace(tmp_path, path)
+
+
+def scan_symlinks(music_folder: str) -> tuple[dict[str, str], list[str]]:
+    # the symlink path of each track ID currently in the tree, and any other
+    # symlinks (not to a track, or extra ones to the same track)
+    current = {}
+    stray = []
+
+    for dirpath, _, filenames in os.walk(music_folder):
+        for filename in filenames:
+            sym_path = os.path.join(dirpath, filename)
+
+            if not os.path.islink(sym_path):
+                continue
+
+            m = re.search(r"([0-9a-f]{40})\.mp3$", os.readlink(sym_path))
+
+            if m is None or m.group(1) in current:
+                stray.append(sym_path)
+            else:
+                current[m.group(1)] = sym_path
+
+    return current, stray
+
+
+def plan_sync(
+    current: dict[str, str],
+    desired: dict[str, Optional[str]],
+    mp3_paths: dict[str, str],
+    stray: Optional[list[str]] = None,
+) -> SyncPlan:
+    # compare where each track's symlink is with where it should be (None if it
+    # shouldn't have one); tracks not in `desired` are left alone
+    unlinks = list(stray or [])
+    renames = []
+    links = []
+
+    for track_id, new_path in desired.items():
+        old_path = current.get(track_id)
+
+        if old_path == new_path:
+            continue
+        elif new_path is None:
+            unlinks.append(old_path)
+        elif old_path is None:
+            links.append((new_path, mp3_paths[track_id]))
         else:
-            filename_parts.append(str(r["track_i"]))
+            renames.append((old_path, new_path, mp3_paths[track_id]))
+
+    return SyncPlan(unlinks, renames, links, desired)
+
+
+def print_plan(plan: SyncPlan, music_folder: str, verbose: bool = False) -> None:
+    # print how many symlinks a plan removes, moves, and creates (and, if verbose,
+    # each of them)
+    if verbose:
+        for sym_path in plan.unlinks:
+            print("unlink", os.path.relpath(sym_path, music_folder))
+
+        for old_path, new_path, _ in plan.renames:
+            print(
+                "move",
+                os.path.relpath(old_path, music_folder),
+                "->",
+                os.path.relpath(new_path, music_folder),
+            )
+
+        for sym_path, mp3_path in plan.links:
+            print("link", os.path.relpath(sym_path, music_folder), "->", mp3_path)
+
+    new_dirs = {
+        os.path.dirname(x[-2])
+        for x in [*plan.renames, *plan.links]
+        if not os.path.isdir(os.path.dirname(x[-2]))
+    }
+
+    print(len(plan.unlinks), "links to remove")
+    print(len(plan.renames), "links to move")
+    print(len(plan.links), "tracks to link")
+    print(len(new_dirs), "folders to create")
+
+
+def run_by_folder(
+    fn: Callable[[T], Optional[T]],
+    items: Iterable[T],
+    path: Callable[[T], str],
+    n_workers: int = max_workers,
+) -> list[T]:
+    # call `fn` on each item, running the items in each folder (by `path`) one after
+    # another and different folders in parallel, and return the items for which it
+    # returned something other than None
+    by_dir = defaultdict(list)
+
+    for x in items:
+        by_dir[os.path.dirname(path(x))].append(x)
+
+    def run_folder(xs: list[T]) -> list[T]:
+        return [r for r in (fn(x) for x in xs) if r is not None]
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        return [r for rs in executor.map(run_folder, by_dir.values()) for r in rs]
+
+
+def apply_plan(
+    plan: SyncPlan, music_folder: str, n_workers: int = max_workers
+) -> dict[str, Optional[str]]:
+    # carry out a plan and return the symlink path each track actually ended up
+    # with, then remove any folders left empty by it
+    def unlink(sym_path: str) -> None:
+        try:
+            os.unlink(sym_path)
+        except FileNotFoundError:
+            pass
+
+    def make_dir(sym_dir: str) -> None:
+        os.makedirs(sym_dir, exist_ok=True)
+
+    def rename(x: tuple[str, str, str]) -> Optional[tuple[str, str]]:
+        old_path, new_path, mp3_path = x
+
+        if not os.path.lexists(old_path) or os.path.lexists(new_path):
+            # the destination is still taken (e.g. by a symlink that's moving
+            # elsewhere), so recreate it with the new links instead
+            unlink(old_path)
+            return new_path, mp3_path
+
+        os.rename(old_path, new_path)
+
+    def link(x: tuple[str, str]) -> Optional[tuple[str, str]]:
+        sym_path, mp3_path = x
+
+        try:
+            os.symlink(mp3_path, sym_path)
+
+        except FileExistsError:
+            if os.path.islink(sym_path) and os.readlink(sym_path) == mp3_path:
+                return
+
+            print(f"Not linking {mp3_path}, {sym_path} already exists")
+            return x
+
+    run_by_folder(unlink, plan.unlinks, lambda x: x, n_workers)
+
+    # create each folder once, up front, rather than checking for it before each
+    # symlink
+    new_dirs = {os.path.dirname(x[-2]) for x in [*plan.renames, *plan.links]}
+    run_by_folder(make_dir, sorted(new_dirs), lambda x: x, n_workers)
+
+    deferred = run_by_folder(rename, plan.renames, lambda x: x[1], n_workers)
+    failed = run_by_folder(link, [*plan.links, *deferred], lambda x: x[0], n_workers)
+
+    touched_dirs = {os.path.dirname(x) for x in plan.unlinks}
+    touched_dirs |= {os.path.dirname(x[0]) for x in plan.renames}
+    prune_dirs(touched_dirs, music_folder)
+
+    failed_paths = {x[0] for x in failed}
+    return {k: None if v in failed_paths else v for k, v in plan.sym_paths.items()}
+
+
+def prune_dirs(dirs: set[str], music_folder: str) -> None:
+    # remove each of these folders if it's empty, then its parents if they're
+    # empty too, stopping at the music folder
+    root = os.path.abspath(music_folder)
+
+    for d in sorted(dirs, key=len, reverse=True):
+        d = os.path.abspath(d)
+
+        while d != root and d.startswith(root + os.sep) and os.path.isdir(d):
+            if len(os.listdir(d)) > 0:
+                break
+
+            os.rmdir(d)
+            d = os.path.dirname(d)
+
+
+class MirrorPlan(NamedTuple):
+    # (key, local path, size, ETag) of objects to download
+    downloads: list[tuple[str, str, int, str]]
+    # local files that aren't in the bucket (or are abandoned partial downloads)
+    deletes: list[str]
+    # [size, ETag, mtime] of each local file checked against its object
+    state: dict[str, list]
+
+
+def list_objects(
+    s3_client: Any, bucket: str, prefix: str
+) -> dict[str, tuple[int, str]]:
+    # the size and ETag of each object under the prefix
+    objects = {}
+
+    for page in s3_client.get_paginator("list_objects_v2").paginate(
+        Bucket=bucket, Prefix=prefix
+    ):
+        for x in page.get("Contents", []):
+            objects[x["Key"]] = (x["Size"], x["ETag"].strip('"'))
+
+    return objects
+
+
+def file_etag(path: str, part_size: Optional[int] = None) -> str:
+    # the ETag S3 gives a file uploaded in one piece (its MD5) or in parts of the
+    # given size (the MD5 of its parts' MD5s, followed by the number of parts)
+    with open(path, "rb") as f:
+        if part_size is None:
+            whole = md5()
+
+            for data in iter(lambda: f.read(chunk_size), b""):
+                whole.update(data)
+
+            return whole.hexdigest()
+
+        part_md5s = [md5(x).digest() for x in iter(lambda: f.read(part_size), b"")]
+
+    return f"{md5(b''.join(part_md5s)).hexdigest()}-{len(part_md5s)}"
+
+
+def etag_matches(path: str, size: int, etag: str) -> bool:
+    if "-" not in etag:
+        return file_etag(path) == etag
+
+    # the part size of a multipart upload isn't recorded, so try the usual ones
+    n_parts = int(etag.split("-")[1])
+    mib = 1024 * 1024
+    part_sizes = {chunk_size, 5 * mib, 16 * mib, math.ceil(size / n_parts / mib) * mib}
+
+    return any(
+        math.ceil(size / x) == n_parts and file_etag(path, x) == etag
+        for x in sorted(part_sizes)
+    )
+
+
+def plan_mirror(
+    objects: dict[str, tuple[int, str]],
+    prefix: str,
+    mp3s_folder: str,
+    state: dict[str, list],
+    verify: bool = False,
+) -> MirrorPlan:
+    # compare the objects in the bucket with the local mp3s. A local file matches
+    # its object if it's the same size and either the object's ETag and the file's
+    # mtime are the ones recorded when it was last checked, or its contents have
+    # the same ETag. Files that have never been checked are trusted if they're the
+    # right size (as `aws s3 sync` did) unless `verify` is set.
+    local = {
+        x.name: x.stat()
+        for x in os.scandir(mp3s_folder)
+        if x.is_file(follow_symlinks=False)
+    }
+
+    downloads = []
+    new_state = {}
+
+    for key, (size, etag) in objects.items():
+        name = key[len(prefix) :]
+
+        if "/" in name or not name.endswith(".mp3"):
+            continue
+
+        path = os.path.join(mp3s_folder, name)
+        st = local.get(name)
+        known = state.get(name)
+
+        if st is None or st.st_size != size:
+            matches = False
+        elif known is not None and known[1] != etag:
+            # the object has been replaced since the file was downloaded
+            matches = False
+        elif known == [size, etag, st.st_mtime_ns]:
+            matches = True
+        elif known is None and not verify:
+            # not recorded, so it's checked if `verify` is set in a later run
+            continue
+        else:
+            matches = etag_matches(path, size, etag)
+
+        if matches:
+            new_state[name] = [size, etag, st.st_mtime_ns]
+        else:
+            downloads.append((key, path, size, etag))
+
+    # keep partial downloads of objects that are still to be downloaded, so they
+    # can be resumed
+    keep = {os.path.basename(x) for x in objects}
+    keep |= {os.path.basename(x[1]) + ".part" for x in downloads}
+    keep |= {os.path.basename(x[1]) + ".part.json" for x in downloads}
+
+    deletes = [
+        os.path.join(mp3s_folder, x)
+        for x in sorted(local)
+        if x not in keep and (x.endswith(".mp3") or ".mp3.part" in x)
+    ]
+
+    return MirrorPlan(downloads, deletes, new_state)
+
+
+def download_objects(
+    s3_client: Any,
+    bucket: str,
+    downloads: list[tuple[str, str, int, str]],
+    n_workers: int = max_workers,
+) -> tuple[dict[str, list], dict[str, str]]:
+    # download objects in chunks with ranged GETs in parallel (across chunks of
+    # the same object and across objects), into a temporary file that's moved into
+    # place once it's complete. The chunks that are done are recorded next to it,
+    # so an interrupted download picks up where it left off. Returns the state
+    # entries of the downloaded files and the error for each object that failed.
+    files = {}
+    tasks = []
+    state = {}
+    errors = {}
+    lock = threading.Lock()
+
+    for key, path, size, etag in downloads:
+        tmp_path = path + ".part"
+        progress_path = tmp_path + ".json"
+        progress = {"etag": etag, "size": size, "chunk_size": chunk_size, "done": []}
+
+        resumed = False
+
+        if os.path.exists(tmp_path) and os.path.exists(progress_path):
+            with open(progress_path) as f:
+                previous = json.load(f)
+
+            # the object might have changed since the partial download started
+            previous_done = previous.pop("done")
+
+            if previous == {k: v for k, v in progress.items() if k != "done"}:
+                progress["done"] = previous_done
+                resumed = True
+
+        if not resumed:
+            with open(tmp_path, "wb") as f:
+                f.truncate(size)
+
+        n_chunks = max(math.ceil(size / chunk_size), 1)
+        remaining = [x for x in range(n_chunks) if x not in set(progress["done"])]
+
+        files[key] = {
+            "path": path,
+            "tmp_path": tmp_path,
+            "progress_path": progress_path,
+            "progress": progress,
+            "n_remaining": len(remaining),
+        }
+
+        tasks.extend((key, x) for x in remaining)
+
+        if len(remaining) == 0:
+            state[os.path.basename(path)] = finish_download(files[key])
+
+    def fetch(key: str, i: int) -> None:
+        f = files[key]
+        size, etag = f["progress"]["size"], f["progress"]["etag"]
+        start = i * chunk_size
+        end = min(start + chunk_size, size) - 1
+
+        if size > 0:
+            res = s3_client.get_object(
+                Bucket=bucket,
+                Key=key,
+                Range=f"bytes={start}-{end}",
+                IfMatch=f'"{etag}"',
+            )
+
+            data = res["Body"].read()
+
+            if len(data) != end - start + 1:
+                raise IOError(
+                    f"Got {len(data)} bytes of {key} instead of {end - start + 1}"
+                )
+
+            fd = os.open(f["tmp_path"], os.O_WRONLY)
+
+            try:
+                os.pwrite(fd, data, start)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        with lock:
+            f["progress"]["done"].append(i)
+            f["n_remaining"] -= 1
+
+            if f["n_remaining"] == 0:
+                state[os.path.basename(f["path"])] = finish_download(f)
+            else:
+                save_manifest(f["progress_path"], f["progress"])
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        futures = {executor.submit(fetch, *x): x[0] for x in tasks}
+
+        for future in as_completed(futures):
+            key = futures[future]
+            e = future.exception()
+
+            if e is None or key in errors:
+                continue
+
+            errors[key] = str(e)
+
+            if getattr(e, "response", {}).get("Error", {}).get("Code") == (
+                "PreconditionFailed"
+            ):
+                # the object changed mid-download, so start over next time
+                for x in [files[key]["tmp_path"], files[key]["progress_path"]]:
+                    if os.path.exists(x):
+                        os.unlink(x)
 
-    if r["compilation"]:
-        filename_parts.append(r["artist"])
+    return state, errors
 
-    filename_parts.append(r["title"])
 
-    filename = " - ".join(filename_parts)
-    filename += ".mp3"
+def finish_download(f: dict[str, Any]) -> list:
+    os.replace(f["tmp_path"], f["path"])
 
-    path_parts.append(filename)
+    if os.path.exists(f["progress_path"]):
+        os.unlink(f["progress_path"])
 
-    path_parts = [safe_path_text(x) for x in path_parts]
-    return "/".join([music_folder, *path_parts])
+    st = os.stat(f["path"])
+    return [f["progress"]["size"], f["progress"]["etag"], st.st_mtime_ns]